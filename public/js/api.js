@@ -1,20 +1,25 @@
 // API base URL - use relative path for same-origin requests
 const API_BASE = '/api';
 
-// Helper function to make API calls
+// Helper function to make API calls. Writes that may be retried pass an
+// idempotencyKey (one per logical operation, reused on every retry), which
+// the server uses to apply them at most once.
 async function apiCall(endpoint, options = {}) {
     const url = `${API_BASE}${endpoint}`;
+    const { idempotencyKey, ...fetchOptions } = options;
+    const headers = { 'Content-Type': 'application/json' };
+    if (idempotencyKey) headers['Idempotency-Key'] = idempotencyKey;
     const config = {
-        headers: {
-            'Content-Type': 'application/json',
-        },
-        ...options,
+        headers,
+        ...fetchOptions,
     };
 
     try {
         const response = await fetch(url, config);
         if (!response.ok) {
-            throw new Error(`HTTP error! status: ${response.status}`);
+            const error = new Error(`HTTP error! status: ${response.status}`);
+            error.status = response.status;
+            throw error;
         }
         return await response.json();
     } catch (error) {
@@ -27,28 +32,22 @@ async function apiCall(endpoint, options = {}) {
 const api = {
     // Products
     getProducts: () => apiCall('/products'),
-    addProduct: (product) => apiCall('/products', {
-        method: 'POST',
-        body: JSON.stringify(product),
-    }),
+    getProductChanges: (since) => apiCall(since ? `/products/changes?since=${encodeURIComponent(since)}` : '/products/changes'),
+    syncProducts: () => syncProducts(),
+    addProduct: (product) => postFormOnce('addProduct', '/products', product),
 
-    // Stock
-    addStock: (transaction) => apiCall('/stock/in', {
-        method: 'POST',
-        body: JSON.stringify(transaction),
-    }),
-    addStockDetailed: (transaction) => apiCall('/stock/in/detailed', {
-        method: 'POST',
-        body: JSON.stringify(transaction),
-    }),
-    issueStock: (transaction) => apiCall('/stock/out', {
-        method: 'POST',
-        body: JSON.stringify(transaction),
-    }),
+    // Stock. Plain movements that cannot reach the server are queued and
+    // resolve with { queued: true }; see postMovement.
+    addStock: (transaction) => postMovement('/stock/in', 'in', transaction),
+    addStockDetailed: (transaction) => postFormOnce('stockInDetailed', '/stock/in/detailed', transaction),
+    issueStock: (transaction) => postMovement('/stock/out', 'out', transaction),
+    pendingMovements: () => readMovementQueue().length,
+    flushMovements: () => flushMovementQueue(),
     getStock: () => apiCall('/stock'),
 
     // Reports
     getReport: () => apiCall('/reports'),
+    getDashboard: () => apiCall('/dashboard'),
 
     // SKU
     getCompanies: () => apiCall('/sku/companies'),
@@ -61,3 +60,236 @@ const api = {
         body: JSON.stringify({ productName }),
     }),
 };
+
+// Form submissions. Each submission gets one idempotency key, and
+// submitting the same form with the same values again after it got no
+// settled answer (no response, a 409 while the first attempt is still
+// running, or a gateway error) reuses that key, so a retry cannot apply the
+// write twice. Any other answer settles it; the next submission of the form
+// gets a new key.
+const UNSETTLED_STATUSES = [409, 502, 503, 504];
+const pendingSubmissions = new Map();
+
+function submissionKey(form, body) {
+    const pending = pendingSubmissions.get(form);
+    if (pending && pending.body === body) return pending.key;
+    const key = newIdempotencyKey();
+    pendingSubmissions.set(form, { body, key });
+    return key;
+}
+
+// POST payload for form and return the Response, whatever its status
+async function submitForm(form, endpoint, payload) {
+    const body = JSON.stringify(payload);
+    const response = await fetch(`${API_BASE}${endpoint}`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json', 'Idempotency-Key': submissionKey(form, body) },
+        body,
+    });
+    if (!UNSETTLED_STATUSES.includes(response.status)) pendingSubmissions.delete(form);
+    return response;
+}
+
+// submitForm with apiCall's contract: the parsed body, or an error with its status
+async function postFormOnce(form, endpoint, payload) {
+    const response = await submitForm(form, endpoint, payload);
+    if (!response.ok) {
+        const error = new Error(`HTTP error! status: ${response.status}`);
+        error.status = response.status;
+        throw error;
+    }
+    return response.json();
+}
+
+// Read a newline-delimited JSON response, calling onRecord for each object
+// as soon as its line arrives.
+async function readNdjson(response, onRecord) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+        const { value, done } = await reader.read();
+        buffer += decoder.decode(value || new Uint8Array(), { stream: !done });
+        const lines = buffer.split('\n');
+        buffer = lines.pop();
+        lines.filter(line => line.trim()).forEach(line => onRecord(JSON.parse(line)));
+        if (done) break;
+    }
+    if (buffer.trim()) onRecord(JSON.parse(buffer));
+}
+
+// Catalogue cached in localStorage and brought up to date with delta syncs,
+// so repeat visits only download the products that changed.
+const PRODUCT_CACHE_KEY = 'productCache.v1';
+
+async function syncProducts() {
+    let cache = null;
+    try {
+        cache = JSON.parse(localStorage.getItem(PRODUCT_CACHE_KEY));
+    } catch (error) {
+        cache = null;
+    }
+
+    if (!cache || !cache.token || !Array.isArray(cache.products)) {
+        const result = await api.getProductChanges();
+        cache = { token: result.token, products: result.changed };
+    } else {
+        const byId = new Map(cache.products.map(product => [product._id, product]));
+        let token = cache.token;
+        while (true) {
+            const result = await api.getProductChanges(token);
+            result.changed.forEach(product => byId.set(product._id, product));
+            result.deleted.forEach(id => byId.delete(id));
+            const advanced = result.token !== token;
+            token = result.token;
+            if (!result.hasMore || !advanced) break;
+        }
+        cache = { token, products: Array.from(byId.values()) };
+    }
+
+    try {
+        localStorage.setItem(PRODUCT_CACHE_KEY, JSON.stringify(cache));
+    } catch (error) {
+        // Quota exceeded: fall back to a full sync next time
+        localStorage.removeItem(PRODUCT_CACHE_KEY);
+    }
+    return cache.products;
+}
+
+// Live stock changes pushed by the server (Server-Sent Events).
+// onChange receives { productId, stock, lastUpdated } for every product write.
+// A server at its stream limit refuses with a 503, which closes the
+// EventSource for good; try again after STREAM_RETRY_MS.
+const STREAM_RETRY_MS = 60000;
+
+function subscribeStockChanges(onChange) {
+    if (typeof EventSource === 'undefined') return null;
+    const source = new EventSource(`${API_BASE}/stream/stock`);
+    source.addEventListener('error', () => {
+        if (source.readyState === EventSource.CLOSED) {
+            setTimeout(() => subscribeStockChanges(onChange), STREAM_RETRY_MS);
+        }
+    });
+    source.addEventListener('stock', event => {
+        try {
+            onChange(JSON.parse(event.data));
+        } catch (error) {
+            console.error('Invalid stock event:', error);
+        }
+    });
+    return source;
+}
+
+// Apply a stock change to a locally cached product list.
+// Returns false when the product is not in the list (the caller should reload).
+function applyStockChange(products, change) {
+    const product = products.find(p => p._id === change.productId);
+    if (!product) return false;
+    product.stock = change.stock;
+    product.lastUpdated = change.lastUpdated;
+    return true;
+}
+
+// Offline movement queue. Stock movements that got no answer (offline,
+// timed out, or a 5xx from a proxy) are kept in localStorage with the
+// idempotency key of their first attempt and replayed through
+// /api/sync/batch until the server settles them. The key makes the replay
+// safe even when the first attempt did reach the server.
+const MOVEMENT_QUEUE_KEY = 'movementQueue.v1';
+const SYNC_BATCH_SIZE = 100;
+const SYNC_RETRY_MS = 30000;
+
+function newIdempotencyKey() {
+    if (window.crypto && typeof window.crypto.randomUUID === 'function') {
+        return window.crypto.randomUUID();
+    }
+    return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}${Math.random().toString(36).slice(2)}`;
+}
+
+function readMovementQueue() {
+    try {
+        return JSON.parse(localStorage.getItem(MOVEMENT_QUEUE_KEY)) || [];
+    } catch (error) {
+        return [];
+    }
+}
+
+function writeMovementQueue(queue) {
+    if (queue.length) {
+        localStorage.setItem(MOVEMENT_QUEUE_KEY, JSON.stringify(queue));
+    } else {
+        localStorage.removeItem(MOVEMENT_QUEUE_KEY);
+    }
+}
+
+async function postMovement(endpoint, type, transaction) {
+    const movement = {
+        idempotencyKey: newIdempotencyKey(),
+        type,
+        productId: transaction.productId,
+        quantity: transaction.quantity,
+    };
+    // A stock-out cut from a known roll also comes off that roll
+    ['rollNumber', 'importDate'].forEach(field => {
+        if (transaction[field]) movement[field] = transaction[field];
+    });
+    try {
+        return await apiCall(endpoint, {
+            method: 'POST',
+            body: JSON.stringify(transaction),
+            idempotencyKey: movement.idempotencyKey,
+        });
+    } catch (error) {
+        // fetch rejects with a TypeError when no response arrived; a 4xx is
+        // the server's answer and is not retried
+        const unanswered = error instanceof TypeError || error.status >= 500;
+        if (!unanswered) throw error;
+        writeMovementQueue([...readMovementQueue(), movement]);
+        return { queued: true, message: 'Saved offline; it will be sent when the connection is back' };
+    }
+}
+
+let movementFlush = null;
+
+// Send queued movements; resolves with the number still queued. Items the
+// server rejected (e.g. insufficient stock) are dropped from the queue and
+// reported with a 'movementsrejected' window event.
+function flushMovementQueue() {
+    if (!movementFlush) {
+        movementFlush = sendMovementQueue().finally(() => { movementFlush = null; });
+    }
+    return movementFlush;
+}
+
+async function sendMovementQueue() {
+    let queue = readMovementQueue();
+    while (queue.length) {
+        const batch = queue.slice(0, SYNC_BATCH_SIZE);
+        const result = await apiCall('/sync/batch', {
+            method: 'POST',
+            body: JSON.stringify({ items: batch }),
+        });
+        // 5xx items were not applied; 409 means another tab is applying it
+        // right now and may still fail. Both stay queued.
+        const settled = result.results.filter(item => item.status < 500 && item.status !== 409);
+        const rejected = settled.filter(item => item.status >= 400);
+        if (rejected.length) {
+            window.dispatchEvent(new CustomEvent('movementsrejected', { detail: rejected }));
+        }
+        const settledKeys = new Set(settled.map(item => item.idempotencyKey));
+        // Re-read: movements may have been queued while the batch was in flight
+        queue = readMovementQueue().filter(movement => !settledKeys.has(movement.idempotencyKey));
+        writeMovementQueue(queue);
+        if (settled.length < batch.length) break;
+    }
+    return queue.length;
+}
+
+function flushMovementQueueQuietly() {
+    if (!readMovementQueue().length) return;
+    flushMovementQueue().catch(error => console.warn('Movement sync failed, will retry:', error));
+}
+
+window.addEventListener('online', flushMovementQueueQuietly);
+setInterval(flushMovementQueueQuietly, SYNC_RETRY_MS);
+flushMovementQueueQuietly();
@@ -2,13 +2,22 @@
 let allProducts = [];
 let filteredProducts = [];
 
-// Load products on page load
-document.addEventListener('DOMContentLoaded', loadProducts);
+// Load products on page load, then keep them current from the stock stream
+document.addEventListener('DOMContentLoaded', () => {
+    loadProducts();
+    subscribeStockChanges(change => {
+        if (applyStockChange(allProducts, change)) {
+            displayProducts();
+        } else {
+            loadProducts();
+        }
+    });
+});
 
 // Load and display products
 async function loadProducts() {
     try {
-        allProducts = await api.getProducts();
+        allProducts = await api.syncProducts();
         filteredProducts = [...allProducts];
         displayProducts();
     } catch (error) {
@@ -107,23 +116,6 @@ function buildProductDetailsString(product) {
     return entries.length ? entries.join(' | ') : 'N/A';
 }
 
-function escapeForExcel(value) {
-    if (value === null || value === undefined) return '';
-    return String(value)
-        .replace(/&/g, '&amp;')
-        .replace(/</g, '&lt;')
-        .replace(/>/g, '&gt;');
-}
-
-function buildExcelCell(value, options = {}) {
-    const { isFormula = false } = options;
-    const safeValue = value ?? '';
-    if (isFormula && typeof safeValue === 'string' && safeValue.startsWith('=')) {
-        return `<td style="border: 1px solid #ccc; padding: 4px;">${safeValue}</td>`;
-    }
-    return `<td style="border: 1px solid #ccc; padding: 4px;">${escapeForExcel(safeValue)}</td>`;
-}
-
 function convertToMeters(value, unit = 'mm') {
     if (value === null || value === undefined || value === '') return null;
     const numeric = typeof value === 'number' ? value : parseFloat(value);
@@ -143,113 +135,6 @@ function buildDimensionSummary(product) {
     return `${alongLabel}: ${dims.length} ${lengthUnit}, ${aroundLabel}: ${dims.width} ${widthUnit}`;
 }
 
-function getProductFormatLabel(product) {
-    const category = (product?.category || '').toLowerCase();
-    const dims = product?.dimensions || {};
-    if (category === 'blankets' || category === 'underpacking') {
-        const stockType = dims.stockType || (dims.numberOfPieces ? 'pieces' : 'roll');
-        return stockType === 'pieces' ? 'Cut Pieces' : 'Roll';
-    }
-    if (category === 'chemicals') {
-        const format = dims.productFormat;
-        const unit = dims.chemicalUnit;
-        if (format && unit) return `${format} ${unit}`;
-        if (format) return `${format}`;
-        return unit || 'Chemical';
-    }
-    if (category === 'rules') {
-        if (dims.rulePackedAs === 'coil') return 'Coil';
-        if (dims.rulePackedAs === 'packets') return 'Packets';
-        return dims.stockUnit || 'Rules';
-    }
-    if (category === 'matrix') return 'Packets';
-    if (category === 'litho perf') return dims.lithoPieceType || 'Pieces';
-    if (dims.stockType) {
-        return formatDetailLabel(dims.stockType);
-    }
-    return '';
-}
-
-function getExcelColumnLabel(index) {
-    let label = '';
-    let current = index;
-    while (current > 0) {
-        const remainder = (current - 1) % 26;
-        label = String.fromCharCode(65 + remainder) + label;
-        current = Math.floor((current - 1) / 26);
-    }
-    return label;
-}
-
-function getColumnRefExpression(columnInfo) {
-    if (!columnInfo || typeof columnInfo.index !== 'number') return null;
-    return `INDIRECT(ADDRESS(ROW(),${columnInfo.index}))`;
-}
-
-function buildMeterConversionExpression(valueRef, unitRef) {
-    if (!valueRef) return null;
-    if (!unitRef) return valueRef;
-    return `IF(${unitRef}="",${valueRef},IF(LOWER(${unitRef})="mm",${valueRef}/1000,IF(LOWER(${unitRef})="inch",${valueRef}*0.0254,${valueRef})))`;
-}
-
-function buildStockQuantityFormula(product, dimensionColumns) {
-    const lengthRef = getColumnRefExpression(dimensionColumns.length);
-    const widthRef = getColumnRefExpression(dimensionColumns.width);
-    const lengthUnitRef = getColumnRefExpression(dimensionColumns.lengthUnit);
-    const widthUnitRef = getColumnRefExpression(dimensionColumns.widthUnit);
-
-    if (product.category === 'underpacking' && widthRef) {
-        const convertedWidth = buildMeterConversionExpression(widthRef, widthUnitRef);
-        if (convertedWidth) {
-            return `=IF(${widthRef}="","",ROUND(${convertedWidth},2))`;
-        }
-    }
-
-    const stockType = product.dimensions?.stockType;
-    const isBlanketRoll = product.category === 'blankets' && stockType === 'roll';
-
-    if (isBlanketRoll && lengthRef) {
-        const convertedLength = buildMeterConversionExpression(lengthRef, lengthUnitRef);
-        if (convertedLength) {
-            return `=IF(${lengthRef}="","",ROUND(${convertedLength},2))`;
-        }
-    }
-
-    if (product.category === 'blankets' && product.dimensions?.numberOfPieces) {
-        const piecesRef = getColumnRefExpression(dimensionColumns.numberOfPieces);
-        if (piecesRef) {
-            return `=IF(${piecesRef}="","",${piecesRef})`;
-        }
-    }
-
-    return null;
-}
-
-function buildStockSizeFormula(product, dimensionColumns) {
-    const lengthRef = getColumnRefExpression(dimensionColumns.length);
-    const widthRef = getColumnRefExpression(dimensionColumns.width);
-    const lengthUnitRef = getColumnRefExpression(dimensionColumns.lengthUnit);
-    const widthUnitRef = getColumnRefExpression(dimensionColumns.widthUnit);
-    const piecesRef = getColumnRefExpression(dimensionColumns.numberOfPieces);
-
-    if (!lengthRef || !widthRef) return null;
-
-    const applicableCategories = ['blankets', 'underpacking'];
-    if (!applicableCategories.includes(product.category)) return null;
-
-    const convertedLength = buildMeterConversionExpression(lengthRef, lengthUnitRef);
-    const convertedWidth = buildMeterConversionExpression(widthRef, widthUnitRef);
-    if (!convertedLength || !convertedWidth) return null;
-
-    const baseAreaExpression = `ROUND((${convertedLength})*(${convertedWidth}),4)`;
-
-    if (product.category === 'blankets' && product.dimensions?.numberOfPieces && piecesRef) {
-        return `=IF(OR(${lengthRef}="",${widthRef}="",${piecesRef}=""),"",TEXT(${baseAreaExpression},"0.0000") & " (x" & ${piecesRef} & ")")`;
-    }
-
-    return `=IF(OR(${lengthRef}="",${widthRef}=""),"",${baseAreaExpression})`;
-}
-
 function displayProducts() {
     const tbody = document.getElementById('products-tbody');
     const categoryFilter = document.getElementById('category-filter').value;
@@ -270,7 +155,7 @@ function displayProducts() {
                               product.dimensions && 
                               product.dimensions.numberOfPieces;
         const cutPieceSizeLabel = isBlanketPieces ? buildCutPieceStockSizeLabel(product, stockLevel) : null;
-        const status = getStockStatus(stockLevel, isBlanketPieces);
+        const status = getStockStatus(stockLevel, isBlanketPieces, product.reorderThreshold);
         const statusClass = getStatusClass(status);
         const lastUpdated = product.lastUpdated ? 
             new Date(product.lastUpdated).toLocaleDateString() : 'Never';
@@ -496,7 +381,7 @@ function showProductInfo(productId) {
                     <div class="info-section">
                         <h4>Stock Information</h4>
                         <p><strong>Current Stock:</strong> ${product.stock}</p>
-                        <p><strong>Status:</strong> ${getStockStatus(product.stock, product.category === 'blankets' && dimensions.stockType === 'pieces')}</p>
+                        <p><strong>Status:</strong> ${getStockStatus(product.stock, product.category === 'blankets' && dimensions.stockType === 'pieces', product.reorderThreshold)}</p>
                         <p><strong>Imported:</strong> ${product.imported ? 'Yes' : 'No'}</p>
                     </div>
                 </div>
@@ -541,20 +426,18 @@ document.addEventListener('click', (e) => {
 });
 
 // Get stock status text
-function getStockStatus(stock, isBlanketPieces = false) {
-    if (isBlanketPieces) {
-        // Different thresholds for blanket pieces
-        if (stock === 0) return 'Out of Stock';
-        if (stock < 3) return 'Low Stock';
-        if (stock < 10) return 'Medium Stock';
-        return 'In Stock';
-    } else {
-        // Original thresholds for sq.mtr
-        if (stock === 0) return 'Out of Stock';
-        if (stock < 10) return 'Low Stock';
-        if (stock < 50) return 'Medium Stock';
-        return 'In Stock';
-    }
+// reorderThreshold is maintained per product by the server; the fixed
+// values are only a fallback for records that predate it. At the default
+// threshold the Medium band keeps its original bound (10 pieces, 50 sq.mtr);
+// an overridden threshold moves it to five times the threshold.
+function getStockStatus(stock, isBlanketPieces = false, reorderThreshold = null) {
+    const defaultThreshold = isBlanketPieces ? 3 : 10;
+    const threshold = reorderThreshold ?? defaultThreshold;
+    const medium = threshold === defaultThreshold ? (isBlanketPieces ? 10 : 50) : threshold * 5;
+    if (stock === 0) return 'Out of Stock';
+    if (stock < threshold) return 'Low Stock';
+    if (stock < medium) return 'Medium Stock';
+    return 'In Stock';
 }
 
 // Get status CSS class
@@ -639,239 +522,24 @@ function sortProducts() {
     displayProducts();
 }
 
-// Export current filtered products to Excel
+// Export products to Excel (built and streamed by the server)
 function exportToExcel() {
-    if (!allProducts.length) {
-        alert('No products loaded to export');
-        return;
-    }
-
     const categoryFilter = document.getElementById('category-filter').value;
-    const baseColumns = [
-        { key: 'productName', label: 'Product Name' },
-        { key: 'category', label: 'Category' },
-        { key: 'productFormat', label: 'Product Format' },
-        { key: 'stockQuantity', label: 'Stock Quantity' },
-        { key: 'stockSize', label: 'Stock Size' },
-        { key: 'status', label: 'Status' }
-    ];
-    const categoryDataMap = {};
-    let exportScopeLabel = 'all';
-
-    if (categoryFilter) {
-        if (!filteredProducts.length) {
-            alert('No products available to export for the selected filters.');
-            return;
-        }
-        categoryDataMap[categoryFilter] = [...filteredProducts];
-        exportScopeLabel = categoryFilter.replace(/\s+/g, '_').toLowerCase();
-    } else {
+    const importedFilter = document.getElementById('imported-filter').value;
+
+    if (!categoryFilter) {
         const proceed = confirm('No category selected. Do you want to export ALL categories? Click Cancel to stop.');
         if (!proceed) return;
-        allProducts.forEach(product => {
-            if (!categoryDataMap[product.category]) {
-                categoryDataMap[product.category] = [];
-            }
-            categoryDataMap[product.category].push(product);
-        });
     }
 
-    const categoryEntries = Object.entries(categoryDataMap)
-        .filter(([, products]) => products.length)
-        .sort(([a], [b]) => a.localeCompare(b));
-
-    if (!categoryEntries.length) {
-        alert('No products available to export.');
-        return;
-    }
-
-    const tableSections = categoryEntries.map(([category, products]) => {
-        const dimensionKeys = new Set();
-        products.forEach(product => {
-            Object.entries(product.dimensions || {}).forEach(([key, value]) => {
-                if (value !== null && value !== undefined && value !== '') {
-                    dimensionKeys.add(key);
-                }
-            });
-        });
-        const categoryDimensionKeys = Array.from(dimensionKeys);
-        const dimensionColumns = categoryDimensionKeys.map(key => ({
-            key,
-            label: getLengthWidthLabel(key, category)
-        }));
-        const allColumns = [...baseColumns, ...dimensionColumns].map((col, idx) => ({
-            ...col,
-            index: idx + 1
-        }));
-        const baseColumnCount = baseColumns.length;
-        const dimensionColumnsWithIndex = allColumns.slice(baseColumnCount);
-        const dimensionColumnInfo = {};
-        dimensionColumnsWithIndex.forEach(col => {
-            dimensionColumnInfo[col.key] = col;
-        });
-        const headerCells = allColumns.map(col => col.label);
-        const colSpan = headerCells.length || baseColumnCount;
-
-        const productRows = products.map(product => {
-            const stockLevel = product.stock || 0;
-            const isBlanketPieces = product.category === 'blankets' && 
-                                  product.dimensions && 
-                                  product.dimensions.numberOfPieces;
-            const status = getStockStatus(stockLevel, isBlanketPieces);
-            
-            // Determine stock quantity and size based on type
-            let stockQuantity, stockSize, stockQuantityUnit, stockSizeUnit;
-            if (isBlanketPieces) {
-                stockQuantity = stockLevel.toFixed(0);
-                stockQuantityUnit = 'pcs';
-                stockSize = buildCutPieceStockSizeLabel(product, stockLevel) || '';
-                stockSizeUnit = '';
-            } else if (product.dimensions?.length && product.dimensions?.width && !isBlanketPieces) {
-                const lengthInMtr = convertToMeters(product.dimensions?.length, product.dimensions?.lengthUnit || 'mm') || 0;
-                const widthInMtr = convertToMeters(product.dimensions?.width, product.dimensions?.widthUnit || 'mm') || 0;
-                const calculatedSqMtr = lengthInMtr * widthInMtr;
-                
-                if (product.category === 'underpacking') {
-                    stockQuantity = widthInMtr.toFixed(2);
-                    stockQuantityUnit = 'mtr';
-                    stockSize = '';
-                    stockSizeUnit = '';
-                } else if (product.category === 'blankets') {
-                    stockQuantity = lengthInMtr.toFixed(2);
-                    stockQuantityUnit = 'mtr';
-                    stockSize = '';
-                    stockSizeUnit = '';
-                } else {
-                    stockQuantity = stockLevel.toFixed(2);
-                    stockQuantityUnit = 'units';
-                    stockSize = stockLevel.toFixed(2);
-                    stockSizeUnit = 'units';
-                }
-            } else {
-                if (product.category === 'chemicals') {
-                    const chemicalUnit = product.dimensions?.chemicalUnit || 'ltrs';
-                    stockQuantity = stockLevel.toFixed(2);
-                    stockQuantityUnit = chemicalUnit;
-                    stockSize = '';
-                    stockSizeUnit = '';
-                } else if (product.category === 'rules') {
-                    stockQuantity = stockLevel.toFixed(0);
-                    stockQuantityUnit = product.dimensions?.stockUnit || '';
-                    const containerLength = product.dimensions?.ruleContainerLength;
-                    const containerWidth = product.dimensions?.ruleContainerWidth;
-                    const containerType = product.dimensions?.ruleContainerType;
-                    if (containerLength != null && containerWidth != null && containerType) {
-                        const lengthDisplay = formatDimension(containerLength);
-                        const widthDisplay = formatDimension(containerWidth);
-                        stockSize = `${lengthDisplay} x ${widthDisplay} x ${containerType}`;
-                        stockSizeUnit = '';
-                    } else {
-                        stockSize = stockLevel.toFixed(0);
-                        stockSizeUnit = product.dimensions?.stockUnit || '';
-                    }
-                } else if (product.category === 'matrix') {
-                    stockQuantity = stockLevel.toFixed(0);
-                    stockQuantityUnit = 'pkts';
-                    stockSize = stockLevel.toFixed(0);
-                    stockSizeUnit = 'pkts';
-                } else if (product.category === 'litho perf') {
-                    stockQuantity = stockLevel.toFixed(0);
-                    stockQuantityUnit = 'pkts';
-                    stockSize = stockLevel.toFixed(0);
-                    stockSizeUnit = 'pkts';
-                } else {
-                    stockQuantity = stockLevel.toFixed(2);
-                    stockQuantityUnit = 'units';
-                    stockSize = stockLevel.toFixed(2);
-                    stockSizeUnit = 'units';
-                }
-            }
-
-            const quantityDisplay = stockQuantityUnit ? `${stockQuantity} [${stockQuantityUnit}]` : `${stockQuantity}`;
-            const sizeDisplay = stockSizeUnit ? `${stockSize} [${stockSizeUnit}]` : `${stockSize}`;
-            const stockQuantityFormula = buildStockQuantityFormula(product, dimensionColumnInfo);
-            const stockSizeFormula = buildStockSizeFormula(product, dimensionColumnInfo);
-            
-            // Create differentiated product name
-            let displayName = product.name;
-            if (product.category === 'matrix') {
-                const width = product.dimensions?.matrixSizeWidth || 'N/A';
-                const height = product.dimensions?.matrixSizeHeight || 'N/A';
-                const formattedWidth = width !== 'N/A' ? parseFloat(width).toFixed(1) : width;
-                const formattedHeight = height !== 'N/A' ? parseFloat(height).toFixed(1) : height;
-                const thickness = product.dimensions?.thickness;
-                if (thickness) {
-                    const thicknessUnit = product.dimensions.thicknessUnit === 'micron' ? 
-                        thickness + 'μ' : thickness + 'mm';
-                    displayName += ` (${formattedWidth} x ${formattedHeight}, ${thicknessUnit})`;
-                } else {
-                    displayName += ` (${formattedWidth} x ${formattedHeight})`;
-                }
-            } else if (product.dimensions?.thickness) {
-                const thickness = product.dimensions.thicknessUnit === 'micron' ? 
-                    product.dimensions.thickness + 'μ' : 
-                    product.dimensions.thickness + 'mm';
-                displayName += ` (${thickness})`;
-            } else if (isBlanketPieces) {
-                displayName += ' (Pieces)';
-            }
-
-            const baseCells = [
-                buildExcelCell(displayName),
-                buildExcelCell(product.category),
-                buildExcelCell(getProductFormatLabel(product)),
-                buildExcelCell(stockQuantityFormula ?? quantityDisplay, { isFormula: Boolean(stockQuantityFormula) }),
-                buildExcelCell(stockSizeFormula ?? sizeDisplay, { isFormula: Boolean(stockSizeFormula) }),
-                buildExcelCell(status)
-            ];
-
-            const dimensionCells = dimensionColumnsWithIndex.map(col => 
-                buildExcelCell(formatDetailValue(product.dimensions?.[col.key]))
-            );
-
-            const rowCells = [...baseCells, ...dimensionCells];
-            return `<tr>${rowCells.join('')}</tr>`;
-        }).join('');
-
-        return `
-            <tr>
-                <td colspan="${colSpan}" style="background-color: #e6f0ff; font-weight: bold; border: 1px solid #99b0d6; padding: 6px;">
-                    ${escapeForExcel(category.toUpperCase())}
-                </td>
-            </tr>
-            <tr>
-                ${headerCells.map(header => `<th style="background-color: #f8f8f8; border: 1px solid #ccc; text-align: left; padding: 5px;">${escapeForExcel(header)}</th>`).join('')}
-            </tr>
-            ${productRows}
-            <tr><td colspan="${colSpan}" style="height: 12px;"></td></tr>
-        `;
-    }).join('');
-
-    const htmlContent = `
-        <html>
-            <head>
-                <meta charset="UTF-8" />
-            </head>
-            <body>
-                <table cellspacing="0" cellpadding="0" style="border-collapse: collapse; font-family: Arial, sans-serif; font-size: 12px;">
-                    ${tableSections}
-                </table>
-            </body>
-        </html>
-    `;
+    const params = new URLSearchParams();
+    if (categoryFilter) params.set('category', categoryFilter);
+    if (importedFilter) params.set('imported', importedFilter);
+    const query = params.toString();
 
-    const blob = new Blob([htmlContent], { type: 'application/vnd.ms-excel' });
     const link = document.createElement('a');
-    const url = URL.createObjectURL(blob);
-    const timestamp = new Date().toISOString().slice(0, 10).replace(/-/g, '');
-    const filename = categoryFilter
-        ? `products_${exportScopeLabel}_${timestamp}.xls`
-        : `products_all_${timestamp}.xls`;
-
-    link.href = url;
-    link.download = filename;
+    link.href = `${API_BASE}/products/export.xlsx${query ? `?${query}` : ''}`;
     document.body.appendChild(link);
     link.click();
     document.body.removeChild(link);
-    URL.revokeObjectURL(url);
 }
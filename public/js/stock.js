@@ -480,8 +480,8 @@ function downloadTemplate() {
 
 function formatConflictDetails(conflicts = []) {
     if (!conflicts.length) return 'Differences detected.';
-    return conflicts.map((conflict, idx) => {
-        const lines = [`${idx + 1}. ${conflict.productName} (${conflict.productType})`];
+    return conflicts.map(conflict => {
+        const lines = [`${conflict.seq}. ${conflict.productName} (${conflict.productType})`];
         Object.entries(conflict.differences || {}).forEach(([field, diff]) => {
             lines.push(`   • ${field}: existing "${diff.existing ?? 'N/A'}" → incoming "${diff.incoming ?? 'N/A'}"`);
         });
@@ -489,17 +489,74 @@ function formatConflictDetails(conflicts = []) {
     }).join('\n\n');
 }
 
-async function submitExcelFile(file, statusElement, overwrite = false) {
+// Conflicts shown per confirmation dialog
+const CONFLICT_PAGE_SIZE = 20;
+
+// Upload the sheet and follow the server's NDJSON progress records.
+// Resolves with the final 'done' record.
+async function submitExcelFile(file, statusElement, { dryRun = false, overwrite = false } = {}) {
     const formData = new FormData();
     formData.append('excel-file', file);
     formData.append('overwrite', overwrite ? 'true' : 'false');
+    formData.append('dryRun', dryRun ? 'true' : 'false');
+    formData.append('stream', 'ndjson');
 
     const response = await fetch('/api/stock/upload-excel', {
         method: 'POST',
         body: formData
     });
+    if (!response.ok) {
+        const payload = await response.json().catch(() => ({}));
+        throw new Error(payload.error || `HTTP error! status: ${response.status}`);
+    }
+
+    let result = null;
+    await readNdjson(response, record => {
+        if (record.type === 'progress') {
+            statusElement.textContent = `${dryRun ? 'Checking' : 'Importing'}... ${record.processed} of ${record.rows} rows`;
+        } else if (record.type === 'done') {
+            result = record;
+        } else if (record.type === 'error') {
+            throw new Error(record.error);
+        }
+    });
+    if (!result) throw new Error('Upload ended before it completed');
+    return result;
+}
+
+// Page through an import's conflicts, asking overwrite/skip for each page,
+// and send only those choices back to the server.
+async function resolveImportConflicts(importId, total, statusElement) {
+    const totals = { updated: 0, skipped: 0 };
+    let after = 0;
+    while (true) {
+        const page = await apiCall(`/stock/imports/${importId}/conflicts?after=${after}&limit=${CONFLICT_PAGE_SIZE}`);
+        if (!page.conflicts.length) break;
 
-    return { response, payload: await response.json() };
+        const first = page.conflicts[0].seq;
+        const last = page.conflicts[page.conflicts.length - 1].seq;
+        const overwrite = confirm(
+            `Rows ${first}-${last} of ${total} differ from what is already stored.\n\n` +
+            `${formatConflictDetails(page.conflicts)}\n\n` +
+            'Click OK to overwrite these entries with the incoming data, or Cancel to keep the stored data.'
+        );
+        statusElement.textContent = `Applying choices for rows ${first}-${last} of ${total}...`;
+        const result = await apiCall(`/stock/imports/${importId}/resolve`, {
+            method: 'POST',
+            body: JSON.stringify({
+                resolutions: page.conflicts.map(conflict => ({
+                    seq: conflict.seq,
+                    action: overwrite ? 'overwrite' : 'skip'
+                }))
+            })
+        });
+        totals.updated += result.updated;
+        totals.skipped += result.skipped;
+
+        after = last;
+        if (page.next === null) break;
+    }
+    return totals;
 }
 
 // Handle Excel file upload
@@ -523,47 +580,34 @@ async function uploadExcel() {
     const file = fileInput.files[0];
     
     try {
-        statusElement.textContent = 'Uploading...';
+        statusElement.textContent = 'Checking file...';
         statusElement.style.color = 'blue';
 
-        const initialResult = await submitExcelFile(file, statusElement, false);
-        if (initialResult.response.ok) {
-            const { inserted = 0, updated = 0, skipped = 0 } = initialResult.payload;
-            statusElement.textContent = `Upload complete: ${inserted} inserted, ${updated} updated, ${skipped} skipped.`;
-            statusElement.style.color = 'green';
-            fileInput.value = '';
+        // Dry run first so nothing is written until the summary is accepted
+        const preview = await submitExcelFile(file, statusElement, { dryRun: true });
+        const proceed = confirm(
+            `This file has ${preview.rows} rows: ${preview.inserted} new, ${preview.skipped} already up to date ` +
+            `and ${preview.conflicts} that differ from stored data.\n\n` +
+            'Click OK to import. Rows that differ will be shown for review afterwards.'
+        );
+        if (!proceed) {
+            statusElement.textContent = 'Upload cancelled. No changes were made.';
+            statusElement.style.color = 'orange';
             return;
         }
 
-        if (initialResult.response.status === 409 && initialResult.payload.error === 'CONFLICTS_FOUND') {
-            const conflictMessage = formatConflictDetails(initialResult.payload.conflicts);
-            const proceed = confirm(
-                `Some rows differ from what is already stored.\n\n${conflictMessage}\n\n` +
-                'Click OK to overwrite existing entries with the incoming data, or Cancel to abort.'
-            );
-            
-            if (proceed) {
-                statusElement.textContent = 'Overwriting conflicting records...';
-                statusElement.style.color = 'blue';
-                const overwriteResult = await submitExcelFile(file, statusElement, true);
-                if (overwriteResult.response.ok) {
-                    const { inserted = 0, updated = 0, skipped = 0 } = overwriteResult.payload;
-                    statusElement.textContent = `Overwrite complete: ${inserted} inserted, ${updated} updated, ${skipped} skipped.`;
-                    statusElement.style.color = 'green';
-                    fileInput.value = '';
-                } else {
-                    statusElement.textContent = 'Upload failed: ' + overwriteResult.payload.error;
-                    statusElement.style.color = 'red';
-                }
-            } else {
-                statusElement.textContent = 'Upload cancelled. No changes were made.';
-                statusElement.style.color = 'orange';
-            }
-            return;
+        const result = await submitExcelFile(file, statusElement);
+        let updated = result.updated;
+        let skipped = result.skipped;
+        if (result.conflicts > 0) {
+            const resolved = await resolveImportConflicts(result.importId, result.conflicts, statusElement);
+            updated += resolved.updated;
+            skipped += resolved.skipped;
         }
 
-        statusElement.textContent = 'Upload failed: ' + (initialResult.payload?.error || 'Unknown error');
-        statusElement.style.color = 'red';
+        statusElement.textContent = `Upload complete: ${result.inserted} inserted, ${updated} updated, ${skipped} skipped.`;
+        statusElement.style.color = 'green';
+        fileInput.value = '';
     } catch (error) {
         statusElement.textContent = 'Upload failed: ' + error.message;
         statusElement.style.color = 'red';
@@ -684,13 +728,7 @@ if (document.getElementById('stock-in-form')) {
         console.log('Form data being sent:', formData);
 
         try {
-            const response = await fetch('/api/stock/in/detailed', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
-                body: JSON.stringify(formData)
-            });
+            const response = await submitForm('stockInDetailed', '/stock/in/detailed', formData);
             
             const result = await response.json();
             
@@ -912,24 +950,18 @@ async function handleDuplicateRoll(errorResponse, formData) {
         
         try {
             // Add with import date
-            const response = await fetch('/api/stock/in/detailed/confirm-duplicate', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
-                body: JSON.stringify({
-                    action: 'add_with_date',
-                    rollData: {
-                        ...formData,
-                        importDate: importDate
-                    }
-                })
+            const response = await submitForm('confirmDuplicateRoll', '/stock/in/detailed/confirm-duplicate', {
+                action: 'add_with_date',
+                rollData: {
+                    ...formData,
+                    importDate: importDate
+                }
             });
             
             const result = await response.json();
             
             if (response.ok) {
-                alert(`Stock added successfully as: ${result.uniqueName}`);
+                alert(`Stock added to ${result.productName} as roll ${result.rollNumber || ''} imported ${result.importDate}`);
                 
                 // Preserve the selected product type before resetting
                 const selectedProductType = document.getElementById('product-type').value;
@@ -963,14 +995,22 @@ if (document.getElementById('stock-out-form')) {
         const quantity = parseInt(document.getElementById('quantity').value);
 
         try {
-            await api.issueStock({ productId, quantity, type: 'out' });
+            const result = await api.issueStock({ productId, quantity, type: 'out' });
             document.getElementById('stock-out-form').reset();
-            alert('Stock issued successfully');
+            alert(result.queued
+                ? 'No connection: the stock issue was saved and will be sent automatically'
+                : 'Stock issued successfully');
         } catch (error) {
             alert('Error issuing stock: ' + error.message);
         }
     });
 
+    // Queued issues the server turned down once the connection came back
+    window.addEventListener('movementsrejected', (e) => {
+        const reasons = e.detail.map(item => (item.body && item.body.error) || `status ${item.status}`);
+        alert(`${e.detail.length} queued stock movement(s) could not be applied:\n` + reasons.join('\n'));
+    });
+
     document.addEventListener('DOMContentLoaded', loadProductsForStock);
 }
 
@@ -0,0 +1,78 @@
+"""Builders for synthetic blanket and underpacking roll/piece stock.
+
+Used by add_sample_data.py; the documents mirror what
+/api/stock/in/detailed writes for the same stock types.
+"""
+from .utils.dimensions import canonical_dimensions
+
+BLANKET_BRANDS = ['Conti', 'SAVA', 'Image', 'B4P', 'MTech', 'Thompson']
+UNDERPACKING_BRANDS = ['HS Boyd', 'M3Z', 'MPack', 'Policrom']
+BLANKET_THICKNESSES = [1.70, 1.95, 1.96, 1.97, 2.0]
+UNDERPACKING_THICKNESSES = [0.05, 0.10, 0.125, 0.15, 0.19, 0.25, 0.30]
+ROLL_WIDTHS_MM = [1000, 1050, 1060, 1250, 1450, 1600]
+PIECE_SIZES_MM = [(1030, 790), (1050, 785), (745, 605), (830, 650), (1040, 800)]
+
+
+def roll_number(rng, product_type):
+    prefix = 'BL' if product_type == 'blankets' else 'UP'
+    return f"{prefix}{rng.randint(100000, 999999)}"
+
+
+def build_roll(rng, product_type, import_date):
+    thickness = rng.choice(BLANKET_THICKNESSES if product_type == 'blankets' else UNDERPACKING_THICKNESSES)
+    length_m = rng.choice([25, 30, 40, 50, 100])
+    width_mm = rng.choice(ROLL_WIDTHS_MM)
+    dimensions = {
+        'stockType': 'roll',
+        'length': length_m,
+        'width': width_mm,
+        'lengthUnit': 'mtr',
+        'widthUnit': 'mm',
+        'thickness': thickness,
+        'thicknessUnit': 'mm',
+        'rollNumber': roll_number(rng, product_type),
+        'importDate': import_date.strftime('%Y-%m-%d')
+    }
+    sq_mtr = round(length_m * width_mm / 1000, 2)
+    return dimensions, sq_mtr
+
+
+def build_pieces(rng, product_type):
+    length_mm, width_mm = rng.choice(PIECE_SIZES_MM)
+    thickness = rng.choice(BLANKET_THICKNESSES if product_type == 'blankets' else UNDERPACKING_THICKNESSES)
+    sq_mtr_per_piece = round(length_mm * width_mm / 1_000_000, 4)
+    number_of_pieces = rng.randint(5, 200)
+    dimensions = {
+        'stockType': 'pieces',
+        'length': length_mm,
+        'width': width_mm,
+        'lengthUnit': 'mm',
+        'widthUnit': 'mm',
+        'thickness': thickness,
+        'thicknessUnit': 'mm',
+        'numberOfPieces': number_of_pieces,
+        'sqMtrPerPiece': sq_mtr_per_piece,
+        'totalSqMtr': round(sq_mtr_per_piece * number_of_pieces, 4)
+    }
+    return dimensions, number_of_pieces
+
+
+def build_detailed_record(product_type, product_name, product_id, dimensions, quantity, import_date):
+    record = {
+        'productType': product_type,
+        'productName': product_name,
+        'productId': product_id,
+        'stockType': dimensions.get('stockType'),
+        'importDate': import_date,
+        'takenDate': None,
+        'createdAt': import_date
+    }
+    for key in ['length', 'width', 'lengthUnit', 'widthUnit', 'thickness', 'thicknessUnit',
+                'rollNumber', 'numberOfPieces', 'sqMtrPerPiece', 'totalSqMtr']:
+        if key in dimensions:
+            record[key] = dimensions[key]
+    if dimensions.get('stockType') == 'roll':
+        record['sqMtr'] = quantity
+    record.update(canonical_dimensions(dimensions))
+    return record
+
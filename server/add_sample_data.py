@@ -0,0 +1,205 @@
+"""Fill a local MongoDB with a synthetic, production-sized catalogue.
+
+    python -m server.add_sample_data --products 20000 --years 5 --drop
+
+Products are spread across every productType, blanket and underpacking
+products carry roll/piece dimensions with matching detailed_stock records
+(and a db.rolls entry for each roll), and each product gets a
+stock_transactions ledger spanning --years so that stock equals the sum of
+its movements. Products carry the fields the app's own writes add
+(changeSeq, signatureHash, reorderThreshold/belowThreshold and the
+canonical dimensions), so delta sync, the catalogue snapshot, alerts and
+Excel re-uploads behave as they do against real data. Point the app at the same database
+with MONGODB_URI / MONGODB_DB before running server.benchmarks.load_test.
+"""
+import argparse
+import random
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from pymongo import MongoClient
+from pymongo.errors import BulkWriteError
+
+from .add_roll_data import BLANKET_BRANDS, UNDERPACKING_BRANDS, build_detailed_record, build_pieces, build_roll
+from .db.changes import reserve_change_seqs
+from .db.thresholds import threshold_fields
+from .repositories.rolls import roll_document
+from .utils.dimensions import canonical_dimensions
+from .utils.signature import signature_fields
+
+PRODUCT_TYPES = ['blankets', 'underpacking', 'litho perf', 'matrix', 'rules', 'chemicals']
+# Rough share of each type in the real catalogue
+TYPE_WEIGHTS = [40, 20, 8, 10, 12, 10]
+
+
+def build_dimensions(rng, product_type, import_date):
+    """Return (dimensions, opening quantity) for one product."""
+    if product_type in ['blankets', 'underpacking']:
+        if rng.random() < 0.7:
+            return build_roll(rng, product_type, import_date)
+        return build_pieces(rng, product_type)
+    if product_type == 'litho perf':
+        return {
+            'stockType': 'pieces',
+            'lithoPieceType': rng.choice(['card', 'paper']),
+            'perforationType': rng.choice(['center', 'side', 'center-micro perf', 'side-micro perf']),
+            'productTPI': rng.choice([12, 18, 24, 36])
+        }, float(rng.randint(10, 500))
+    if product_type == 'matrix':
+        return {
+            'stockType': 'pieces',
+            'matrixFormat': rng.choice(['9 MM', '11 MM', '13 MM']),
+            'matrixSizeWidth': rng.choice([0.3, 0.4, 0.5, 0.7]),
+            'matrixSizeHeight': rng.choice([1.0, 1.2, 1.3, 1.5]),
+            'stockUnit': 'pkts'
+        }, float(rng.randint(1, 60))
+    if product_type == 'rules':
+        packed_as = rng.choice(['coil', 'packets'])
+        return {
+            'stockType': packed_as,
+            'ruleFormat': rng.choice(['creasing rule', 'cutting rule']),
+            'rulePackedAs': packed_as,
+            'stockUnit': 'coils' if packed_as == 'coil' else 'pkts',
+            'ruleContainerLength': rng.choice([23.3, 23.8]),
+            'ruleContainerWidth': rng.choice([2, 3]),
+            'ruleContainerType': rng.choice(['2pt', '3pt', 'label rule'])
+        }, float(rng.randint(1, 40))
+    return {
+        'stockType': 'chemical',
+        'productFormat': rng.choice([1, 5, 25, 200]),
+        'chemicalUnit': rng.choice(['kg', 'ltr'])
+    }, float(rng.randint(1, 100))
+
+
+def product_name(rng, product_type, index):
+    if product_type == 'blankets':
+        return f"{rng.choice(BLANKET_BRANDS)} Rubber Blanket {index}"
+    if product_type == 'underpacking':
+        return f"{rng.choice(UNDERPACKING_BRANDS)} Underpacking {rng.choice(['Paper', 'Film'])} {index}"
+    if product_type == 'chemicals':
+        return f"{rng.choice(['Washing Solution', 'Fountain Solution', 'Plate Cleaner', 'Roller Wash'])} {index}"
+    return f"{product_type.title()} {index}"
+
+
+def build_ledger(rng, product_id, opening_quantity, start, end):
+    """Opening receipt followed by a random walk of issues and receipts."""
+    entries = [{'product_id': product_id, 'quantity': opening_quantity, 'type': 'in', 'timestamp': start}]
+    stock = opening_quantity
+    span = (end - start).total_seconds()
+    moments = sorted(start + timedelta(seconds=rng.random() * span) for _ in range(rng.randint(2, 60)))
+    for moment in moments:
+        if stock > 0 and rng.random() < 0.6:
+            quantity = round(min(stock, max(stock * rng.random() * 0.3, 1)), 2)
+            stock -= quantity
+            entries.append({'product_id': product_id, 'quantity': quantity, 'type': 'out', 'timestamp': moment})
+        else:
+            quantity = round(opening_quantity * rng.uniform(0.2, 1.0), 2)
+            stock += quantity
+            entries.append({'product_id': product_id, 'quantity': quantity, 'type': 'in', 'timestamp': moment})
+    return entries, round(stock, 2)
+
+
+def generate(db, count, years, seed=0, batch_size=1000):
+    rng = random.Random(seed)
+    end = datetime.utcnow()
+    start = end - timedelta(days=365 * years)
+    totals = {'products': 0, 'detailed_stock': 0, 'stock_transactions': 0, 'rolls': 0}
+
+    products, detailed, ledger, rolls = [], [], [], []
+
+    def flush():
+        if products:
+            # One sequence number per product, as the migrations stamp them
+            first = reserve_change_seqs(len(products), db)
+            for offset, product in enumerate(products):
+                product['changeSeq'] = first + offset
+            db.products.insert_many(products, ordered=False)
+        if detailed:
+            db.detailed_stock.insert_many(detailed, ordered=False)
+        if ledger:
+            db.stock_transactions.insert_many(ledger, ordered=False)
+        if rolls:
+            try:
+                totals['rolls'] += len(db.rolls.insert_many(rolls, ordered=False).inserted_ids)
+            except BulkWriteError as e:
+                # A roll number drawn twice for the same import date is registered once
+                if any(error['code'] != 11000 for error in e.details['writeErrors']):
+                    raise
+                totals['rolls'] += e.details['nInserted']
+        totals['products'] += len(products)
+        totals['detailed_stock'] += len(detailed)
+        totals['stock_transactions'] += len(ledger)
+        products.clear()
+        detailed.clear()
+        ledger.clear()
+        rolls.clear()
+
+    for index in range(count):
+        product_type = rng.choices(PRODUCT_TYPES, weights=TYPE_WEIGHTS)[0]
+        created_at = start + timedelta(seconds=rng.random() * (end - start).total_seconds() * 0.5)
+        dimensions, quantity = build_dimensions(rng, product_type, created_at)
+        name = product_name(rng, product_type, index)
+        object_id = ObjectId()
+        product_id = str(object_id)
+
+        entries, stock = build_ledger(rng, product_id, quantity, created_at, end)
+        last_updated = entries[-1]['timestamp']
+        product = {
+            '_id': object_id,
+            'name': name,
+            'category': product_type,
+            'stock': stock,
+            'imported': rng.random() < 0.8,
+            'dimensions': dimensions,
+            'createdAt': created_at,
+            'lastUpdated': last_updated
+        }
+        product.update(canonical_dimensions(dimensions))
+        product.update(signature_fields(name, product_type, dimensions))
+        product.update(threshold_fields(stock, product_type, dimensions, db))
+        products.append(product)
+        ledger.extend(entries)
+
+        if product_type in ['blankets', 'underpacking']:
+            detailed.append(build_detailed_record(product_type, name, product_id, dimensions, quantity, created_at))
+            if dimensions.get('rollNumber'):
+                # As server.migrate_rolls registers them: the product's stock is what is left of its roll
+                rolls.append(roll_document(
+                    object_id, product_type, name, dimensions['rollNumber'], dimensions,
+                    import_date=dimensions.get('importDate'), sq_mtr=quantity, remaining_sq_mtr=stock
+                ))
+
+        if len(products) >= batch_size:
+            flush()
+            print(f"  {totals['products']}/{count} products")
+
+    flush()
+    return totals
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--uri', default='mongodb://localhost:27017', help='MongoDB URI (defaults to a local server)')
+    parser.add_argument('--db', default='stock_management_load', help='database name')
+    parser.add_argument('--products', type=int, default=10000)
+    parser.add_argument('--years', type=int, default=5, help='length of the generated ledger history')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--drop', action='store_true', help='drop the generated collections first')
+    args = parser.parse_args(argv)
+
+    if 'mongodb.net' in args.uri:
+        parser.error('refusing to generate sample data against an Atlas cluster; use a local MongoDB')
+
+    db = MongoClient(args.uri)[args.db]
+    if args.drop:
+        for name in ['products', 'detailed_stock', 'stock_transactions', 'rolls']:
+            db.drop_collection(name)
+
+    totals = generate(db, args.products, args.years, seed=args.seed, batch_size=args.batch_size)
+    print(f"Inserted {totals['products']} products, {totals['detailed_stock']} detailed stock records, "
+          f"{totals['rolls']} rolls and {totals['stock_transactions']} ledger entries into {args.db}")
+
+
+if __name__ == '__main__':
+    main()
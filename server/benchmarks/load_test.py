@@ -0,0 +1,176 @@
+"""Open-loop load driver for a running server.
+
+    python -m server.benchmarks.load_test --base-url http://localhost:5000 --rate 20 --duration 60
+
+Requests are scheduled at a fixed --rate regardless of how fast the server
+answers, so queueing shows up as latency rather than as a lower send rate.
+Prints throughput and p50/p95/p99 latency per endpoint. Run it against a
+database filled by server.add_sample_data, never against production: the
+POST endpoints write real stock movements.
+"""
+import argparse
+import json
+import math
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+# (label, weight) — roughly the shop-floor mix of reads to writes
+DEFAULT_MIX = [
+    ('GET /api/products', 30),
+    ('GET /api/stock', 25),
+    ('GET /api/reports', 15),
+    ('POST /api/stock/in/detailed', 15),
+    ('POST /api/stock/out', 15),
+]
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    # Nearest-rank percentile
+    index = min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def http_request(base_url, method, path, payload=None, timeout=30):
+    body = json.dumps(payload).encode('utf-8') if payload is not None else None
+    request = urllib.request.Request(
+        f'{base_url}{path}',
+        data=body,
+        method=method,
+        headers={'Content-Type': 'application/json'} if body is not None else {}
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+class LoadDriver:
+    def __init__(self, base_url, mix, seed=0, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.labels = [label for label, _ in mix]
+        self.weights = [weight for _, weight in mix]
+        self.rng = random.Random(seed)
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.latencies = {label: [] for label in self.labels}
+        self.errors = {label: 0 for label in self.labels}
+        self.product_ids = []
+
+    def load_product_ids(self):
+        with urllib.request.urlopen(f'{self.base_url}/api/products', timeout=self.timeout) as response:
+            products = json.loads(response.read())
+        self.product_ids = [p['_id'] for p in products if p.get('stock', 0) >= 1]
+
+    def build_call(self, label):
+        method, path = label.split(' ', 1)
+        if path == '/api/stock/out':
+            if not self.product_ids:
+                return None
+            return method, path, {'productId': self.rng.choice(self.product_ids), 'quantity': 1}
+        if path == '/api/stock/in/detailed':
+            roll_number = f'LT{self.rng.randint(10 ** 8, 10 ** 9 - 1)}'
+            width = self.rng.choice([1000, 1050, 1060, 1250])
+            return method, path, {
+                'productType': 'blankets',
+                'productName': f'Load Test Blanket {self.rng.randint(1, 200)}',
+                'stockType': 'roll',
+                'thickness': self.rng.choice([1.95, 1.96, 1.97]),
+                'thicknessUnit': 'mm',
+                'length': 30,
+                'lengthUnit': 'mtr',
+                'width': width,
+                'widthUnit': 'mm',
+                'sqMtr': round(30 * width / 1000, 2),
+                'rollNumber': roll_number,
+                'importDate': time.strftime('%Y-%m-%d')
+            }
+        return method, path, None
+
+    def execute(self, label, call, scheduled):
+        # Timed from the scheduled send, not from when a pool thread picked
+        # the request up: time spent waiting for a free thread when the
+        # driver falls behind is latency too (no coordinated omission)
+        method, path, payload = call
+        try:
+            status = http_request(self.base_url, method, path, payload, self.timeout)
+            failed = status >= 500
+        except Exception:
+            failed = True
+        elapsed_ms = (time.perf_counter() - scheduled) * 1000
+        with self.lock:
+            self.latencies[label].append(elapsed_ms)
+            if failed:
+                self.errors[label] += 1
+
+    def run(self, rate, duration, workers):
+        interval = 1.0 / rate
+        deadline = time.perf_counter() + duration
+        next_send = time.perf_counter()
+        sent = 0
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            while next_send < deadline:
+                now = time.perf_counter()
+                if now < next_send:
+                    time.sleep(next_send - now)
+                label = self.rng.choices(self.labels, weights=self.weights)[0]
+                call = self.build_call(label)
+                if call is not None:
+                    pool.submit(self.execute, label, call, next_send)
+                    sent += 1
+                next_send += interval
+        return sent
+
+    def report(self, wall_seconds):
+        print(f"{'endpoint':<32}{'count':>8}{'req/s':>9}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        total = 0
+        for label in self.labels:
+            values = sorted(self.latencies[label])
+            total += len(values)
+            print(f"{label:<32}{len(values):>8}{len(values) / wall_seconds:>9.1f}{self.errors[label]:>8}"
+                  f"{percentile(values, 0.50):>10.1f}{percentile(values, 0.95):>10.1f}{percentile(values, 0.99):>10.1f}")
+        print(f'Total {total} requests in {wall_seconds:.1f}s ({total / wall_seconds:.1f} req/s)')
+
+
+def parse_mix(value):
+    mix = []
+    for part in value.split(','):
+        label, _, weight = part.rpartition('=')
+        mix.append((label.strip(), float(weight)))
+    return mix
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', default='http://localhost:5000')
+    parser.add_argument('--rate', type=float, default=10.0, help='target requests per second')
+    parser.add_argument('--duration', type=float, default=30.0, help='seconds to send for')
+    parser.add_argument('--workers', type=int, default=32, help='maximum concurrent requests')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX,
+                        help="weights, e.g. 'GET /api/products=5,POST /api/stock/out=1'")
+    args = parser.parse_args(argv)
+
+    driver = LoadDriver(args.base_url, args.mix, seed=args.seed, timeout=args.timeout)
+    driver.load_product_ids()
+    print(f'{len(driver.product_ids)} products with stock available for /api/stock/out')
+
+    start = time.perf_counter()
+    sent = driver.run(args.rate, args.duration, args.workers)
+    wall_seconds = time.perf_counter() - start
+    print(f'Sent {sent} requests at a target of {args.rate:g} req/s')
+    driver.report(wall_seconds)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
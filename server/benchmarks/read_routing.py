@@ -0,0 +1,56 @@
+"""Check which replica-set members serve each read profile.
+
+    python -m server.benchmarks.read_routing --samples 20
+
+Sends 'hello' through the reporting and movements profiles (with their read
+preferences) and reports which members answered. Fails if a movements read
+left the primary, or if reporting reads hit the primary while a matching
+secondary was available. docker-compose.replicaset.yml starts a suitable
+local replica set.
+"""
+import argparse
+from collections import Counter
+from ..db import database
+
+
+def sample(profile, samples):
+    profile_db = database.get_profile_db(profile)
+    members = Counter()
+    for _ in range(samples):
+        reply = profile_db.command('hello', read_preference=profile_db.read_preference)
+        role = 'primary' if reply.get('isWritablePrimary') else 'secondary'
+        tags = ','.join(f'{k}:{v}' for k, v in sorted((reply.get('tags') or {}).items()))
+        members[(reply.get('me', '?'), role, tags)] += 1
+    return members
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--samples', type=int, default=20)
+    args = parser.parse_args()
+
+    hello = database.get_db().command('hello')
+    if not hello.get('setName'):
+        raise SystemExit('MONGODB_URI does not point at a replica set')
+    print(f"Replica set {hello['setName']}: {', '.join(hello.get('hosts', []))}")
+    print(f"Reporting read preference: {database.reporting_read_preference().document}")
+
+    failures = []
+    for profile in ['movements', 'reporting']:
+        members = sample(profile, args.samples)
+        print(f'\n{profile}:')
+        for (member, role, tags), count in members.most_common():
+            print(f"  {member:<24} {role:<9} {tags or '-':<24} {count}")
+        roles = {role for _, role, _ in members}
+        if profile == 'movements' and roles != {'primary'}:
+            failures.append('movements reads were served by a secondary')
+        if profile == 'reporting' and 'primary' in roles and database.MONGODB_REPORTING_READ != 'primary':
+            failures.append('reporting reads reached the primary (no eligible secondary within staleness/tags?)')
+
+    if failures:
+        raise SystemExit('\n' + '\n'.join(failures))
+    print('\nRead routing OK')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,234 @@
+"""Micro-benchmarks and golden-output check for the analyze-excel extractors.
+
+    python -m server.benchmarks.sku_extractors                    # run, print ns/row
+    python -m server.benchmarks.sku_extractors --save base.json   # save a baseline
+    python -m server.benchmarks.sku_extractors --compare base.json
+    python -m server.benchmarks.sku_extractors --check-golden     # classification unchanged?
+    python -m server.benchmarks.sku_extractors --update-golden    # after an intended rule change
+
+Exits non-zero when a function regresses past --threshold or the golden
+output differs.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+from ..routes.sku import (
+    _classify_row,
+    _clean_text,
+    _extract_brand,
+    _extract_product_name,
+    _extract_size,
+    _extract_specification,
+    _match_category,
+    _match_type_and_category_override,
+    _normalize_brand,
+    _normalize_text,
+)
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+CORPUS_PATH = os.path.join(DATA_DIR, 'sku_corpus.csv')
+GOLDEN_PATH = os.path.join(DATA_DIR, 'sku_golden.json')
+
+
+def load_corpus(path=CORPUS_PATH):
+    with open(path, newline='', encoding='utf-8') as handle:
+        return [
+            (row['name'] or None, row['description'] or None, row['product_format'] or None)
+            for row in csv.DictReader(handle)
+        ]
+
+
+def classify(rows):
+    results = []
+    for name, description, product_format in rows:
+        product_name, brand, size, type_value, category = _classify_row(name, description, product_format)
+        results.append({
+            'name': name,
+            'description': description,
+            'product_format': product_format,
+            'product_name': product_name,
+            'brand': brand,
+            'size': size,
+            'type': type_value,
+            'category': category,
+            'specification': _extract_specification(name, description, product_format, size, brand),
+        })
+    return results
+
+
+def build_cases(rows):
+    """Pair each extractor with per-row argument tuples, precomputing the
+    upstream values it depends on so only the function itself is timed."""
+    cases = {name: [] for name in [
+        '_clean_text', '_normalize_text', '_extract_size', '_extract_brand', '_normalize_brand',
+        '_extract_specification', '_extract_product_name', '_match_category',
+        '_match_type_and_category_override', '_classify_row',
+    ]}
+    for name, description, product_format in rows:
+        size = _extract_size(name, description, product_format)
+        extracted = _extract_brand(name, description)
+        brand = _normalize_brand(extracted, name, description, product_format)
+        category, fallback_type = _match_category(name, description, product_format)
+
+        cases['_clean_text'].append((description,))
+        cases['_normalize_text'].append((description,))
+        cases['_extract_size'].append((name, description, product_format))
+        cases['_extract_brand'].append((name, description))
+        cases['_normalize_brand'].append((extracted, name, description, product_format))
+        cases['_extract_specification'].append((name, description, product_format, size, brand))
+        cases['_extract_product_name'].append((name, brand))
+        cases['_match_category'].append((name, description, product_format))
+        cases['_match_type_and_category_override'].append(
+            (brand, name, description, product_format, fallback_type, category)
+        )
+        cases['_classify_row'].append((name, description, product_format))
+    return cases
+
+
+FUNCTIONS = {
+    '_clean_text': _clean_text,
+    '_normalize_text': _normalize_text,
+    '_extract_size': _extract_size,
+    '_extract_brand': _extract_brand,
+    '_normalize_brand': _normalize_brand,
+    '_extract_specification': _extract_specification,
+    '_extract_product_name': _extract_product_name,
+    '_match_category': _match_category,
+    '_match_type_and_category_override': _match_type_and_category_override,
+    '_classify_row': _classify_row,
+}
+
+
+def measure(func, arg_rows, repeat):
+    # Best-of timing: each pass walks the whole corpus once.
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        for args in arg_rows:
+            func(*args)
+        elapsed = time.perf_counter_ns() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    tracemalloc.reset_peak()
+    for args in arg_rows:
+        func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, 'filename') if stat.count_diff > 0)
+
+    rows = len(arg_rows) or 1
+    return {
+        'ns_per_row': round(best / rows, 1),
+        'peak_bytes_per_row': round(peak / rows, 1),
+        'retained_blocks': blocks,
+    }
+
+
+def run(rows, repeat):
+    cases = build_cases(rows)
+    # Warm the regex cache so the first function is not charged for compiling.
+    classify(rows)
+    return {name: measure(FUNCTIONS[name], cases[name], repeat) for name in FUNCTIONS}
+
+
+def print_results(results, baseline=None):
+    header = f"{'function':<36}{'ns/row':>12}{'peak B/row':>12}{'blocks':>8}"
+    if baseline:
+        header += f"{'baseline':>12}{'change':>9}"
+    print(header)
+    for name, stats in results.items():
+        line = f"{name:<36}{stats['ns_per_row']:>12.1f}{stats['peak_bytes_per_row']:>12.1f}{stats['retained_blocks']:>8}"
+        if baseline and name in baseline:
+            base = baseline[name]['ns_per_row']
+            change = (stats['ns_per_row'] - base) / base if base else 0.0
+            line += f"{base:>12.1f}{change:>+9.1%}"
+        print(line)
+
+
+def find_regressions(results, baseline, threshold):
+    regressions = []
+    for name, stats in results.items():
+        base = baseline.get(name, {}).get('ns_per_row')
+        if base and stats['ns_per_row'] > base * (1 + threshold):
+            regressions.append(name)
+    return regressions
+
+
+def check_golden(rows, path=GOLDEN_PATH):
+    with open(path, encoding='utf-8') as handle:
+        expected = json.load(handle)
+    actual = classify(rows)
+    mismatches = []
+    if len(expected) != len(actual):
+        mismatches.append(f'corpus has {len(actual)} rows, golden file has {len(expected)}')
+    for index, (want, got) in enumerate(zip(expected, actual)):
+        for key, value in want.items():
+            if got.get(key) != value:
+                mismatches.append(f'row {index + 2} {key}: expected {value!r}, got {got.get(key)!r}')
+    return mismatches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', default=CORPUS_PATH)
+    parser.add_argument('--repeat', type=int, default=20, help='timed passes over the corpus per function')
+    parser.add_argument('--save', metavar='PATH', help='write the results as a baseline file')
+    parser.add_argument('--compare', metavar='PATH', help='compare against a saved baseline')
+    parser.add_argument('--threshold', type=float, default=0.10, help='allowed slowdown before flagging (0.10 = 10%%)')
+    parser.add_argument('--check-golden', action='store_true', help='only verify classification output')
+    parser.add_argument('--update-golden', action='store_true', help='rewrite the golden file from the current rules')
+    args = parser.parse_args(argv)
+
+    rows = load_corpus(args.corpus)
+
+    if args.update_golden:
+        with open(GOLDEN_PATH, 'w', encoding='utf-8') as handle:
+            json.dump(classify(rows), handle, indent=2, ensure_ascii=False)
+            handle.write('\n')
+        print(f'Wrote {len(rows)} golden rows to {GOLDEN_PATH}')
+        return 0
+
+    mismatches = check_golden(rows)
+    if mismatches:
+        print('Golden output mismatch:')
+        for mismatch in mismatches:
+            print(f'  {mismatch}')
+        return 1
+    if args.check_golden:
+        print(f'Golden output matches ({len(rows)} rows)')
+        return 0
+
+    results = run(rows, args.repeat)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as handle:
+            baseline = json.load(handle)['results']
+
+    print(f'{len(rows)} rows, best of {args.repeat} passes')
+    print_results(results, baseline)
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as handle:
+            json.dump({'python': sys.version.split()[0], 'rows': len(rows), 'results': results}, handle, indent=2)
+            handle.write('\n')
+        print(f'Saved baseline to {args.save}')
+
+    if baseline:
+        regressions = find_regressions(results, baseline, args.threshold)
+        if regressions:
+            print(f"Regressed by more than {args.threshold:.0%}: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,98 @@
+"""Worker start-up budget: import time, resident memory and heavy imports.
+
+    python -m server.benchmarks.startup_budget
+    python -m server.benchmarks.startup_budget --max-import-ms 600 --max-rss-mb 60
+
+Imports server.main in fresh interpreters (as a gunicorn worker would) and
+fails if the best cumulative import time (from -X importtime) or the
+resident set size exceeds its budget. It also fails if pandas, openpyxl or
+numpy got imported, or if a MongoDB client was created at import.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+APP_MODULE = 'server.main'
+LAZY_MODULES = ['pandas', 'openpyxl', 'numpy']
+
+PROBE = f"""
+import json, resource, sys
+import {APP_MODULE}
+from server.db import database
+
+rss_kb = None
+try:
+    with open('/proc/self/status') as handle:
+        for line in handle:
+            if line.startswith('VmRSS:'):
+                rss_kb = int(line.split()[1])
+except OSError:
+    rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        rss_kb //= 1024
+
+print(json.dumps({{
+    'rss_kb': rss_kb,
+    'heavy_modules': [m for m in {LAZY_MODULES!r} if m in sys.modules],
+    'client_created': database._client is not None,
+}}))
+"""
+
+
+def cumulative_import_us(stderr, module):
+    # Lines look like: "import time:       412 |      98765 | server.main"
+    for line in stderr.splitlines():
+        parts = [part.strip() for part in line.split('|')]
+        if len(parts) == 3 and parts[2] == module:
+            return int(parts[1])
+    return None
+
+
+def probe_once():
+    env = dict(os.environ)
+    # Point at an address that would fail fast, so an eager connect is visible.
+    env.setdefault('MONGODB_URI', 'mongodb://127.0.0.1:1/?serverSelectionTimeoutMS=1')
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', PROBE],
+        cwd=REPO_ROOT, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f'importing {APP_MODULE} failed:\n{result.stderr[-2000:]}')
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    report['import_us'] = cumulative_import_us(result.stderr, APP_MODULE)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--max-import-ms', type=float, default=800.0)
+    parser.add_argument('--max-rss-mb', type=float, default=80.0)
+    args = parser.parse_args(argv)
+
+    reports = [probe_once() for _ in range(args.runs)]
+    import_ms = min(report['import_us'] for report in reports) / 1000
+    rss_mb = min(report['rss_kb'] for report in reports) / 1024
+
+    failures = []
+    if import_ms > args.max_import_ms:
+        failures.append(f'{APP_MODULE} import took {import_ms:.0f} ms (budget {args.max_import_ms:.0f} ms)')
+    if rss_mb > args.max_rss_mb:
+        failures.append(f'RSS after import is {rss_mb:.1f} MB (budget {args.max_rss_mb:.0f} MB)')
+    heavy = sorted({module for report in reports for module in report['heavy_modules']})
+    if heavy:
+        failures.append(f"imported at start-up: {', '.join(heavy)}")
+    if any(report['client_created'] for report in reports):
+        failures.append('a MongoDB client was created at import time')
+
+    print(f'{APP_MODULE}: import {import_ms:.0f} ms, RSS {rss_mb:.1f} MB (best of {args.runs})')
+    for failure in failures:
+        print(f'FAIL: {failure}')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,106 @@
+"""Fingerprint and precompress the static assets in public/.
+
+    python -m server.build_assets
+
+Copies public/ into public/build/, renames every JS and CSS file to
+name.<hash>.ext, rewrites the references in the HTML pages, and writes
+.gz (and .br when the brotli package is installed) next to each text file.
+The app serves public/build/ whenever its manifest exists.
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+PUBLIC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'public'))
+BUILD_DIR = os.path.join(PUBLIC_DIR, 'build')
+MANIFEST_NAME = 'asset-manifest.json'
+
+FINGERPRINT_EXTENSIONS = ('.js', '.css')
+COMPRESS_EXTENSIONS = ('.html', '.js', '.css', '.json', '.svg', '.txt')
+REFERENCE_PATTERN = re.compile(r'''((?:src|href)\s*=\s*["'])([^"'?#]+)(["'])''')
+
+
+def content_hash(path):
+    with open(path, 'rb') as handle:
+        return hashlib.sha256(handle.read()).hexdigest()[:10]
+
+
+def fingerprinted_name(relative_path, digest):
+    root, extension = os.path.splitext(relative_path)
+    return f'{root}.{digest}{extension}'
+
+
+def rewrite_references(html, manifest):
+    def replace(match):
+        target = match.group(2).lstrip('./')
+        if target in manifest:
+            return f'{match.group(1)}{manifest[target]}{match.group(3)}'
+        return match.group(0)
+    return REFERENCE_PATTERN.sub(replace, html)
+
+
+def compress(path):
+    with open(path, 'rb') as handle:
+        data = handle.read()
+    with open(path + '.gz', 'wb') as handle:
+        handle.write(gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli is not None:
+        with open(path + '.br', 'wb') as handle:
+            handle.write(brotli.compress(data, quality=11))
+
+
+def build(public_dir=PUBLIC_DIR, build_dir=BUILD_DIR):
+    if os.path.isdir(build_dir):
+        shutil.rmtree(build_dir)
+
+    sources = []
+    for root, dirs, files in os.walk(public_dir):
+        dirs[:] = [d for d in dirs if os.path.join(root, d) != build_dir]
+        for name in files:
+            sources.append(os.path.relpath(os.path.join(root, name), public_dir).replace(os.sep, '/'))
+
+    manifest = {}
+    for relative_path in sources:
+        if relative_path.endswith(FINGERPRINT_EXTENSIONS):
+            manifest[relative_path] = fingerprinted_name(
+                relative_path, content_hash(os.path.join(public_dir, relative_path))
+            )
+
+    written = []
+    for relative_path in sources:
+        source = os.path.join(public_dir, relative_path)
+        target_names = [relative_path]
+        if relative_path in manifest:
+            target_names.append(manifest[relative_path])
+        for target_name in target_names:
+            target = os.path.join(build_dir, target_name)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            if relative_path.endswith('.html'):
+                with open(source, encoding='utf-8') as handle:
+                    html = rewrite_references(handle.read(), manifest)
+                with open(target, 'w', encoding='utf-8') as handle:
+                    handle.write(html)
+            else:
+                shutil.copyfile(source, target)
+            if target_name.endswith(COMPRESS_EXTENSIONS):
+                compress(target)
+            written.append(target_name)
+
+    with open(os.path.join(build_dir, MANIFEST_NAME), 'w', encoding='utf-8') as handle:
+        json.dump(manifest, handle, indent=2, sort_keys=True)
+    return manifest, written
+
+
+if __name__ == '__main__':
+    manifest, written = build()
+    print(f'Fingerprinted {len(manifest)} assets, wrote {len(written)} files to {BUILD_DIR}')
+    if brotli is None:
+        print('brotli is not installed; only gzip variants were written')
@@ -0,0 +1,48 @@
+from datetime import datetime
+from pymongo import ReturnDocument
+from .database import db
+
+# Every write to db.products stamps a value from this counter into
+# 'changeSeq', so /api/products/changes can return "everything after N".
+# Bulk writes may stamp one value on many products; the delta sync pages
+# in (changeSeq, _id) order so such ties never split across pages.
+PRODUCTS_SEQUENCE = 'products'
+
+
+def next_change_seq():
+    counter = db.counters.find_one_and_update(
+        {'_id': PRODUCTS_SEQUENCE},
+        {'$inc': {'seq': 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return counter['seq']
+
+
+def reserve_change_seqs(count, database=db):
+    """First of count consecutive sequence numbers, taken in one round trip."""
+    counter = database.counters.find_one_and_update(
+        {'_id': PRODUCTS_SEQUENCE},
+        {'$inc': {'seq': count}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return counter['seq'] - count + 1
+
+
+def current_change_seq(database=db):
+    counter = database.counters.find_one({'_id': PRODUCTS_SEQUENCE})
+    return counter['seq'] if counter else 0
+
+
+def change_fields(now=None):
+    """Fields to $set (or include on insert) with every product write."""
+    return {'lastUpdated': now or datetime.utcnow(), 'changeSeq': next_change_seq()}
+
+
+def record_tombstone(product_id):
+    db.product_tombstones.update_one(
+        {'_id': str(product_id)},
+        {'$set': {'changeSeq': next_change_seq(), 'deletedAt': datetime.utcnow()}},
+        upsert=True
+    )
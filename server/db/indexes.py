@@ -0,0 +1,81 @@
+from pymongo import ASCENDING
+from .database import db
+
+# Equality fields first, then the numeric ranges, so range searches over
+# canonical dimensions resolve entirely to index bounds.
+DIMENSION_SEARCH_INDEX = 'dimension_search'
+# Partial: only products flagged belowThreshold are indexed, and the keys
+# cover everything /api/stock/alerts returns.
+LOW_STOCK_INDEX = 'low_stock'
+LOW_STOCK_FIELDS = ['belowThreshold', 'category', 'name', 'stock', 'reorderThreshold', 'dimensions.stockType']
+
+# Excel import sessions (db.imports) and their conflicts expire after a day
+IMPORT_TTL_SECONDS = 24 * 60 * 60
+# Idempotency keys (db.idempotency_keys) outlive the longest a tablet is
+# expected to stay offline with queued movements
+IDEMPOTENCY_TTL_SECONDS = 7 * 24 * 60 * 60
+
+
+def ensure_indexes():
+    db.products.create_index(
+        [
+            ('category', ASCENDING),
+            ('dimensions.stockType', ASCENDING),
+            ('thickness_mm', ASCENDING),
+            ('width_mm', ASCENDING),
+            ('length_mm', ASCENDING),
+        ],
+        name=DIMENSION_SEARCH_INDEX
+    )
+    # Per-category scans in insertion order (catalogue export)
+    db.products.create_index([('category', ASCENDING), ('_id', ASCENDING)], name='category_id')
+    db.products.create_index(
+        [(field, ASCENDING) for field in LOW_STOCK_FIELDS] + [('_id', ASCENDING)],
+        name=LOW_STOCK_INDEX,
+        partialFilterExpression={'belowThreshold': True}
+    )
+    # Excel re-upload: exact-duplicate detection, then name lookups for the rest
+    db.products.create_index([('signatureHash', ASCENDING)], name='signatureHash')
+    db.products.create_index([('name', ASCENDING), ('category', ASCENDING)], name='name_category')
+    # Delta sync (/api/products/changes) pages in (changeSeq, _id) order.
+    # The single-field changeSeq indexes it replaces are a prefix of these.
+    for collection in (db.products, db.product_tombstones):
+        collection.create_index([('changeSeq', ASCENDING), ('_id', ASCENDING)], name='changeSeq_id')
+        if 'changeSeq' in collection.index_information():
+            collection.drop_index('changeSeq')
+
+    db.imports.create_index([('createdAt', ASCENDING)], name='ttl', expireAfterSeconds=IMPORT_TTL_SECONDS)
+    db.import_conflicts.create_index([('createdAt', ASCENDING)], name='ttl', expireAfterSeconds=IMPORT_TTL_SECONDS)
+    db.import_conflicts.create_index([('importId', ASCENDING), ('seq', ASCENDING)], name='import_seq')
+    # Unique on _id (endpoint:key); stored responses expire with the key
+    db.idempotency_keys.create_index([('createdAt', ASCENDING)], name='ttl', expireAfterSeconds=IDEMPOTENCY_TTL_SECONDS)
+
+    # Date-range and per-product ledger reads (exports, history)
+    db.stock_transactions.create_index([('timestamp', ASCENDING)], name='timestamp')
+    db.stock_transactions.create_index(
+        [('product_id', ASCENDING), ('timestamp', ASCENDING)], name='product_timestamp'
+    )
+    # Bucketed ledger (LEDGER_LAYOUT=bucketed): appends find the open bucket
+    # by product and month; range reads prune whole buckets by their bounds.
+    db.stock_ledger_buckets.create_index(
+        [('productId', ASCENDING), ('month', ASCENDING)], name='product_month'
+    )
+    db.stock_ledger_buckets.create_index([('lastTimestamp', ASCENDING)], name='lastTimestamp')
+    # Roll registry: barcode lookups and duplicate checks by roll number
+    db.rolls.create_index(
+        [('rollNumber', ASCENDING), ('importDate', ASCENDING)], name='roll_number', unique=True
+    )
+    db.rolls.create_index([('productId', ASCENDING)], name='productId')
+    db.detailed_stock.create_index([('createdAt', ASCENDING)], name='createdAt')
+    # Ageing report (/api/reports/ageing)
+    db.detailed_stock.create_index(
+        [('productType', ASCENDING), ('importDate', ASCENDING)], name='productType_importDate'
+    )
+    db.detailed_stock.create_index(
+        [('productId', ASCENDING), ('createdAt', ASCENDING)], name='product_createdAt'
+    )
+
+
+if __name__ == '__main__':
+    ensure_indexes()
+    print('Indexes ensured')
@@ -0,0 +1,30 @@
+import os
+import bson
+from pymongo import monitoring
+from ..utils import metrics
+
+# Measuring bytes means encoding every command and reply a second time,
+# whole find/aggregate batches included, so it is off unless asked for;
+# round trips and their timing are always recorded.
+COUNT_BYTES = os.environ.get('MONGODB_METRICS_BYTES', '').lower() in ('1', 'true', 'yes')
+
+
+class CommandMetricsListener(monitoring.CommandListener):
+    """Feeds every MongoDB round trip into the per-request metrics."""
+
+    def __init__(self, count_bytes=COUNT_BYTES):
+        self.count_bytes = count_bytes
+        self._sent = {}
+
+    def started(self, event):
+        if self.count_bytes:
+            self._sent[event.request_id] = len(bson.encode(event.command)) if event.command else 0
+
+    def succeeded(self, event):
+        sent = self._sent.pop(event.request_id, 0)
+        received = len(bson.encode(event.reply)) if self.count_bytes and event.reply else 0
+        metrics.record_command(event.command_name, event.duration_micros / 1e6, sent, received)
+
+    def failed(self, event):
+        sent = self._sent.pop(event.request_id, 0)
+        metrics.record_command(event.command_name, event.duration_micros / 1e6, sent, 0, failed=True)
@@ -0,0 +1,147 @@
+"""Reorder thresholds and the maintained belowThreshold flag.
+
+Each product carries its effective 'reorderThreshold' (its own override, or
+the default for its category and stock type) and a 'belowThreshold' flag
+that is recomputed inside the same update as every stock change. Only
+flagged products are in the partial LOW_STOCK_INDEX (db.indexes), so
+alerts are an index-only read however large the catalogue grows.
+
+Run with: python -m server.db.thresholds   (backfills existing products)
+"""
+from datetime import datetime
+from .database import db
+from .changes import change_fields, next_change_seq
+
+# Stock is counted in sq m for rolls, pieces for cut pieces, litres/kg for
+# chemicals, so one number cannot fit every product. Category-level values
+# saved in db.reorder_thresholds ('<category>' or '<category>:<stockType>')
+# take precedence over these.
+DEFAULT_THRESHOLD = 10
+DEFAULT_THRESHOLDS = {
+    'blankets:pieces': 3,
+}
+
+
+def stock_type_of(category, dimensions):
+    dimensions = dimensions or {}
+    if dimensions.get('stockType'):
+        return dimensions['stockType']
+    if category == 'blankets' and dimensions.get('numberOfPieces'):
+        return 'pieces'
+    return None
+
+
+def threshold_keys(category, stock_type=None):
+    keys = [f'{category}:{stock_type}'] if stock_type else []
+    return keys + [category]
+
+
+def category_threshold(category, stock_type=None, database=db):
+    keys = threshold_keys(category, stock_type)
+    saved = {doc['_id']: doc['threshold'] for doc in database.reorder_thresholds.find({'_id': {'$in': keys}})}
+    for key in keys:
+        if key in saved:
+            return saved[key]
+        if key in DEFAULT_THRESHOLDS:
+            return DEFAULT_THRESHOLDS[key]
+    return DEFAULT_THRESHOLD
+
+
+def threshold_fields(stock, category, dimensions=None, database=db):
+    """reorderThreshold/belowThreshold to include when inserting a product."""
+    threshold = category_threshold(category, stock_type_of(category, dimensions), database)
+    return {'reorderThreshold': threshold, 'belowThreshold': (stock or 0) < threshold}
+
+
+_BELOW_THRESHOLD = {'$set': {'belowThreshold': {
+    '$lt': [{'$ifNull': ['$stock', 0]}, {'$ifNull': ['$reorderThreshold', DEFAULT_THRESHOLD]}]
+}}}
+
+
+def stock_update(stock, fields=None):
+    """Update pipeline that sets stock (plus fields) and recomputes
+    belowThreshold from the stored threshold in the same write."""
+    values = dict(fields or {}, stock=stock)
+    return [{'$set': {key: {'$literal': value} for key, value in values.items()}}, _BELOW_THRESHOLD]
+
+
+def stock_increment(quantity, fields=None):
+    """Like stock_update, but adds quantity to the stored stock within the
+    write, so concurrent movements cannot overwrite each other."""
+    values = {key: {'$literal': value} for key, value in (fields or {}).items()}
+    values['stock'] = {'$add': [{'$ifNull': ['$stock', 0]}, {'$literal': quantity}]}
+    return [{'$set': values}, _BELOW_THRESHOLD]
+
+
+def set_product_threshold(product_id, threshold):
+    """Override one product's threshold; None reverts to its category default."""
+    product = db.products.find_one({'_id': product_id}, {'category': 1, 'dimensions': 1})
+    if not product:
+        return False
+    if threshold is None:
+        category = product.get('category')
+        threshold = category_threshold(category, stock_type_of(category, product.get('dimensions')))
+        source = 'category'
+    else:
+        source = 'product'
+    fields = dict(change_fields(), reorderThreshold=threshold, thresholdSource=source)
+    db.products.update_one(
+        {'_id': product_id},
+        [{'$set': {key: {'$literal': value} for key, value in fields.items()}}, _BELOW_THRESHOLD]
+    )
+    return True
+
+
+def _apply_category_defaults(query):
+    """Re-resolve thresholds for products that follow their category default."""
+    query = dict(query, thresholdSource={'$ne': 'product'})
+    groups = db.products.aggregate([
+        {'$match': query},
+        {'$group': {'_id': {'category': '$category', 'stockType': '$dimensions.stockType'}}},
+    ])
+    updated = 0
+    seq = next_change_seq()
+    now = datetime.utcnow()
+    for group in groups:
+        category = group['_id'].get('category')
+        stock_type = group['_id'].get('stockType')
+        match = dict(query, category=category)
+        match['dimensions.stockType'] = stock_type
+        if not stock_type and category == 'blankets':
+            # Legacy cut-piece rows are only marked by numberOfPieces
+            for pieces in (True, False):
+                legacy = dict(match, **{'dimensions.numberOfPieces': {'$exists': pieces}})
+                updated += _set_threshold(legacy, category_threshold(category, 'pieces' if pieces else None), seq, now)
+            continue
+        updated += _set_threshold(match, category_threshold(category, stock_type), seq, now)
+    return updated
+
+
+def _set_threshold(match, threshold, seq, now):
+    result = db.products.update_many(match, [
+        {'$set': {'reorderThreshold': {'$literal': threshold}, 'thresholdSource': 'category',
+                  'changeSeq': {'$literal': seq}, 'lastUpdated': {'$literal': now}}},
+        _BELOW_THRESHOLD,
+    ])
+    return result.modified_count
+
+
+def set_category_threshold(category, threshold, stock_type=None):
+    """Save a category (or category + stock type) default and apply it."""
+    key = threshold_keys(category, stock_type)[0]
+    if threshold is None:
+        db.reorder_thresholds.delete_one({'_id': key})
+    else:
+        db.reorder_thresholds.update_one({'_id': key}, {'$set': {'threshold': threshold}}, upsert=True)
+    return _apply_category_defaults({'category': category})
+
+
+def list_thresholds():
+    saved = {doc['_id']: doc['threshold'] for doc in db.reorder_thresholds.find()}
+    return {'default': DEFAULT_THRESHOLD, 'categories': dict(DEFAULT_THRESHOLDS, **saved)}
+
+
+if __name__ == '__main__':
+    from .indexes import ensure_indexes
+    ensure_indexes()
+    print(f'Updated thresholds on {_apply_category_defaults({})} products')
@@ -1,12 +1,24 @@
 import os
-from flask import Flask, send_from_directory
+from flask import Flask
 from flask_cors import CORS
 from .routes.products import products_bp
 from .routes.stock import stock_bp
 from .routes.reports import reports_bp
 from .routes.sku import sku_bp
+from .routes.dashboard import dashboard_bp
+from .routes.export import export_bp
+from .routes.rolls import rolls_bp
+from .routes.stream import stream_bp
+from .routes.sync import sync_bp
+from .routes.metrics import metrics_bp
+from .routes.profiling import profiling_bp
+from .db.database import on_connect
+from .db.indexes import ensure_indexes
+from .utils.static_assets import send_asset
 
-app = Flask(__name__, static_folder='../public', static_url_path='')
+# Static files go through send_asset (precompressed variants, cache headers)
+# rather than Flask's built-in static route.
+app = Flask(__name__, static_folder=None)
 CORS(app)  # Enable CORS for frontend
 
 # Register blueprints
@@ -14,26 +26,36 @@ app.register_blueprint(products_bp, url_prefix='/api')
 app.register_blueprint(stock_bp, url_prefix='/api')
 app.register_blueprint(reports_bp, url_prefix='/api')
 app.register_blueprint(sku_bp, url_prefix='/api')
+app.register_blueprint(dashboard_bp, url_prefix='/api')
+app.register_blueprint(export_bp, url_prefix='/api')
+app.register_blueprint(rolls_bp, url_prefix='/api')
+app.register_blueprint(stream_bp, url_prefix='/api')
+app.register_blueprint(sync_bp, url_prefix='/api')
+app.register_blueprint(metrics_bp, url_prefix='/api')
+app.register_blueprint(profiling_bp, url_prefix='/api')
+
+# Indexes are ensured when each worker first connects, not at import
+on_connect(ensure_indexes)
 
 # Serve the main index.html at root route
 @app.route('/')
 def serve_index():
-    return send_from_directory(app.static_folder, 'index.html')
+    return send_asset('index.html')
 
 # Serve stock-in page
 @app.route('/stock-in.html')
 def serve_stock_in():
-    return send_from_directory(app.static_folder, 'stock-in.html')
+    return send_asset('stock-in.html')
 
 # Serve products page
 @app.route('/products.html')
 def serve_products():
-    return send_from_directory(app.static_folder, 'products.html')
+    return send_asset('products.html')
 
 # Serve other static pages
 @app.route('/<path:filename>')
 def serve_static(filename):
-    return send_from_directory(app.static_folder, filename)
+    return send_asset(filename)
 
 # Serve favicon
 @app.route('/favicon.ico')
@@ -0,0 +1,113 @@
+"""Copy stock_transactions into the bucketed ledger (stock_ledger_buckets).
+
+Movements are read in (product_id, timestamp) order off the
+product_timestamp index and grouped into per-product, per-month buckets of
+at most BUCKET_SIZE movements. Bucket ids are derived from the product,
+month and position, and each bucket is written with an upserting replace,
+so the migration can be interrupted and re-run without duplicating
+anything. Buckets appended to by the app after switching layouts are never
+touched.
+
+Typical cut-over:
+    python -m server.migrate_ledger            # copy while still on 'documents'
+    LEDGER_LAYOUT=bucketed  (restart the app)
+    python -m server.migrate_ledger            # pick up movements written meanwhile
+    python -m server.migrate_ledger --drop-source
+"""
+import argparse
+from pymongo import ReplaceOne
+from .db.database import db
+from .db.indexes import ensure_indexes
+from .models.stock_transaction import BUCKETS, BUCKET_SIZE, month_start
+
+WRITE_BATCH = 200
+
+
+def _bucket(product_id, month, index, movements):
+    in_total = sum(m['quantity'] for m in movements if m['type'] == 'in')
+    out_total = sum(m['quantity'] for m in movements if m['type'] == 'out')
+    return {
+        '_id': f"{product_id}:{month.strftime('%Y-%m')}:{index}",
+        'productId': product_id,
+        'month': month,
+        'movements': movements,
+        'count': len(movements),
+        'inTotal': in_total,
+        'outTotal': out_total,
+        'firstTimestamp': movements[0]['timestamp'],
+        'lastTimestamp': movements[-1]['timestamp'],
+        'migrated': True
+    }
+
+
+def iter_buckets(transactions):
+    """Group a (product_id, timestamp)-ordered cursor into bucket documents."""
+    key, index, movements = None, 0, []
+    for transaction in transactions:
+        timestamp = transaction.get('timestamp')
+        if timestamp is None:
+            continue
+        product_id = str(transaction.get('product_id'))
+        month = month_start(timestamp)
+        if (product_id, month) != key or len(movements) >= BUCKET_SIZE:
+            if movements:
+                yield _bucket(key[0], key[1], index, movements)
+            index = index + 1 if (product_id, month) == key else 0
+            key, movements = (product_id, month), []
+        movements.append({
+            '_id': transaction['_id'],
+            'quantity': transaction.get('quantity') or 0,
+            'type': transaction.get('type'),
+            'timestamp': timestamp
+        })
+    if movements:
+        yield _bucket(key[0], key[1], index, movements)
+
+
+def migrate():
+    transactions = db.stock_transactions.find().sort([('product_id', 1), ('timestamp', 1)])
+    buckets = movements = 0
+    operations = []
+    for bucket in iter_buckets(transactions):
+        operations.append(ReplaceOne({'_id': bucket['_id']}, bucket, upsert=True))
+        buckets += 1
+        movements += bucket['count']
+        if len(operations) >= WRITE_BATCH:
+            db[BUCKETS].bulk_write(operations, ordered=False)
+            operations = []
+    if operations:
+        db[BUCKETS].bulk_write(operations, ordered=False)
+    return buckets, movements
+
+
+def migrated_count():
+    result = list(db[BUCKETS].aggregate([
+        {'$match': {'migrated': True}},
+        {'$group': {'_id': None, 'count': {'$sum': '$count'}}}
+    ]))
+    return result[0]['count'] if result else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--drop-source', action='store_true',
+                        help='drop stock_transactions once every movement is in a bucket')
+    args = parser.parse_args()
+
+    ensure_indexes()
+    if args.drop_source:
+        source = db.stock_transactions.count_documents({'timestamp': {'$ne': None}})
+        copied = migrated_count()
+        if source != copied:
+            raise SystemExit(f'{source} transactions but {copied} migrated movements; '
+                             'run the migration again before dropping')
+        db.stock_transactions.drop()
+        print(f'Dropped stock_transactions ({source} movements are in {BUCKETS})')
+        return
+
+    buckets, movements = migrate()
+    print(f'Wrote {movements} movements into {buckets} buckets')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""Register existing rolls in the roll registry (db.rolls).
+
+Until the registry existed, a roll lived in its product's dimensions
+(rollNumber, importDate, takenDate), and a second delivery of the same
+roll number became a new product named "Name (YYYY-MM-DD)". This copies
+every numbered roll out of products.dimensions, then fills in rolls that
+only survive in detailed_stock (earlier rolls whose product dimensions
+were since overwritten).
+
+Writes are upserts on the (rollNumber, importDate) key that only set
+fields on insert, so the migration can be re-run at any time and never
+overwrites a roll the app has registered or updated since. Products are
+left as they are; their dimensions still describe the latest roll.
+
+    python -m server.migrate_rolls
+"""
+import argparse
+from pymongo import UpdateOne
+from .db.database import db
+from .db.indexes import ensure_indexes
+from .repositories.rolls import roll_document, roll_number_of
+
+WRITE_BATCH = 200
+ROLL_TYPES = ['blankets', 'underpacking']
+
+
+def product_rolls():
+    cursor = db.products.find(
+        {'category': {'$in': ROLL_TYPES}, 'dimensions.stockType': 'roll', 'dimensions.rollNumber': {'$nin': [None, '']}},
+        {'name': 1, 'category': 1, 'stock': 1, 'dimensions': 1, 'area_m2': 1}
+    )
+    for product in cursor:
+        dimensions = product.get('dimensions') or {}
+        sq_mtr = dimensions.get('sqMtr') or product.get('area_m2')
+        yield roll_document(
+            product['_id'], product['category'], product['name'], dimensions.get('rollNumber'), dimensions,
+            import_date=dimensions.get('importDate'), taken_date=dimensions.get('takenDate'),
+            # The product's stock is what is left of its roll
+            sq_mtr=sq_mtr, remaining_sq_mtr=product.get('stock', sq_mtr)
+        )
+
+
+def detailed_rolls():
+    cursor = db.detailed_stock.find(
+        {'productType': {'$in': ROLL_TYPES}, 'rollNumber': {'$nin': [None, '']}, 'stockType': {'$ne': 'pieces'}}
+    ).sort('createdAt', 1)
+    for record in cursor:
+        yield roll_document(
+            record.get('productId'), record['productType'], record.get('productName'), record.get('rollNumber'), record,
+            import_date=record.get('importDate'), taken_date=record.get('takenDate'), sq_mtr=record.get('sqMtr')
+        )
+
+
+def migrate(dry_run=False):
+    written = seen = 0
+    operations = []
+
+    def flush():
+        nonlocal written
+        if operations and not dry_run:
+            result = db.rolls.bulk_write(operations, ordered=False)
+            written += result.upserted_count
+        operations.clear()
+
+    for source in (product_rolls(), detailed_rolls()):
+        for roll in source:
+            if not roll_number_of(roll['rollNumber']):
+                continue
+            seen += 1
+            key = {'rollNumber': roll['rollNumber'], 'importDate': roll['importDate']}
+            operations.append(UpdateOne(key, {'$setOnInsert': roll}, upsert=True))
+            if len(operations) >= WRITE_BATCH:
+                flush()
+    flush()
+    return seen, written
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--dry-run', action='store_true', help='count the rolls without writing them')
+    args = parser.parse_args()
+
+    ensure_indexes()
+    seen, written = migrate(args.dry_run)
+    if args.dry_run:
+        print(f'Found {seen} roll entries')
+    else:
+        print(f'Found {seen} roll entries, registered {written} new rolls')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,16 @@
+"""Versioned data migrations, applied in order by `python -m server.migrations`.
+
+Add a migration as a new mNNNN_<name>.py module with a runner.Migration
+subclass and append it here; never renumber or edit one that has run.
+"""
+from .m0001_product_dimensions import ProductDimensions
+from .m0002_detailed_stock_dimensions import DetailedStockDimensions
+from .m0003_blanket_piece_areas import BlanketPieceAreas
+from .m0004_blanket_stock_types import BlanketStockTypes
+
+MIGRATIONS = [
+    ProductDimensions(),
+    DetailedStockDimensions(),
+    BlanketPieceAreas(),
+    BlanketStockTypes(),
+]
@@ -0,0 +1,56 @@
+"""Apply pending data migrations.
+
+    python -m server.migrations                  # every pending migration, in order
+    python -m server.migrations --status
+    python -m server.migrations --only 0003_blanket_piece_areas --dry-run
+    python -m server.migrations --only 0001_product_dimensions --restart
+    python -m server.migrations --ops-per-second 200 --batch-size 250
+
+An interrupted run resumes from its last checkpoint when started again.
+"""
+import argparse
+from ..db.indexes import ensure_indexes
+from . import MIGRATIONS
+from .runner import BATCH_SIZE, OPS_PER_SECOND, pending, run, status
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--only', help='run this migration version even if it is done')
+    parser.add_argument('--dry-run', action='store_true', help='count the documents that would change, write nothing')
+    parser.add_argument('--restart', action='store_true', help='ignore the checkpoint and start from the first _id')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--ops-per-second', type=float, default=OPS_PER_SECOND,
+                        help='write operations per second (0 for no limit)')
+    parser.add_argument('--status', action='store_true', help='list migrations and their progress')
+    args = parser.parse_args()
+
+    if args.status:
+        states = status()
+        for migration in MIGRATIONS:
+            state = states.get(migration.version, {})
+            print(f"{migration.version:<36} {state.get('status', 'pending'):<8} "
+                  f"scanned {state.get('scanned', 0):<10} changed {state.get('changed', 0):<10} {migration.description}")
+        return
+
+    if args.only:
+        selected = [migration for migration in MIGRATIONS if migration.version == args.only]
+        if not selected:
+            raise SystemExit(f"Unknown migration {args.only}; one of: {', '.join(m.version for m in MIGRATIONS)}")
+    else:
+        selected = MIGRATIONS if args.dry_run or args.restart else pending(MIGRATIONS)
+    if not selected:
+        print('No pending migrations')
+        return
+
+    ensure_indexes()
+    for migration in selected:
+        print(f'{migration.version}: {migration.description}{" (dry run)" if args.dry_run else ""}')
+        counts = run(migration, args.batch_size, args.ops_per_second, args.dry_run, args.restart)
+        print(f"{migration.version}: scanned {counts['scanned']}, "
+              f"{'would change' if args.dry_run else 'changed'} {counts['changed']}"
+              + ('' if args.dry_run else f", modified {counts['modified']}"))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,23 @@
+from ..utils.dimensions import CANONICAL_FIELDS, canonical_dimensions
+from ..utils.signature import signature_fields
+from .runner import Migration
+
+
+def changed_fields(document, fields):
+    """Only the fields whose stored value differs, so re-runs write nothing."""
+    return {key: value for key, value in fields.items() if document.get(key) != value}
+
+
+class ProductDimensions(Migration):
+    version = '0001_product_dimensions'
+    description = 'Canonical dimension fields and signatureHash on products'
+    collection = 'products'
+    projection = ['name', 'category', 'dimensions', 'signatureHash', *CANONICAL_FIELDS]
+    stamp_changes = True
+
+    def update(self, document):
+        dimensions = document.get('dimensions') or {}
+        fields = canonical_dimensions(dimensions)
+        fields.update(signature_fields(document.get('name'), document.get('category'), dimensions))
+        fields = changed_fields(document, fields)
+        return {'$set': fields} if fields else None
@@ -0,0 +1,14 @@
+from ..utils.dimensions import CANONICAL_FIELDS, canonical_dimensions
+from .m0001_product_dimensions import changed_fields
+from .runner import Migration
+
+
+class DetailedStockDimensions(Migration):
+    version = '0002_detailed_stock_dimensions'
+    description = 'Canonical dimension fields on detailed_stock records'
+    collection = 'detailed_stock'
+    projection = ['length', 'width', 'thickness', 'lengthUnit', 'widthUnit', 'thicknessUnit', *CANONICAL_FIELDS]
+
+    def update(self, document):
+        fields = changed_fields(document, canonical_dimensions(document))
+        return {'$set': fields} if fields else None
@@ -0,0 +1,29 @@
+from ..utils.dimensions import to_mm, to_number
+from .runner import Migration
+
+
+class BlanketPieceAreas(Migration):
+    """Recompute sqMtrPerPiece and totalSqMtr of cut pieces from their
+    length, width and piece count, as the stock-in form does."""
+    version = '0003_blanket_piece_areas'
+    description = 'Recompute sq m per piece and total sq m on blanket and underpacking pieces'
+    collection = 'products'
+    query = {'category': {'$in': ['blankets', 'underpacking']}, 'dimensions.stockType': 'pieces'}
+    projection = ['dimensions']
+    stamp_changes = True
+
+    def update(self, document):
+        dimensions = document.get('dimensions') or {}
+        length_mm = to_mm(dimensions.get('length'), dimensions.get('lengthUnit', 'mm'))
+        width_mm = to_mm(dimensions.get('width'), dimensions.get('widthUnit', 'mm'))
+        if not length_mm or not width_mm:
+            return None
+        per_piece = round(length_mm * width_mm / 1_000_000, 4)
+        fields = {'dimensions.sqMtrPerPiece': per_piece}
+        pieces = to_number(dimensions.get('numberOfPieces'))
+        if pieces is not None:
+            fields['dimensions.totalSqMtr'] = round(per_piece * pieces, 4)
+        current = {'dimensions.sqMtrPerPiece': dimensions.get('sqMtrPerPiece'),
+                   'dimensions.totalSqMtr': dimensions.get('totalSqMtr')}
+        fields = {key: value for key, value in fields.items() if current[key] != value}
+        return {'$set': fields} if fields else None
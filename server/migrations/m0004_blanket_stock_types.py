@@ -0,0 +1,25 @@
+from .runner import Migration
+
+STOCK_TYPE_CATEGORIES = ['blankets', 'underpacking']
+
+
+class BlanketStockTypes(Migration):
+    """Set dimensions.stockType on blanket and underpacking products that
+    have none (the Excel import created them without it), so the stock
+    search's stockType filter finds them: 'pieces' where a piece count is
+    recorded, otherwise 'roll'."""
+    version = '0004_blanket_stock_types'
+    description = 'Set stockType on blanket and underpacking products that lack it'
+    collection = 'products'
+    query = {'category': {'$in': STOCK_TYPE_CATEGORIES}, 'dimensions.stockType': {'$in': [None, '']}}
+    projection = ['dimensions']
+    stamp_changes = True
+
+    def update(self, document):
+        dimensions = document.get('dimensions')
+        if not isinstance(dimensions, dict):
+            return {'$set': {'dimensions': {'stockType': 'roll'}}}
+        if dimensions.get('stockType'):
+            return None
+        stock_type = 'pieces' if dimensions.get('numberOfPieces') else 'roll'
+        return {'$set': {'dimensions.stockType': stock_type}}
@@ -0,0 +1,170 @@
+"""Resumable, throttled data migrations.
+
+A migration walks one collection in _id order, in keyset batches
+(`_id > last seen`, never skip/offset), turns each document into an update
+and writes the batch with one unordered bulk_write. After every batch the
+last _id and running counts are checkpointed in db.migrations under the
+migration's version, so a run that dies halfway resumes from the last
+checkpoint. Updates must therefore be idempotent: re-applying a batch
+after a crash has to be harmless.
+
+Writes are paced to ops_per_second so a backfill over millions of
+documents can run next to live traffic. A dry run reads and counts but
+writes nothing, not even its checkpoint.
+
+A run takes a lease on its migration's record (owner plus heartbeat), so
+two runners cannot work on the same migration; a lease not renewed for
+LEASE_SECONDS is considered abandoned and can be taken over.
+"""
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+from ..db.database import db
+from ..db.changes import reserve_change_seqs
+
+BATCH_SIZE = int(os.environ.get('MIGRATION_BATCH_SIZE', '500'))
+OPS_PER_SECOND = float(os.environ.get('MIGRATION_OPS_PER_SECOND', '1000'))
+LEASE_SECONDS = 60
+
+
+class Migration:
+    """Subclass and set version, description, collection (and optionally
+    query and projection), then implement update()."""
+    version = None
+    description = ''
+    collection = None
+    query = {}
+    projection = None
+    # Product writes must carry lastUpdated/changeSeq (db.changes) so delta
+    # sync and the catalogue snapshot see them; each batch reserves a block
+    # of sequence numbers in one round trip, one per document.
+    stamp_changes = False
+
+    def update(self, document):
+        """The update for one document, or None to leave it alone."""
+        raise NotImplementedError
+
+
+class Throttle:
+    def __init__(self, ops_per_second):
+        self.ops_per_second = ops_per_second
+        self.started = time.monotonic()
+        self.done = 0
+
+    def wait(self, ops):
+        if not self.ops_per_second or self.ops_per_second <= 0:
+            return
+        self.done += ops
+        delay = self.done / self.ops_per_second - (time.monotonic() - self.started)
+        if delay > 0:
+            time.sleep(delay)
+
+
+class LeaseLost(Exception):
+    pass
+
+
+def status():
+    return {state['_id']: state for state in db.migrations.find()}
+
+
+def _claim(migration, owner, restart):
+    now = datetime.utcnow()
+    stale = now - timedelta(seconds=LEASE_SECONDS)
+    update = {'$set': {'owner': owner, 'heartbeat': now, 'status': 'running',
+                       'description': migration.description, 'collection': migration.collection}}
+    if restart:
+        update['$set'].update({'lastId': None, 'scanned': 0, 'changed': 0, 'modified': 0, 'startedAt': now})
+        update['$unset'] = {'finishedAt': '', 'error': ''}
+    else:
+        update['$setOnInsert'] = {'lastId': None, 'scanned': 0, 'changed': 0, 'modified': 0, 'startedAt': now}
+    try:
+        return db.migrations.find_one_and_update(
+            {'_id': migration.version, '$or': [{'status': {'$ne': 'running'}}, {'heartbeat': {'$lt': stale}}]},
+            update,
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # The record exists and another runner holds a live lease
+        return None
+
+
+def _checkpoint(migration, owner, fields):
+    fields = dict(fields, heartbeat=datetime.utcnow())
+    result = db.migrations.update_one({'_id': migration.version, 'owner': owner}, {'$set': fields})
+    if not result.matched_count:
+        raise LeaseLost(f'{migration.version}: lease taken over by another runner')
+
+
+def run(migration, batch_size=BATCH_SIZE, ops_per_second=OPS_PER_SECOND, dry_run=False, restart=False, log=print):
+    """Run (or resume) one migration; returns its final counts."""
+    collection = db[migration.collection]
+    owner = uuid.uuid4().hex
+    if dry_run:
+        state = {'lastId': None, 'scanned': 0, 'changed': 0, 'modified': 0}
+    else:
+        state = _claim(migration, owner, restart)
+        if state is None:
+            raise SystemExit(f'{migration.version} is already running elsewhere')
+        if state.get('lastId') is not None:
+            log(f"{migration.version}: resuming after _id {state['lastId']} ({state['scanned']} scanned)")
+
+    last_id = state.get('lastId')
+    counts = {key: state.get(key, 0) for key in ('scanned', 'changed', 'modified')}
+    throttle = Throttle(ops_per_second)
+    try:
+        while True:
+            query = migration.query
+            if last_id is not None:
+                query = {'$and': [migration.query, {'_id': {'$gt': last_id}}]} if migration.query else {'_id': {'$gt': last_id}}
+            batch = list(collection.find(query, migration.projection).sort('_id', 1).limit(batch_size))
+            if not batch:
+                break
+
+            updates = []
+            for document in batch:
+                update = migration.update(document)
+                if update:
+                    updates.append((document['_id'], update))
+            if updates and migration.stamp_changes and not dry_run:
+                now = datetime.utcnow()
+                first = reserve_change_seqs(len(updates))
+                for offset, (_, update) in enumerate(updates):
+                    update.setdefault('$set', {}).update(lastUpdated=now, changeSeq=first + offset)
+            if updates and not dry_run:
+                result = collection.bulk_write(
+                    [UpdateOne({'_id': _id}, update) for _id, update in updates], ordered=False
+                )
+                counts['modified'] += result.modified_count
+
+            last_id = batch[-1]['_id']
+            counts['scanned'] += len(batch)
+            counts['changed'] += len(updates)
+            if not dry_run:
+                _checkpoint(migration, owner, dict(counts, lastId=last_id))
+            throttle.wait(0 if dry_run else len(updates))
+    except LeaseLost:
+        raise
+    except Exception as e:
+        if not dry_run:
+            db.migrations.update_one(
+                {'_id': migration.version, 'owner': owner},
+                {'$set': {'status': 'failed', 'error': str(e), 'heartbeat': datetime.utcnow()}}
+            )
+        raise
+
+    if not dry_run:
+        db.migrations.update_one(
+            {'_id': migration.version, 'owner': owner},
+            {'$set': dict(counts, status='done', finishedAt=datetime.utcnow())}
+        )
+    return counts
+
+
+def pending(migrations):
+    done = {version for version, state in status().items() if state.get('status') == 'done'}
+    return [migration for migration in migrations if migration.version not in done]
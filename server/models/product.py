@@ -1,5 +1,11 @@
-from ..db.database import db
+from ..db.database import db, movements_db, reporting_db
+from ..db.changes import change_fields, record_tombstone
+from ..db.thresholds import stock_increment, stock_update, threshold_fields
+from ..utils.dimensions import canonical_dimensions
+from ..utils.signature import signature_fields
+from ..utils.events import publish_stock_change
 from bson import ObjectId
+from pymongo import ReturnDocument
 from datetime import datetime
 
 class Product:
@@ -17,40 +23,77 @@ class Product:
             'stock': self.stock,
             'imported': self.imported,
             'dimensions': self.dimensions,
-            'createdAt': datetime.utcnow(),
-            'lastUpdated': datetime.utcnow()
+            'createdAt': datetime.utcnow()
         }
+        product_data.update(change_fields())
+        product_data.update(canonical_dimensions(self.dimensions))
+        product_data.update(signature_fields(self.name, self.category, self.dimensions))
+        product_data.update(threshold_fields(self.stock, self.category, self.dimensions))
         result = db.products.insert_one(product_data)
+        publish_stock_change(result.inserted_id, self.stock, product_data['lastUpdated'])
         return result.inserted_id
 
     @staticmethod
-    def get_all():
-        products = list(db.products.find())
+    def serialize(product):
         # Convert ObjectId to string for JSON serialization
-        for product in products:
-            product['_id'] = str(product['_id'])
-            created_at = product.get('createdAt')
-            if created_at is not None and hasattr(created_at, 'isoformat'):
-                product['createdAt'] = created_at.isoformat()
-            last_updated = product.get('lastUpdated')
-            if last_updated is not None and hasattr(last_updated, 'isoformat'):
-                product['lastUpdated'] = last_updated.isoformat()
-        return products
+        product['_id'] = str(product['_id'])
+        created_at = product.get('createdAt')
+        if created_at is not None and hasattr(created_at, 'isoformat'):
+            product['createdAt'] = created_at.isoformat()
+        last_updated = product.get('lastUpdated')
+        if last_updated is not None and hasattr(last_updated, 'isoformat'):
+            product['lastUpdated'] = last_updated.isoformat()
+        return product
+
+    @staticmethod
+    def get_all():
+        return [Product.serialize(product) for product in reporting_db.products.find()]
 
     @staticmethod
     def get_by_id(product_id):
-        return db.products.find_one({'_id': ObjectId(product_id)})
+        return movements_db.products.find_one({'_id': ObjectId(product_id)})
 
     @staticmethod
     def update_stock(product_id, stock):
-        db.products.update_one(
-            {'_id': ObjectId(product_id)},
-            {'$set': {'stock': stock, 'lastUpdated': datetime.utcnow()}}
-        )
+        changes = change_fields()
+        movements_db.products.update_one({'_id': ObjectId(product_id)}, stock_update(stock, changes))
+        publish_stock_change(product_id, stock, changes['lastUpdated'])
     
     @staticmethod
-    def update_dimensions(product_id, dimensions):
+    def adjust_stock(product_id, quantity, session=None):
+        """Add quantity (negative to issue) to the stored stock in place; an
+        issue only applies while enough stock is left. Returns (stock,
+        lastUpdated) after the write, or None if nothing matched. The
+        caller publishes the change, once any transaction has committed."""
+        changes = change_fields()
+        query = {'_id': ObjectId(product_id)}
+        if quantity < 0:
+            query['stock'] = {'$gte': -quantity}
+        product = movements_db.products.find_one_and_update(
+            query, stock_increment(quantity, changes), projection={'stock': 1},
+            return_document=ReturnDocument.AFTER, session=session
+        )
+        if product is None:
+            return None
+        return product['stock'], changes['lastUpdated']
+
+    @staticmethod
+    def update_dimensions(product_id, dimensions, name=None, category=None):
+        if name is None or category is None:
+            product = db.products.find_one({'_id': ObjectId(product_id)}, {'name': 1, 'category': 1}) or {}
+            name, category = product.get('name'), product.get('category')
+        update = {'dimensions': dimensions}
+        update.update(change_fields())
+        update.update(canonical_dimensions(dimensions))
+        update.update(signature_fields(name, category, dimensions))
         db.products.update_one(
             {'_id': ObjectId(product_id)},
-            {'$set': {'dimensions': dimensions, 'lastUpdated': datetime.utcnow()}}
+            {'$set': update}
         )
+
+    @staticmethod
+    def delete(product_id):
+        result = db.products.delete_one({'_id': ObjectId(product_id)})
+        if result.deleted_count:
+            record_tombstone(product_id)
+        return result.deleted_count
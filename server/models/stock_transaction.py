@@ -1,6 +1,43 @@
-from ..db.database import db
+import os
+from ..db.database import movements_db, reporting_db
+from bson import ObjectId
 from datetime import datetime
 
+# 'documents' keeps one stock_transactions document per movement. 'bucketed'
+# appends movements to per-product, per-month documents in
+# stock_ledger_buckets that also carry running in/out totals; run
+# `python -m server.migrate_ledger` before switching an existing database.
+LEDGER_LAYOUT = os.environ.get('LEDGER_LAYOUT', 'documents')
+BUCKETS = 'stock_ledger_buckets'
+# A month with more movements than this continues in a second bucket
+BUCKET_SIZE = 500
+
+
+def month_start(timestamp):
+    return datetime(timestamp.year, timestamp.month, 1)
+
+
+def bucketed():
+    return LEDGER_LAYOUT == 'bucketed'
+
+
+def _movement_pipeline(match, movement_match):
+    pipeline = [{'$match': match}, {'$unwind': '$movements'}]
+    if movement_match:
+        pipeline.append({'$match': movement_match})
+    pipeline += [
+        {'$replaceWith': {
+            '_id': '$movements._id',
+            'product_id': '$productId',
+            'quantity': '$movements.quantity',
+            'type': '$movements.type',
+            'timestamp': '$movements.timestamp',
+        }},
+        {'$sort': {'timestamp': 1}},
+    ]
+    return pipeline
+
+
 class StockTransaction:
     def __init__(self, product_id, quantity, transaction_type):
         self.product_id = product_id
@@ -8,20 +45,179 @@ class StockTransaction:
         self.transaction_type = transaction_type  # 'in' or 'out'
         self.timestamp = datetime.utcnow()
 
-    def save(self):
+    def save(self, session=None):
+        if bucketed():
+            return self._append_to_bucket(session)
         transaction_data = {
             'product_id': self.product_id,
             'quantity': self.quantity,
             'type': self.transaction_type,
             'timestamp': self.timestamp
         }
-        result = db.stock_transactions.insert_one(transaction_data)
+        result = movements_db.stock_transactions.insert_one(transaction_data, session=session)
         return result.inserted_id
 
+    def _append_to_bucket(self, session=None):
+        movement_id = ObjectId()
+        product_id = str(self.product_id)
+        # Upsert into this month's open bucket; once it is full the filter no
+        # longer matches and a fresh bucket is created. Buckets written by the
+        # migration are left alone so it can be re-run safely.
+        movements_db[BUCKETS].update_one(
+            {
+                'productId': product_id,
+                'month': month_start(self.timestamp),
+                'count': {'$lt': BUCKET_SIZE},
+                'migrated': {'$ne': True}
+            },
+            {
+                '$push': {'movements': {
+                    '_id': movement_id,
+                    'quantity': self.quantity,
+                    'type': self.transaction_type,
+                    'timestamp': self.timestamp
+                }},
+                '$inc': {
+                    'count': 1,
+                    'inTotal': self.quantity if self.transaction_type == 'in' else 0,
+                    'outTotal': self.quantity if self.transaction_type == 'out' else 0
+                },
+                '$min': {'firstTimestamp': self.timestamp},
+                '$max': {'lastTimestamp': self.timestamp}
+            },
+            upsert=True,
+            session=session
+        )
+        return movement_id
+
+    @staticmethod
+    def find(start=None, end=None, product_ids=None):
+        """Movements as flat {_id, product_id, quantity, type, timestamp}
+        documents in timestamp order, whichever layout is in use."""
+        if not bucketed():
+            query = {}
+            if start or end:
+                query['timestamp'] = {}
+                if start:
+                    query['timestamp']['$gte'] = start
+                if end:
+                    query['timestamp']['$lt'] = end
+            if product_ids:
+                query['product_id'] = {'$in': list(product_ids)}
+            return reporting_db.stock_transactions.find(query).sort('timestamp', 1)
+
+        # Narrow to whole buckets first (indexed), then to exact movements
+        match, movement_match = {}, {}
+        if product_ids:
+            match['productId'] = {'$in': [str(p) for p in product_ids]}
+        if start:
+            match['lastTimestamp'] = {'$gte': start}
+            movement_match['movements.timestamp'] = {'$gte': start}
+        if end:
+            match['firstTimestamp'] = {'$lt': end}
+            movement_match.setdefault('movements.timestamp', {})['$lt'] = end
+        return reporting_db[BUCKETS].aggregate(_movement_pipeline(match, movement_match), allowDiskUse=True)
+
+    @staticmethod
+    def recent_lookup(limit, as_field='movements'):
+        """$lookup stage that attaches the latest `limit` movements (flat, newest
+        first) to each input document, so other aggregations can include
+        recent activity without a second round trip."""
+        if bucketed():
+            pipeline = _movement_pipeline({}, None)[:-1]
+            pipeline[0:1] = [{'$sort': {'lastTimestamp': -1}}, {'$limit': limit}]
+            collection = BUCKETS
+        else:
+            pipeline = []
+            collection = 'stock_transactions'
+        pipeline += [{'$sort': {'timestamp': -1}}, {'$limit': limit}]
+        return {'$lookup': {'from': collection, 'pipeline': pipeline, 'as': as_field}}
+
+    @staticmethod
+    def monthly_totals(product_id):
+        """[{month, in, out, count}] for a product, oldest first."""
+        if bucketed():
+            pipeline = [
+                {'$match': {'productId': str(product_id)}},
+                {'$group': {'_id': '$month', 'in': {'$sum': '$inTotal'},
+                            'out': {'$sum': '$outTotal'}, 'count': {'$sum': '$count'}}},
+            ]
+        else:
+            pipeline = [
+                {'$match': {'product_id': product_id}},
+                {'$group': {
+                    '_id': {'$dateTrunc': {'date': '$timestamp', 'unit': 'month'}},
+                    'in': {'$sum': {'$cond': [{'$eq': ['$type', 'in']}, '$quantity', 0]}},
+                    'out': {'$sum': {'$cond': [{'$eq': ['$type', 'out']}, '$quantity', 0]}},
+                    'count': {'$sum': 1}
+                }},
+            ]
+        pipeline += [
+            {'$sort': {'_id': 1}},
+            {'$project': {'_id': 0, 'month': '$_id', 'in': 1, 'out': 1, 'count': 1}},
+        ]
+        collection = reporting_db[BUCKETS] if bucketed() else reporting_db.stock_transactions
+        return list(collection.aggregate(pipeline))
+
+    @staticmethod
+    def balances(low, high=None, before=None):
+        """{product_id: {'in', 'out', 'count'}} summed server-side over the
+        movements of product ids in [low, high) (string bounds; high None
+        for no upper bound) that happened before `before`."""
+        id_range = {'$gte': low}
+        if high is not None:
+            id_range['$lt'] = high
+        if bucketed():
+            match = {'productId': id_range}
+            if before:
+                match['firstTimestamp'] = {'$lt': before}
+            # Buckets that end before the cutoff count through their running
+            # totals; only the ones straddling it are summed movement by movement
+            # ($literal: a bare True in $project is an inclusion flag, not a value)
+            whole = {'$lt': ['$lastTimestamp', before]} if before else {'$literal': True}
+            kept = {'$filter': {'input': '$movements', 'cond': {'$lt': ['$$this.timestamp', before]}}} if before else []
+
+            def movement_sum(kind):
+                return {'$sum': {'$map': {
+                    'input': {'$filter': {'input': '$kept', 'cond': {'$eq': ['$$this.type', kind]}}},
+                    'in': '$$this.quantity'
+                }}}
+
+            pipeline = [
+                {'$match': match},
+                {'$project': {'productId': 1, 'inTotal': 1, 'outTotal': 1, 'count': 1, 'whole': whole,
+                              'kept': {'$cond': [whole, [], kept]}}},
+                {'$group': {
+                    '_id': '$productId',
+                    'in': {'$sum': {'$cond': ['$whole', '$inTotal', movement_sum('in')]}},
+                    'out': {'$sum': {'$cond': ['$whole', '$outTotal', movement_sum('out')]}},
+                    'count': {'$sum': {'$cond': ['$whole', '$count', {'$size': '$kept'}]}}
+                }},
+            ]
+            collection = reporting_db[BUCKETS]
+        else:
+            match = {'product_id': id_range}
+            if before:
+                match['timestamp'] = {'$lt': before}
+            pipeline = [
+                {'$match': match},
+                {'$group': {
+                    '_id': '$product_id',
+                    'in': {'$sum': {'$cond': [{'$eq': ['$type', 'in']}, '$quantity', 0]}},
+                    'out': {'$sum': {'$cond': [{'$eq': ['$type', 'out']}, '$quantity', 0]}},
+                    'count': {'$sum': 1}
+                }},
+            ]
+            collection = reporting_db.stock_transactions
+        return {
+            str(row['_id']): {'in': row['in'], 'out': row['out'], 'count': row['count']}
+            for row in collection.aggregate(pipeline, allowDiskUse=True)
+        }
+
     @staticmethod
     def get_all():
-        return list(db.stock_transactions.find())
+        return list(StockTransaction.find())
 
     @staticmethod
     def get_by_product(product_id):
-        return list(db.stock_transactions.find({'product_id': product_id}))
+        return list(StockTransaction.find(product_ids=[product_id]))
@@ -0,0 +1,195 @@
+"""Reconcile products.stock against the stock ledger.
+
+    python -m server.reconcile_stock                      # report only
+    python -m server.reconcile_stock --csv drift.csv      # every discrepancy to a file
+    python -m server.reconcile_stock --apply              # correct them
+
+Products are split into --partitions _id ranges ($bucketAuto over _id),
+and the ranges are reconciled in parallel threads. For each range, two
+server-side $group pipelines sum the ledger (StockTransaction.balances,
+whichever layout is in use) and the detailed_stock intake that is not
+marked ledgered (DetailedStockRepository.intake). Those sums are compared
+with the stored stock.
+
+detailed_stock records written together with a ledger 'in' are marked
+ledgered and left out of the intake. Older records are not marked: those
+from /stock/in/detailed have a ledger entry, those from the Excel import
+(before it wrote one) do not, and nothing tells them apart. So with
+unmarked intake U next to ledger receipts L, the true stock lies between
+
+    max(L, U) - ledger out    (every unmarked record is in the ledger)
+    L + U - ledger out        (none of them is)
+
+A product whose stock is inside that range is consistent. With only one
+of L and U the range is a single value and a drifted product gets that
+value as its expected stock; with both it is reported as ambiguous, with
+the nearest bound as expected, and never corrected automatically.
+
+Reads go to the reporting profile and only count activity before a cutoff
+MONGODB_MAX_STALENESS_SECONDS before the run started. Products changed
+after the cutoff are skipped rather than judged against a lagging
+secondary. --apply writes the expected stock in batches, each guarded on
+the stock value that was read, so a movement that lands meanwhile is never
+overwritten. Products with no ledger or intake history at all (seed data,
+initial stock set on creation) are reported but only corrected with
+--include-unledgered; ambiguous products are only ever reported.
+"""
+import argparse
+import csv
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pymongo import UpdateOne
+from .db.database import MONGODB_MAX_STALENESS_SECONDS, db, movements_db, reporting_db
+from .db.changes import change_fields
+from .db.thresholds import stock_update
+from .models.stock_transaction import StockTransaction
+from .repositories.detailed_stock import DetailedStockRepository
+
+WORKERS = 8
+WRITE_BATCH = 500
+# Differences below this are float noise from summing sq m
+TOLERANCE = 1e-4
+CSV_FIELDS = ['productId', 'name', 'category', 'stock', 'expected', 'difference', 'ambiguous',
+              'ledgerIn', 'ledgerOut', 'movements', 'intake', 'intakeRecords']
+
+
+def partitions(count):
+    """[(low, high)] ObjectId bounds covering every product; high is None
+    for the last range."""
+    buckets = list(reporting_db.products.aggregate([{'$bucketAuto': {'groupBy': '$_id', 'buckets': count}}]))
+    lows = [bucket['_id']['min'] for bucket in buckets]
+    return list(zip(lows, lows[1:] + [None]))
+
+
+def reconcile_range(low, high, cutoff):
+    """Discrepancies for products with _id in [low, high), plus the number
+    of products checked and skipped."""
+    id_range = {'$gte': low}
+    if high is not None:
+        id_range['$lt'] = high
+    products = reporting_db.products.find(
+        {'_id': id_range}, {'name': 1, 'category': 1, 'stock': 1, 'lastUpdated': 1}
+    )
+    string_low, string_high = str(low), str(high) if high is not None else None
+    ledger = StockTransaction.balances(string_low, string_high, cutoff)
+    intake = DetailedStockRepository.intake(string_low, string_high, cutoff)
+
+    discrepancies, checked, skipped = [], 0, 0
+    for product in products:
+        last_updated = product.get('lastUpdated')
+        if last_updated is not None and last_updated >= cutoff:
+            skipped += 1
+            continue
+        checked += 1
+        product_id = str(product['_id'])
+        movements = ledger.get(product_id, {'in': 0, 'out': 0, 'count': 0})
+        received = intake.get(product_id, {'quantity': 0, 'count': 0})
+        lowest = round(max(movements['in'], received['quantity']) - movements['out'], 6)
+        highest = round(movements['in'] + received['quantity'] - movements['out'], 6)
+        stock = product.get('stock') or 0
+        if lowest - TOLERANCE <= stock <= highest + TOLERANCE:
+            continue
+        expected = lowest if stock < lowest else highest
+        discrepancies.append({
+            '_id': product['_id'],
+            'productId': product_id,
+            'name': product.get('name'),
+            'category': product.get('category'),
+            'stock': stock,
+            'expected': expected,
+            'difference': round(stock - expected, 6),
+            'ambiguous': bool(movements['in'] and received['quantity']),
+            'ledgerIn': movements['in'],
+            'ledgerOut': movements['out'],
+            'movements': movements['count'],
+            'intake': received['quantity'],
+            'intakeRecords': received['count'],
+            # Keep the value as read: the correction is guarded on it
+            'read_stock': product.get('stock'),
+        })
+    return discrepancies, checked, skipped
+
+
+def apply_corrections(discrepancies):
+    corrected = 0
+    for start in range(0, len(discrepancies), WRITE_BATCH):
+        batch = discrepancies[start:start + WRITE_BATCH]
+        changes = change_fields()
+        operations = [
+            UpdateOne({'_id': item['_id'], 'stock': item['read_stock']}, stock_update(item['expected'], changes))
+            for item in batch
+        ]
+        # No SSE publish from here: this process has no subscribers, and
+        # STOCK_EVENTS_SOURCE=changestream workers pick the writes up themselves
+        corrected += movements_db.products.bulk_write(operations, ordered=False).modified_count
+    return corrected
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--workers', type=int, default=WORKERS)
+    parser.add_argument('--partitions', type=int, default=None, help='_id ranges (default: 4 per worker)')
+    parser.add_argument('--apply', action='store_true', help='write the expected stock to drifted products')
+    parser.add_argument('--include-unledgered', action='store_true',
+                        help='with --apply, also zero products that have no ledger or intake history')
+    parser.add_argument('--csv', help='write every discrepancy to this CSV file')
+    parser.add_argument('--show', type=int, default=20, help='largest discrepancies to print')
+    args = parser.parse_args()
+
+    started = datetime.utcnow()
+    cutoff = started - timedelta(seconds=MONGODB_MAX_STALENESS_SECONDS)
+    clock = time.monotonic()
+    ranges = partitions(args.partitions or args.workers * 4)
+
+    discrepancies, checked, skipped = [], 0, 0
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        for found, range_checked, range_skipped in pool.map(lambda bounds: reconcile_range(*bounds, cutoff), ranges):
+            discrepancies.extend(found)
+            checked += range_checked
+            skipped += range_skipped
+    discrepancies.sort(key=lambda item: abs(item['difference']), reverse=True)
+
+    print(f'Checked {checked} products in {len(ranges)} ranges ({time.monotonic() - clock:.1f}s); '
+          f'skipped {skipped} changed since {cutoff:%Y-%m-%d %H:%M:%S}')
+    print(f'{len(discrepancies)} discrepancies')
+    for item in discrepancies[:args.show]:
+        print(f"  {item['productId']}  {item['name'] or '-':<40.40} stock {item['stock']:>12g}  "
+              f"expected {item['expected']:>12g}  ({item['movements']} movements, {item['intakeRecords']} intake)"
+              f"{'  ambiguous' if item['ambiguous'] else ''}")
+
+    if args.csv:
+        with open(args.csv, 'w', newline='') as handle:
+            writer = csv.DictWriter(handle, fieldnames=CSV_FIELDS, extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(discrepancies)
+        print(f'Wrote {args.csv}')
+
+    corrected = 0
+    if args.apply:
+        to_correct = [
+            item for item in discrepancies
+            if not item['ambiguous'] and (args.include_unledgered or item['movements'] or item['intakeRecords'])
+        ]
+        corrected = apply_corrections(to_correct)
+        print(f'Corrected {corrected} of {len(to_correct)} products '
+              '(the rest changed since they were read; run again to recheck them)')
+        ambiguous = sum(1 for item in discrepancies if item['ambiguous'])
+        if ambiguous:
+            print(f'Left {ambiguous} ambiguous products for review (see --csv)')
+
+    db.reconciliations.insert_one({
+        'startedAt': started,
+        'finishedAt': datetime.utcnow(),
+        'cutoff': cutoff,
+        'checked': checked,
+        'skipped': skipped,
+        'discrepancies': len(discrepancies),
+        'ambiguous': sum(1 for item in discrepancies if item['ambiguous']),
+        'applied': args.apply,
+        'corrected': corrected,
+    })
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,361 @@
+"""Columnar, memory-mapped snapshot of the product catalogue.
+
+The hot product fields (id, name, category, imported, stock, canonical
+dimensions, sku, threshold flags and lastUpdated) are written column by
+column into one file under CATALOGUE_SNAPSHOT_DIR. Every gunicorn worker
+maps that file read-only, so the page cache holds a single copy shared by
+all of them, and the product summary list, /api/stock and /api/reports
+filter, sort and sum NumPy views over it instead of scanning db.products.
+
+A snapshot belongs to one change generation (the db.changes counter).
+Each worker checks the counter from a background thread every
+CHECK_SECONDS; requests only ever pick up the snapshot that thread last
+mapped, and keep getting it while the next one is built. The first worker
+to see the counter move takes a file lock, builds the next snapshot from
+reporting_db into a temporary file and os.replace()s it over the old one;
+workers waiting on the lock then map the new file. Processes that still
+map the old file keep a valid view of it until they switch. Until a
+worker has mapped its first snapshot, its requests read MongoDB.
+
+Set CATALOGUE_SNAPSHOT_DIR to an empty string to read from MongoDB as
+before; that is also the fallback when numpy is missing or a build fails.
+"""
+import json
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from ..db.database import reporting_db
+from ..db.changes import current_change_seq
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process development server only
+    fcntl = None
+
+SNAPSHOT_DIR = os.environ.get(
+    'CATALOGUE_SNAPSHOT_DIR',
+    # A mapped file cannot be replaced on Windows, so the snapshot is opt-in there
+    os.path.join(tempfile.gettempdir(), 'stock-catalogue') if fcntl else ''
+)
+SNAPSHOT_FILE = 'catalogue.snapshot'
+# Seconds between a worker's checks of the change counter; listings and
+# totals may lag writes by this much (plus the build)
+CHECK_SECONDS = float(os.environ.get('CATALOGUE_SNAPSHOT_CHECK_SECONDS', '10'))
+# Writes take their changeSeq before they land. A build that saw fewer
+# changes than the counter promised is redone once after this long, the
+# same allowance /api/products/changes gives (CHANGE_SETTLE_SECONDS).
+SETTLE_SECONDS = 5
+BATCH_SIZE = 1000
+
+MAGIC = b'CATSNAP2'
+_PREAMBLE = struct.Struct('<8sQ')
+_ALIGN = 8
+
+NUMERIC_COLUMNS = {
+    'stock': 'stock',
+    'length_mm': 'length_mm',
+    'width_mm': 'width_mm',
+    'thickness_mm': 'thickness_mm',
+    'area_m2': 'area_m2',
+    'reorderThreshold': 'reorderThreshold',
+}
+FLAG_COLUMNS = {'imported': 'imported', 'belowThreshold': 'belowThreshold'}
+# Stock is stored as float64; this flag gives integer stock back as int
+# Few distinct values: stored as int32 codes into the header's dictionaries
+CODED_COLUMNS = {'category': 'category', 'stockType': 'dimensions.stockType'}
+# Variable length: stored as int64 offsets into a UTF-8 blob
+STRING_COLUMNS = {'name': 'name', 'sku': 'sku'}
+PROJECTION = dict.fromkeys(
+    list(NUMERIC_COLUMNS.values()) + list(FLAG_COLUMNS.values()) + list(CODED_COLUMNS.values())
+    + list(STRING_COLUMNS.values()) + ['lastUpdated', 'changeSeq'],
+    1
+)
+
+_lock = threading.Lock()
+_snapshot = None
+_refresher = None
+
+
+def enabled():
+    if not SNAPSHOT_DIR:
+        return False
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _field(document, path):
+    for part in path.split('.'):
+        if not isinstance(document, dict):
+            return None
+        document = document.get(part)
+    return document
+
+
+def _number(value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return float('nan')
+    return float(value)
+
+
+def _integral(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _aligned(offset):
+    return (offset + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+def _build(path, generation, previous):
+    import numpy as np
+
+    ids, updated = [], []
+    numeric = {column: [] for column in NUMERIC_COLUMNS}
+    flags = {column: [] for column in FLAG_COLUMNS}
+    codes = {column: [] for column in CODED_COLUMNS}
+    dictionaries = {column: {} for column in CODED_COLUMNS}
+    strings = {column: [] for column in STRING_COLUMNS}
+    integral = []
+    observed = 0
+
+    for product in reporting_db.products.find({}, PROJECTION).batch_size(BATCH_SIZE):
+        ids.append(str(product['_id']))
+        for column, field in NUMERIC_COLUMNS.items():
+            numeric[column].append(_number(_field(product, field)))
+        integral.append(_integral(product.get('stock')))
+        for column, field in FLAG_COLUMNS.items():
+            flags[column].append(bool(_field(product, field)))
+        for column, field in CODED_COLUMNS.items():
+            value = _field(product, field)
+            codes[column].append(dictionaries[column].setdefault(value, len(dictionaries[column])))
+        for column, field in STRING_COLUMNS.items():
+            value = _field(product, field)
+            strings[column].append(b'' if value is None else str(value).encode('utf-8'))
+        last_updated = product.get('lastUpdated')
+        updated.append(last_updated if hasattr(last_updated, 'isoformat') else None)
+        observed = max(observed, product.get('changeSeq') or 0)
+    tombstone = reporting_db.product_tombstones.find_one({}, {'changeSeq': 1}, sort=[('changeSeq', -1)])
+    if tombstone:
+        observed = max(observed, tombstone.get('changeSeq') or 0)
+
+    columns = {'id': np.array(ids, dtype='S24')}
+    for column, values in numeric.items():
+        columns[column] = np.array(values, dtype='<f8')
+    for column, values in flags.items():
+        columns[column] = np.array(values, dtype='?')
+    columns['stock_integral'] = np.array(integral, dtype='?')
+    for column, values in codes.items():
+        columns[column] = np.array(values, dtype='<i4')
+    for column, values in strings.items():
+        columns[f'{column}_offsets'] = np.concatenate(([0], np.cumsum([len(v) for v in values], dtype='<i8'))).astype('<i8')
+        columns[f'{column}_data'] = np.frombuffer(b''.join(values), dtype='u1')
+    columns['lastUpdated'] = np.array(
+        [np.datetime64(value, 'ms') if value is not None else np.datetime64('NaT') for value in updated],
+        dtype='<M8[ms]'
+    )
+    # Sorting by name happens once here rather than on every request. UTF-8
+    # byte order is code point order, which is how MongoDB sorts strings.
+    names = strings['name']
+    columns['name_order'] = np.array(sorted(range(len(names)), key=names.__getitem__), dtype='<i4')
+
+    layout, offset = {}, 0
+    for column, array in columns.items():
+        offset = _aligned(offset)
+        layout[column] = [array.dtype.str, offset, len(array)]
+        offset += array.nbytes
+    header = json.dumps({
+        'generation': generation,
+        'observed': observed,
+        # A second build for the same generation has waited out SETTLE_SECONDS
+        'settled': observed >= generation or (previous is not None and previous.generation == generation),
+        'builtAt': time.time(),
+        'count': len(ids),
+        'dictionaries': {column: list(values) for column, values in dictionaries.items()},
+        'columns': layout,
+    }).encode('utf-8')
+
+    data_start = _aligned(_PREAMBLE.size + len(header))
+    handle = tempfile.NamedTemporaryFile(dir=os.path.dirname(path), prefix='.catalogue-', delete=False)
+    try:
+        with handle:
+            handle.write(_PREAMBLE.pack(MAGIC, len(header)))
+            handle.write(header)
+            for column, array in columns.items():
+                handle.seek(data_start + layout[column][1])
+                handle.write(array.tobytes())
+            # Empty trailing columns still need their offset inside the file
+            handle.truncate(data_start + offset)
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(handle.name, path)
+    except BaseException:
+        if os.path.exists(handle.name):
+            os.unlink(handle.name)
+        raise
+
+
+class CatalogueSnapshot:
+    """Read-only NumPy views over one mapped snapshot file."""
+
+    def __init__(self, path):
+        import numpy as np
+        self._np = np
+        with open(path, 'rb') as handle:
+            self._map = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, header_length = _PREAMBLE.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not a catalogue snapshot')
+        header = json.loads(self._map[_PREAMBLE.size:_PREAMBLE.size + header_length])
+        data_start = _aligned(_PREAMBLE.size + header_length)
+        self.generation = header['generation']
+        self.settled = header['settled']
+        self.built_at = header['builtAt']
+        self.count = header['count']
+        self.dictionaries = header['dictionaries']
+        self.columns = {
+            column: np.frombuffer(self._map, dtype=dtype, count=count, offset=data_start + offset)
+            for column, (dtype, offset, count) in header['columns'].items()
+        }
+
+    def needs_rebuild(self, generation):
+        if generation != self.generation:
+            return True
+        return not self.settled and time.time() - self.built_at >= SETTLE_SECONDS
+
+    def _string(self, column, index):
+        offsets = self.columns[f'{column}_offsets']
+        return self.columns[f'{column}_data'][offsets[index]:offsets[index + 1]].tobytes().decode('utf-8')
+
+    def _code(self, column, value):
+        try:
+            return self.dictionaries[column].index(value)
+        except ValueError:
+            return -1
+
+    def _stock(self, index):
+        value = float(self.columns['stock'][index])
+        if value != value:
+            return 0
+        return int(value) if self.columns['stock_integral'][index] else value
+
+    def totals(self):
+        """(total stock, number of products below their threshold)."""
+        stock = self.columns['stock']
+        total = float(self._np.nansum(stock))
+        return (int(total) if total.is_integer() else total), int(self._np.count_nonzero(self.columns['belowThreshold']))
+
+    def report_rows(self):
+        """(name, category, stock, lastUpdated) per product, as ProductRepository.report_rows."""
+        categories = self.dictionaries['category']
+        category_codes = self.columns['category'].tolist()
+        updated = self.columns['lastUpdated'].astype(object).tolist()
+        return [
+            (self._string('name', i), categories[category_codes[i]], self._stock(i), updated[i])
+            for i in range(self.count)
+        ]
+
+    def select(self, category=None, imported=None, sort='name', limit=None):
+        """Row indices matching the filters, in the requested order."""
+        np = self._np
+        mask = np.ones(self.count, dtype=bool)
+        if category is not None:
+            mask &= self.columns['category'] == self._code('category', category)
+        if imported is not None:
+            mask &= self.columns['imported'] == imported
+        if sort == 'name':
+            order = self.columns['name_order']
+        else:
+            # Missing stock sorts last either way
+            stock = np.nan_to_num(self.columns['stock'], nan=-np.inf if sort == '-stock' else np.inf)
+            order = np.argsort(-stock if sort == '-stock' else stock, kind='stable')
+        indices = order[mask[order]]
+        return indices[:limit] if limit is not None else indices
+
+    def summary(self, index):
+        def number(column):
+            value = float(self.columns[column][index])
+            return None if value != value else value
+
+        updated = self.columns['lastUpdated'][index].astype(object)
+        return {
+            '_id': self.columns['id'][index].decode('ascii'),
+            'name': self._string('name', index),
+            'category': self.dictionaries['category'][self.columns['category'][index]],
+            'imported': bool(self.columns['imported'][index]),
+            'stock': self._stock(index),
+            'sku': self._string('sku', index) or None,
+            'stockType': self.dictionaries['stockType'][self.columns['stockType'][index]],
+            'length_mm': number('length_mm'),
+            'width_mm': number('width_mm'),
+            'thickness_mm': number('thickness_mm'),
+            'area_m2': number('area_m2'),
+            'reorderThreshold': number('reorderThreshold'),
+            'belowThreshold': bool(self.columns['belowThreshold'][index]),
+            'lastUpdated': updated.isoformat() if updated is not None else None,
+        }
+
+
+def _open(path):
+    try:
+        return CatalogueSnapshot(path)
+    except (OSError, ValueError, struct.error):
+        return None
+
+
+def _load_or_build(generation, previous):
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    path = os.path.join(SNAPSHOT_DIR, SNAPSHOT_FILE)
+    with open(path + '.lock', 'a') as lock_file:
+        # Other workers wait here and then map the file this one built
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        on_disk = _open(path)
+        if on_disk is not None and not on_disk.needs_rebuild(generation):
+            return on_disk
+        _build(path, generation, on_disk or previous)
+        return CatalogueSnapshot(path)
+
+
+def _refresh():
+    global _snapshot
+    try:
+        # Same profile as the build, so secondary lag does not make every
+        # build look unsettled
+        generation = current_change_seq(reporting_db)
+        if _snapshot is None or _snapshot.needs_rebuild(generation):
+            _snapshot = _load_or_build(generation, _snapshot)
+    except Exception as e:
+        print(f'Catalogue snapshot unavailable: {e}')
+        # Readers fall back to MongoDB rather than a snapshot that stopped updating
+        _snapshot = None
+
+
+def _refresh_forever():
+    while True:
+        _refresh()
+        time.sleep(max(CHECK_SECONDS, 1))
+
+
+def _start_refresher():
+    global _refresher
+    with _lock:
+        # A forked worker inherits the parent's Thread object but not the thread
+        if _refresher is not None and _refresher.is_alive():
+            return
+        _refresher = threading.Thread(target=_refresh_forever, name='catalogue-snapshot', daemon=True)
+        _refresher.start()
+
+
+def current():
+    """The snapshot this worker last mapped, or None when the caller should
+    read MongoDB instead. Never builds on the request path."""
+    if not enabled():
+        return None
+    if _refresher is None or not _refresher.is_alive():
+        _start_refresher()
+    return _snapshot
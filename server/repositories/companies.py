@@ -0,0 +1,7 @@
+from ..db.database import db
+
+
+class CompanyRepository:
+    @staticmethod
+    def list_all():
+        return list(db.companies.find({}, {'_id': 0}))
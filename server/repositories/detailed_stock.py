@@ -0,0 +1,49 @@
+from ..db.database import db, reporting_db
+from ..utils import ledger_export
+
+
+class DetailedStockRepository:
+    @staticmethod
+    def insert(record):
+        return db.detailed_stock.insert_one(record).inserted_id
+
+    @staticmethod
+    def export_documents(query):
+        """detailed_stock rows for the ledger export, with its column projection."""
+        return ledger_export.find_documents(reporting_db.detailed_stock, 'detailed_stock', query)
+
+    @staticmethod
+    def intake(low, high=None, before=None):
+        """{productId: quantity received} over detailed_stock records of
+        product ids in [low, high) created before `before` that are not
+        marked ledgered (their stock-in was not written to the ledger with
+        them, or predates the mark). The quantity is what /stock/in/detailed
+        and the Excel import add to stock: pieces for blanket cut pieces,
+        sq m for rolls, otherwise the entered stock."""
+        id_range = {'$gte': low}
+        if high is not None:
+            id_range['$lt'] = high
+        match = {'productId': id_range, 'ledgered': {'$ne': True}}
+        if before:
+            match['createdAt'] = {'$lt': before}
+
+        def number(field):
+            return {'$convert': {'input': field, 'to': 'double', 'onError': 0, 'onNull': 0}}
+
+        quantity = {'$switch': {
+            'branches': [
+                {'case': {'$and': [{'$in': ['$productType', ['blankets', 'underpacking']]},
+                                   {'$eq': ['$stockType', 'pieces']}]},
+                 'then': number('$numberOfPieces')},
+                {'case': {'$ne': [{'$ifNull': ['$sqMtr', None]}, None]}, 'then': number('$sqMtr')},
+            ],
+            'default': number('$stock')
+        }}
+        pipeline = [
+            {'$match': match},
+            {'$group': {'_id': '$productId', 'quantity': {'$sum': quantity}, 'count': {'$sum': 1}}},
+        ]
+        return {
+            str(row['_id']): {'quantity': row['quantity'], 'count': row['count']}
+            for row in reporting_db.detailed_stock.aggregate(pipeline, allowDiskUse=True)
+        }
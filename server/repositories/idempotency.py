@@ -0,0 +1,86 @@
+"""Idempotency keys for client-retried writes (db.idempotency_keys).
+
+One document per (endpoint, key): claimed as 'pending' before the write
+runs, then completed with the response that was sent, so a retry of the
+same request gets that response back instead of writing again. Documents
+expire IDEMPOTENCY_TTL_SECONDS (db.indexes) after they were created.
+
+Every claim carries a random token, and only its holder can complete or
+release it. Everything goes to movements_db: a retry must see the claim
+its first attempt made, and that claim is what stands between it and the
+stock.
+"""
+import uuid
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from ..db.database import movements_db
+
+# A claim still pending after this long is taken to belong to a request
+# that died, and may be taken over where the caller allows it
+PENDING_SECONDS = 60
+
+
+class ClaimLost(Exception):
+    """The claim was taken over (or expired) before it was completed."""
+
+
+def _record_id(scope, key):
+    return f'{scope}:{key}'
+
+
+class IdempotencyRepository:
+    @staticmethod
+    def claim(scope, key, fingerprint, takeover=False):
+        """(claim token, None) if the key is now ours to run, else (None,
+        the existing record: status 'pending' or 'done', fingerprint,
+        response, statusCode). With takeover, a claim pending for longer
+        than PENDING_SECONDS is taken over."""
+        now = datetime.utcnow()
+        record_id = _record_id(scope, key)
+        token = uuid.uuid4().hex
+        try:
+            movements_db.idempotency_keys.insert_one({
+                '_id': record_id,
+                'fingerprint': fingerprint,
+                'status': 'pending',
+                'claim': token,
+                'createdAt': now,
+                'claimedAt': now
+            })
+            return token, None
+        except DuplicateKeyError:
+            pass
+        if takeover:
+            stale = now - timedelta(seconds=PENDING_SECONDS)
+            taken = movements_db.idempotency_keys.find_one_and_update(
+                {'_id': record_id, 'fingerprint': fingerprint, 'status': 'pending', 'claimedAt': {'$lt': stale}},
+                {'$set': {'claim': token, 'claimedAt': now}},
+                return_document=ReturnDocument.AFTER
+            )
+            if taken is not None:
+                return token, None
+        existing = movements_db.idempotency_keys.find_one({'_id': record_id})
+        if existing is None:
+            # Expired or released between the insert and the read
+            return IdempotencyRepository.claim(scope, key, fingerprint, takeover)
+        return None, existing
+
+    @staticmethod
+    def complete(scope, key, token, response, status_code, session=None):
+        """Store the response under our claim; raises ClaimLost if the claim
+        is no longer ours, which aborts a transaction it is part of."""
+        result = movements_db.idempotency_keys.update_one(
+            {'_id': _record_id(scope, key), 'claim': token, 'status': 'pending'},
+            {'$set': {'status': 'done', 'response': response, 'statusCode': status_code,
+                      'completedAt': datetime.utcnow()}},
+            session=session
+        )
+        if not result.matched_count:
+            raise ClaimLost(_record_id(scope, key))
+
+    @staticmethod
+    def release(scope, key, token):
+        """Drop our pending claim after a request that wrote nothing, so it
+        can be retried."""
+        movements_db.idempotency_keys.delete_one({'_id': _record_id(scope, key), 'claim': token, 'status': 'pending'})
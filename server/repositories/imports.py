@@ -0,0 +1,52 @@
+from datetime import datetime
+from ..db.database import db
+from .records import ImportSession
+from bson import ObjectId
+
+CONFLICT_PAGE_PROJECTION = {'seq': 1, 'productId': 1, 'productName': 1, 'productType': 1, 'differences': 1}
+
+
+class ImportRepository:
+    @staticmethod
+    def get(import_id):
+        """ImportSession for an id string, or None if unknown, expired or malformed."""
+        if not ObjectId.is_valid(import_id):
+            return None
+        return ImportSession.from_document(db.imports.find_one({'_id': ObjectId(import_id)}, ImportSession.projection()))
+
+    @staticmethod
+    def create(session):
+        db.imports.insert_one(session)
+
+    @staticmethod
+    def finish(import_id, counts):
+        db.imports.update_one({'_id': import_id}, {'$set': dict(counts, status='done', finishedAt=datetime.utcnow())})
+
+    @staticmethod
+    def add_conflicts(conflicts):
+        db.import_conflicts.insert_many(conflicts, ordered=False)
+
+    @staticmethod
+    def open_conflicts(import_id, after, limit):
+        """Unresolved conflicts of an import in seq order, after the given seq."""
+        return db.import_conflicts.find(
+            {'importId': import_id, 'seq': {'$gt': after}, 'resolution': None}, CONFLICT_PAGE_PROJECTION
+        ).sort('seq', 1).limit(limit)
+
+    @staticmethod
+    def claim_conflict(import_id, seq, resolution):
+        """Mark an open conflict resolved and return its productId and row,
+        or None if it is unknown or already resolved."""
+        return db.import_conflicts.find_one_and_update(
+            {'importId': import_id, 'seq': seq, 'resolution': None},
+            {'$set': {'resolution': resolution, 'resolvedAt': datetime.utcnow()}},
+            projection={'productId': 1, 'row': 1}
+        )
+
+    @staticmethod
+    def reopen_conflict(conflict_id, resolution):
+        """Undo claim_conflict for a resolution that could not be applied."""
+        db.import_conflicts.update_one(
+            {'_id': conflict_id, 'resolution': resolution},
+            {'$set': {'resolution': None}, '$unset': {'resolvedAt': ''}}
+        )
@@ -0,0 +1,225 @@
+"""Named product queries for the routes.
+
+Every read declares its projection here, next to the query, and goes to
+the database profile it needs: stock levels that feed a write come from
+movements_db, listings and reports from reporting_db. Point reads return
+records (repositories.records), bulk reads tuples or projected documents.
+Catalogue-wide summaries, totals and report rows come from the shared
+catalogue snapshot (repositories.catalogue) when one is available.
+"""
+from ..db.database import db, movements_db, reporting_db
+from ..db import thresholds
+from ..db.changes import change_fields
+from ..db.indexes import DIMENSION_SEARCH_INDEX, LOW_STOCK_INDEX, LOW_STOCK_FIELDS
+from ..models.product import Product
+from ..utils.dimensions import canonical_dimensions
+from ..utils.events import publish_stock_change
+from ..utils.signature import signature_fields
+from .catalogue import current as current_snapshot
+from .records import ProductMatch, ProductSku, ProductStock
+from bson import ObjectId
+
+SEARCH_PROJECTION = {
+    'name': 1,
+    'category': 1,
+    'stock': 1,
+    'dimensions.stockType': 1,
+    'dimensions.rollNumber': 1,
+    'thickness_mm': 1,
+    'width_mm': 1,
+    'length_mm': 1,
+    'area_m2': 1
+}
+# Limited to the index keys so the query is covered
+ALERT_PROJECTION = {field: 1 for field in LOW_STOCK_FIELDS}
+REPORT_FIELDS = ('name', 'category', 'stock', 'lastUpdated')
+# What the Excel import reads of the products it merges rows into
+IMPORT_PROJECTION = {'name': 1, 'category': 1, 'stock': 1, 'dimensions': 1}
+SUMMARY_PROJECTION = {
+    'name': 1,
+    'category': 1,
+    'imported': 1,
+    'stock': 1,
+    'sku': 1,
+    'dimensions.stockType': 1,
+    'length_mm': 1,
+    'width_mm': 1,
+    'thickness_mm': 1,
+    'area_m2': 1,
+    'reorderThreshold': 1,
+    'belowThreshold': 1,
+    'lastUpdated': 1
+}
+# Delta sync order; several products can share a changeSeq
+CHANGE_ORDER = [('changeSeq', 1), ('_id', 1)]
+SUMMARY_SORTS = {'name': [('name', 1)], 'stock': [('stock', 1)], '-stock': [('stock', -1)]}
+
+
+def _summary(product):
+    last_updated = product.get('lastUpdated')
+    return {
+        '_id': str(product['_id']),
+        'name': product.get('name', ''),
+        'category': product.get('category'),
+        'imported': bool(product.get('imported')),
+        'stock': product.get('stock', 0),
+        'sku': product.get('sku'),
+        'stockType': (product.get('dimensions') or {}).get('stockType'),
+        'length_mm': product.get('length_mm'),
+        'width_mm': product.get('width_mm'),
+        'thickness_mm': product.get('thickness_mm'),
+        'area_m2': product.get('area_m2'),
+        'reorderThreshold': product.get('reorderThreshold'),
+        'belowThreshold': bool(product.get('belowThreshold')),
+        'lastUpdated': last_updated.isoformat() if hasattr(last_updated, 'isoformat') else None
+    }
+
+
+def _after(seq, last_id):
+    if last_id is None:
+        return {'changeSeq': {'$gt': seq}}
+    return {'$or': [{'changeSeq': {'$gt': seq}}, {'changeSeq': seq, '_id': {'$gt': last_id}}]}
+
+
+def _with_string_ids(cursor):
+    documents = []
+    for document in cursor:
+        document['_id'] = str(document['_id'])
+        documents.append(document)
+    return documents
+
+
+class ProductRepository:
+    @staticmethod
+    def stock_of(product_id):
+        """ProductStock from the primary, or None if the product is gone."""
+        document = movements_db.products.find_one({'_id': ObjectId(product_id)}, ProductStock.projection())
+        return ProductStock.from_document(document)
+
+    @staticmethod
+    def find_match(query):
+        return ProductMatch.from_document(db.products.find_one(query, ProductMatch.projection()))
+
+    @staticmethod
+    def exists(query):
+        return db.products.find_one(query, {'_id': 1}) is not None
+
+    @staticmethod
+    def sku_by_name(name):
+        return ProductSku.from_document(db.products.find_one({'name': name}, ProductSku.projection()))
+
+    @staticmethod
+    def insert(document):
+        """Insert a new product with its derived change, dimension, signature
+        and threshold fields, and publish its stock. Returns the new id."""
+        dimensions = document.get('dimensions') or {}
+        document.update(change_fields())
+        document.update(canonical_dimensions(dimensions))
+        document.update(signature_fields(document['name'], document['category'], dimensions))
+        document.update(thresholds.threshold_fields(document.get('stock', 0), document['category'], dimensions))
+        result = db.products.insert_one(document)
+        publish_stock_change(result.inserted_id, document.get('stock', 0), document['lastUpdated'])
+        return result.inserted_id
+
+    @staticmethod
+    def known_signatures(hashes):
+        """The subset of signature hashes that some product already has."""
+        cursor = db.products.find({'signatureHash': {'$in': list(hashes)}}, {'signatureHash': 1, '_id': 0})
+        return {product['signatureHash'] for product in cursor}
+
+    @staticmethod
+    def import_matches(names, categories):
+        """Products the Excel import may merge rows into (IMPORT_PROJECTION),
+        oldest first."""
+        return db.products.find(
+            {'name': {'$in': list(names)}, 'category': {'$in': list(categories)}}, IMPORT_PROJECTION
+        ).sort('_id', 1)
+
+    @staticmethod
+    def import_target(product_id):
+        """One product by ObjectId with IMPORT_PROJECTION, or None."""
+        return db.products.find_one({'_id': product_id}, IMPORT_PROJECTION)
+
+    @staticmethod
+    def catalogue():
+        return Product.get_all()
+
+    @staticmethod
+    def summaries(category=None, imported=None, sort='name', limit=None):
+        """Hot fields of the products matching the filters, sorted by
+        name, stock or -stock."""
+        snapshot = current_snapshot()
+        if snapshot is not None:
+            return [snapshot.summary(index) for index in snapshot.select(category, imported, sort, limit)]
+        query = {}
+        if category is not None:
+            query['category'] = category
+        if imported is not None:
+            query['imported'] = True if imported else {'$ne': True}
+        cursor = reporting_db.products.find(query, SUMMARY_PROJECTION).sort(SUMMARY_SORTS[sort])
+        if limit is not None:
+            cursor = cursor.limit(limit)
+        return [_summary(product) for product in cursor]
+
+    @staticmethod
+    def report_rows():
+        """(name, category, stock, lastUpdated) for every product."""
+        snapshot = current_snapshot()
+        if snapshot is not None:
+            return snapshot.report_rows()
+        projection = dict.fromkeys(REPORT_FIELDS, 1)
+        projection['_id'] = 0
+        return [
+            (product.get('name'), product.get('category'), product.get('stock', 0), product.get('lastUpdated'))
+            for product in reporting_db.products.find({}, projection)
+        ]
+
+    @staticmethod
+    def stock_totals():
+        """(total stock, number of products below their threshold)."""
+        snapshot = current_snapshot()
+        if snapshot is not None:
+            return snapshot.totals()
+        totals = list(reporting_db.products.aggregate([{'$group': {'_id': None, 'total': {'$sum': '$stock'}}}]))
+        # Counted from the partial index, which only holds flagged products
+        low_stock = reporting_db.products.count_documents({'belowThreshold': True}, hint=LOW_STOCK_INDEX)
+        return (totals[0]['total'] if totals else 0), low_stock
+
+    @staticmethod
+    def alerts(category=None):
+        query = {'belowThreshold': True}
+        if category:
+            query['category'] = category
+        return _with_string_ids(reporting_db.products.find(query, ALERT_PROJECTION).hint(LOW_STOCK_INDEX))
+
+    @staticmethod
+    def search(query, limit):
+        """Range search over the canonical dimension fields."""
+        cursor = reporting_db.products.find(query, SEARCH_PROJECTION).hint(DIMENSION_SEARCH_INDEX).limit(limit)
+        return _with_string_ids(cursor)
+
+    @staticmethod
+    def all_for_sync():
+        # Full sync documents go to the client's cache whole
+        return db.products.find()
+
+    @staticmethod
+    def changed_since(seq, last_id, limit):
+        """Products after (seq, last_id) in (changeSeq, _id) order."""
+        query = _after(seq, ObjectId(last_id) if last_id else None)
+        return list(db.products.find(query).sort(CHANGE_ORDER).limit(limit))
+
+    @staticmethod
+    def deleted_since(seq, last_id, limit):
+        # Tombstone ids are product id strings, which sort like the ObjectIds
+        return list(db.product_tombstones.find(_after(seq, last_id)).sort(CHANGE_ORDER).limit(limit))
+
+    @staticmethod
+    def export_source():
+        """Collection the workbook export reads (product_export declares its own projection)."""
+        return reporting_db.products
+
+    @staticmethod
+    def aggregate_one(pipeline):
+        """First result of a reporting aggregation over products, or {}."""
+        return next(reporting_db.products.aggregate(pipeline), {})
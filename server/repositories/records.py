@@ -0,0 +1,83 @@
+"""Slotted records returned by the repositories' point reads.
+
+Each record names the document fields it is built from in FIELDS, and the
+repositories derive their projections from it, so a query fetches exactly
+what its caller reads. Bulk reads return plain tuples instead.
+"""
+
+
+def _field(document, path):
+    for part in path.split('.'):
+        if not isinstance(document, dict):
+            return None
+        document = document.get(part)
+    return document
+
+
+class Record:
+    __slots__ = ()
+    # slot -> dotted document path
+    FIELDS = {}
+
+    @classmethod
+    def projection(cls):
+        return {path: 1 for path in cls.FIELDS.values()}
+
+    @classmethod
+    def from_document(cls, document):
+        if document is None:
+            return None
+        record = cls.__new__(cls)
+        for slot, path in cls.FIELDS.items():
+            setattr(record, slot, _field(document, path))
+        return record
+
+    def to_dict(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+    def __repr__(self):
+        fields = ', '.join(f'{slot}={getattr(self, slot)!r}' for slot in self.__slots__)
+        return f'{type(self).__name__}({fields})'
+
+
+class ProductStock(Record):
+    FIELDS = {'id': '_id', 'stock': 'stock'}
+    __slots__ = tuple(FIELDS)
+
+
+class ProductMatch(Record):
+    """An existing product a stock-in entry is merged into."""
+    FIELDS = {'id': '_id', 'name': 'name', 'category': 'category', 'dimensions': 'dimensions'}
+    __slots__ = tuple(FIELDS)
+
+
+class ProductSku(Record):
+    FIELDS = {'id': '_id', 'sku': 'sku'}
+    __slots__ = tuple(FIELDS)
+
+
+class ImportSession(Record):
+    FIELDS = {'id': '_id', 'dry_run': 'dryRun', 'conflicts': 'conflicts', 'status': 'status'}
+    __slots__ = tuple(FIELDS)
+
+
+class Roll(Record):
+    FIELDS = {
+        'id': '_id',
+        'roll_number': 'rollNumber',
+        'product_id': 'productId',
+        'product_type': 'productType',
+        'product_name': 'productName',
+        'length': 'length',
+        'width': 'width',
+        'thickness': 'thickness',
+        'length_unit': 'lengthUnit',
+        'width_unit': 'widthUnit',
+        'thickness_unit': 'thicknessUnit',
+        'area_m2': 'area_m2',
+        'import_date': 'importDate',
+        'taken_date': 'takenDate',
+        'sq_mtr': 'sqMtr',
+        'remaining_sq_mtr': 'remainingSqMtr',
+    }
+    __slots__ = tuple(FIELDS)
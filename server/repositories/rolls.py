@@ -0,0 +1,126 @@
+"""Roll registry (db.rolls): one document per physical roll.
+
+Rolls are keyed by the unique (rollNumber, importDate) index, so a roll
+number that turns up again on a later delivery is a second roll rather
+than a renamed product. Only numbered rolls are registered; that is what
+barcode scanners read.
+"""
+from datetime import datetime
+from pymongo import DESCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from ..db.database import db, movements_db
+from ..utils.dimensions import canonical_dimensions
+from .records import Roll
+
+ROLL_DIMENSIONS = ('length', 'width', 'thickness', 'lengthUnit', 'widthUnit', 'thicknessUnit')
+
+
+def roll_date(value):
+    """Midnight of a date given as a datetime or an ISO date string, else None."""
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.strip()[:19])
+        except ValueError:
+            return None
+    if not isinstance(value, datetime):
+        return None
+    return datetime(value.year, value.month, value.day)
+
+
+def roll_number_of(value):
+    if value is None:
+        return None
+    number = str(value).strip()
+    return number or None
+
+
+def roll_document(product_id, product_type, product_name, roll_number, dimensions,
+                  import_date=None, taken_date=None, sq_mtr=None, remaining_sq_mtr=None):
+    now = datetime.utcnow()
+    dimensions = dimensions or {}
+    document = {
+        'rollNumber': roll_number_of(roll_number),
+        'productId': str(product_id) if product_id is not None else None,
+        'productType': product_type,
+        'productName': product_name,
+        'importDate': roll_date(import_date),
+        'takenDate': roll_date(taken_date),
+        'sqMtr': sq_mtr,
+        'remainingSqMtr': sq_mtr if remaining_sq_mtr is None else remaining_sq_mtr,
+        'createdAt': now,
+        'updatedAt': now
+    }
+    document.update({field: dimensions.get(field) for field in ROLL_DIMENSIONS})
+    document.update(canonical_dimensions(dimensions))
+    return document
+
+
+def serialize_roll(roll):
+    return {
+        '_id': str(roll.id),
+        'rollNumber': roll.roll_number,
+        'productId': roll.product_id,
+        'productType': roll.product_type,
+        'productName': roll.product_name,
+        'length': roll.length,
+        'width': roll.width,
+        'thickness': roll.thickness,
+        'lengthUnit': roll.length_unit,
+        'widthUnit': roll.width_unit,
+        'thicknessUnit': roll.thickness_unit,
+        'area_m2': roll.area_m2,
+        'importDate': roll.import_date.strftime('%Y-%m-%d') if roll.import_date else None,
+        'takenDate': roll.taken_date.strftime('%Y-%m-%d') if roll.taken_date else None,
+        'sqMtr': roll.sq_mtr,
+        'remainingSqMtr': roll.remaining_sq_mtr
+    }
+
+
+class RollRepository:
+    @staticmethod
+    def by_number(roll_number, import_date=None):
+        """The roll with this number (the latest delivery unless import_date
+        is given), read off the roll_number index; None if unknown."""
+        query = {'rollNumber': roll_number_of(roll_number)}
+        if import_date is not None:
+            query['importDate'] = roll_date(import_date)
+        document = db.rolls.find_one(query, Roll.projection(), sort=[('importDate', DESCENDING)])
+        return Roll.from_document(document)
+
+    @staticmethod
+    def register(roll):
+        """Insert a roll_document(); returns its id, or None if that roll
+        number and import date are already registered."""
+        if not roll.get('rollNumber'):
+            return None
+        try:
+            return db.rolls.insert_one(roll).inserted_id
+        except DuplicateKeyError:
+            return None
+
+    @staticmethod
+    def consume(roll_number, product_id, sq_mtr, import_date=None, session=None):
+        """Take sq_mtr off the remainingSqMtr of a roll of product_id: the
+        latest delivery with that much left, unless import_date is given.
+        Returns the Roll after the write, or None if there is no such roll."""
+        query = {
+            'rollNumber': roll_number_of(roll_number),
+            'productId': str(product_id),
+            'remainingSqMtr': {'$gte': sq_mtr}
+        }
+        if import_date is not None:
+            query['importDate'] = roll_date(import_date)
+        document = movements_db.rolls.find_one_and_update(
+            query,
+            {'$inc': {'remainingSqMtr': -sq_mtr}, '$set': {'updatedAt': datetime.utcnow()}},
+            projection=Roll.projection(),
+            sort=[('importDate', DESCENDING)],
+            return_document=ReturnDocument.AFTER,
+            session=session
+        )
+        return Roll.from_document(document)
+
+    @staticmethod
+    def restore(roll_id, sq_mtr, session=None):
+        """Undo consume() when the stock-out it belonged to did not happen."""
+        movements_db.rolls.update_one({'_id': roll_id}, {'$inc': {'remainingSqMtr': sq_mtr}}, session=session)
@@ -0,0 +1,121 @@
+from flask import Blueprint, request, jsonify
+from ..models.stock_transaction import StockTransaction
+from ..repositories.products import ProductRepository
+
+dashboard_bp = Blueprint('dashboard', __name__)
+
+RECENT_MOVEMENTS = 10
+TOP_PRODUCTS = 3
+SQ_MTR_CATEGORIES = ['blankets', 'underpacking']
+
+# Cut-piece stock counts pieces; older records only mark it with numberOfPieces
+_STOCK_TYPE = {'$ifNull': [
+    '$dimensions.stockType',
+    {'$cond': [{'$ifNull': ['$dimensions.numberOfPieces', False]}, 'pieces', 'roll']}
+]}
+
+
+def dashboard_pipeline(recent=RECENT_MOVEMENTS):
+    return [{'$facet': {
+        'categories': [
+            {'$sort': {'_id': 1}},
+            {'$group': {
+                '_id': '$category',
+                'products': {'$sum': 1},
+                'stock': {'$sum': {'$ifNull': ['$stock', 0]}},
+                'lowStock': {'$sum': {'$cond': ['$belowThreshold', 1, 0]}},
+                'top': {'$firstN': {'n': TOP_PRODUCTS, 'input': {
+                    '_id': {'$toString': '$_id'}, 'name': '$name', 'stock': '$stock'
+                }}}
+            }},
+            {'$sort': {'_id': 1}},
+        ],
+        'byImported': [
+            {'$group': {
+                '_id': {'category': '$category', 'imported': {'$ifNull': ['$imported', False]}},
+                'products': {'$sum': 1},
+                'stock': {'$sum': {'$ifNull': ['$stock', 0]}}
+            }},
+            {'$sort': {'_id.category': 1, '_id.imported': 1}},
+        ],
+        # Roll stock is already in sq m; pieces are counted, so multiply by
+        # the per-piece area from the canonical dimensions.
+        'sqMtr': [
+            {'$match': {'category': {'$in': SQ_MTR_CATEGORIES}}},
+            {'$set': {'stockType': _STOCK_TYPE}},
+            {'$group': {
+                '_id': '$stockType',
+                'products': {'$sum': 1},
+                'sqMtr': {'$sum': {'$cond': [
+                    {'$eq': ['$stockType', 'pieces']},
+                    {'$multiply': [{'$ifNull': ['$stock', 0]}, {'$ifNull': ['$area_m2', 0]}]},
+                    {'$ifNull': ['$stock', 0]}
+                ]}}
+            }},
+        ],
+        'lowStock': [
+            {'$match': {'belowThreshold': True}},
+            {'$count': 'count'},
+        ],
+        'recentMovements': [
+            {'$limit': 1},
+            StockTransaction.recent_lookup(recent),
+            {'$unwind': '$movements'},
+            {'$replaceWith': '$movements'},
+            {'$lookup': {
+                'from': 'products',
+                'let': {'productId': {'$convert': {'input': '$product_id', 'to': 'objectId',
+                                                   'onError': None, 'onNull': None}}},
+                'pipeline': [{'$match': {'$expr': {'$eq': ['$_id', '$$productId']}}}, {'$project': {'name': 1}}],
+                'as': 'product'
+            }},
+            {'$set': {'productName': {'$first': '$product.name'}}},
+            {'$unset': 'product'},
+        ],
+    }}]
+
+
+@dashboard_bp.route('/dashboard', methods=['GET'])
+def get_dashboard():
+    """Every dashboard figure from a single aggregation over products."""
+    try:
+        recent = min(int(request.args.get('recent', RECENT_MOVEMENTS)), 100)
+    except ValueError:
+        return jsonify({'error': 'recent must be an integer'}), 400
+    if recent < 1:
+        return jsonify({'error': 'recent must be at least 1'}), 400
+
+    result = ProductRepository.aggregate_one(dashboard_pipeline(recent))
+    movements = result.get('recentMovements', [])
+    for movement in movements:
+        movement['_id'] = str(movement['_id'])
+        movement['product_id'] = str(movement.get('product_id'))
+        timestamp = movement.get('timestamp')
+        if hasattr(timestamp, 'isoformat'):
+            movement['timestamp'] = timestamp.isoformat()
+
+    low_stock = result.get('lowStock', [])
+    return jsonify({
+        'categories': [
+            {
+                'category': row['_id'],
+                'products': row['products'],
+                'stock': row['stock'],
+                'lowStock': row['lowStock'],
+                'top': row['top']
+            }
+            for row in result.get('categories', [])
+        ],
+        'byImported': [
+            {
+                'category': row['_id'].get('category'),
+                'imported': row['_id'].get('imported'),
+                'products': row['products'],
+                'stock': row['stock']
+            }
+            for row in result.get('byImported', [])
+        ],
+        'sqMtr': {row['_id']: {'products': row['products'], 'sqMtr': row['sqMtr']} for row in result.get('sqMtr', [])},
+        'lowStock': low_stock[0]['count'] if low_stock else 0,
+        'recentMovements': movements
+    }), 200
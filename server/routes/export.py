@@ -0,0 +1,55 @@
+from flask import Blueprint, Response, request, jsonify
+from datetime import datetime, timedelta
+from ..models.stock_transaction import StockTransaction
+from ..repositories.detailed_stock import DetailedStockRepository
+from ..utils import ledger_export
+
+export_bp = Blueprint('export', __name__)
+
+FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'csv', ledger_export.stream_csv),
+    'parquet': ('application/vnd.apache.parquet', 'parquet', ledger_export.stream_parquet),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrows', ledger_export.stream_arrow),
+}
+
+
+@export_bp.route('/export/ledger', methods=['GET'])
+def export_ledger():
+    """Stream stock_transactions or detailed_stock, e.g.
+    /api/export/ledger?collection=stock_transactions&format=parquet&from=2025-01-01&to=2025-12-31"""
+    ledger = request.args.get('collection', 'stock_transactions')
+    if ledger not in ledger_export.LEDGERS:
+        return jsonify({'error': f"collection must be one of: {', '.join(ledger_export.LEDGERS)}"}), 400
+
+    export_format = request.args.get('format', 'csv')
+    if export_format not in FORMATS:
+        return jsonify({'error': f"format must be one of: {', '.join(FORMATS)}"}), 400
+
+    try:
+        start = datetime.strptime(request.args['from'], '%Y-%m-%d') if request.args.get('from') else None
+        # 'to' is inclusive of the whole day
+        end = datetime.strptime(request.args['to'], '%Y-%m-%d') + timedelta(days=1) if request.args.get('to') else None
+    except ValueError:
+        return jsonify({'error': 'from/to must be dates in YYYY-MM-DD format'}), 400
+
+    product_ids = [p.strip() for p in ','.join(request.args.getlist('productId')).split(',') if p.strip()]
+
+    if export_format != 'csv':
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            return jsonify({'error': f'{export_format} export requires the pyarrow package'}), 501
+
+    mimetype, extension, stream = FORMATS[export_format]
+    if ledger == 'stock_transactions':
+        # Hides whether the ledger is stored per movement or in monthly buckets
+        documents = StockTransaction.find(start, end, product_ids)
+    else:
+        query = ledger_export.build_query(ledger, start, end, product_ids)
+        documents = DetailedStockRepository.export_documents(query)
+    filename = f"{ledger}_{datetime.utcnow().strftime('%Y%m%d')}.{extension}"
+    return Response(
+        stream(documents, ledger),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
@@ -0,0 +1,28 @@
+from flask import Blueprint, Response, request
+from ..utils import metrics
+
+metrics_bp = Blueprint('metrics', __name__)
+
+
+@metrics_bp.before_app_request
+def start_request_metrics():
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    metrics.start_request(request.method, endpoint)
+
+
+@metrics_bp.after_app_request
+def finish_request_metrics(response):
+    result = metrics.finish_request(response.status_code)
+    if result is not None:
+        stats, elapsed = result
+        response.headers.add(
+            'Server-Timing',
+            f'db;dur={stats.db_seconds * 1000:.1f};desc="{stats.round_trips} MongoDB round trips", '
+            f'app;dur={elapsed * 1000:.1f}'
+        )
+    return response
+
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
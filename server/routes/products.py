@@ -1,14 +1,45 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify
+from bson import ObjectId
+from datetime import datetime, timedelta
 from ..models.product import Product
+from ..repositories.products import ProductRepository, SUMMARY_SORTS
+from ..db.changes import current_change_seq
+from ..utils.idempotency import idempotent
+from ..utils.product_export import stream_workbook
 
 products_bp = Blueprint('products', __name__)
 
 @products_bp.route('/products', methods=['GET'])
 def get_products():
-    products = Product.get_all()
-    return jsonify(products)
+    """Full product documents, or with ?view=summary just the hot fields,
+    filtered and sorted server-side:
+    /api/products?view=summary&category=blankets&imported=true&sort=-stock&limit=50"""
+    if request.args.get('view') != 'summary':
+        return jsonify(ProductRepository.catalogue())
+
+    imported = request.args.get('imported')
+    if imported not in (None, 'true', 'false'):
+        return jsonify({'error': 'imported must be true or false'}), 400
+    sort = request.args.get('sort', 'name')
+    if sort not in SUMMARY_SORTS:
+        return jsonify({'error': f"sort must be one of: {', '.join(SUMMARY_SORTS)}"}), 400
+    try:
+        limit = int(request.args['limit']) if request.args.get('limit') else None
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    if limit is not None and limit < 1:
+        return jsonify({'error': 'limit must be positive'}), 400
+
+    summaries = ProductRepository.summaries(
+        category=request.args.get('category') or None,
+        imported=None if imported is None else imported == 'true',
+        sort=sort,
+        limit=limit
+    )
+    return jsonify(summaries)
 
 @products_bp.route('/products', methods=['POST'])
+@idempotent()
 def add_product():
     data = request.get_json()
     name = data.get('name')
@@ -20,3 +51,115 @@ def add_product():
     product = Product(name=name, category=category)
     product.save()
     return jsonify({'message': 'Product added successfully'}), 201
+
+@products_bp.route('/products/<product_id>', methods=['DELETE'])
+def delete_product(product_id):
+    if not ObjectId.is_valid(product_id):
+        return jsonify({'error': 'Invalid product id'}), 400
+    if not Product.delete(product_id):
+        return jsonify({'error': 'Product not found'}), 404
+    return jsonify({'message': 'Product deleted successfully'}), 200
+
+# Writes take a sequence number before they land, so a change can become
+# visible slightly after a later one. The token never moves past changes
+# younger than this, which are simply sent again on the next sync.
+CHANGE_SETTLE_SECONDS = 5
+
+
+def _parse_token(token):
+    """(changeSeq, last id or None) from a sync token. Bulk writes stamp
+    one changeSeq on many products, so delta tokens also carry the _id of
+    the last product (or tombstone) sent: 'seq:id' means everything up to
+    that entry in (changeSeq, _id) order, a bare 'seq' everything up to
+    and including seq."""
+    seq, _, last_id = token.partition(':')
+    if last_id and not ObjectId.is_valid(last_id):
+        raise ValueError(token)
+    return int(seq), (last_id or None)
+
+
+@products_bp.route('/products/changes', methods=['GET'])
+def get_product_changes():
+    """Delta sync: ?since=<token> returns products changed (and ids deleted)
+    after the token plus a new token. Without a token, returns the full catalogue."""
+    since = request.args.get('since')
+    try:
+        limit = min(int(request.args.get('limit', 1000)), 5000)
+        since, since_id = _parse_token(since) if since else (None, None)
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer and since a token from an earlier sync'}), 400
+
+    try:
+        settled_before = datetime.utcnow() - timedelta(seconds=CHANGE_SETTLE_SECONDS)
+
+        if since is None:
+            ceiling = current_change_seq()
+            token = 0
+            products = []
+            for product in ProductRepository.all_for_sync():
+                seq = product.get('changeSeq')
+                last_updated = product.get('lastUpdated')
+                if seq is not None and seq <= ceiling and last_updated is not None and last_updated <= settled_before:
+                    token = max(token, seq)
+                products.append(Product.serialize(product))
+            return jsonify({
+                'full': True,
+                'changed': products,
+                'deleted': [],
+                'token': str(token),
+                'hasMore': False
+            }), 200
+
+        changed = ProductRepository.changed_since(since, since_id, limit + 1)
+        deleted = ProductRepository.deleted_since(since, since_id, limit + 1)
+        merged = sorted(
+            [((p['changeSeq'], str(p['_id'])), 'changed', p) for p in changed]
+            + [((t['changeSeq'], t['_id']), 'deleted', t) for t in deleted],
+            key=lambda entry: entry[0]
+        )
+        has_more = len(merged) > limit
+        merged = merged[:limit]
+
+        token = str(since) if since_id is None else f'{since}:{since_id}'
+        settled = True
+        response_changed, response_deleted = [], []
+        for (seq, document_id), kind, document in merged:
+            stamp = document.get('lastUpdated') if kind == 'changed' else document.get('deletedAt')
+            if settled and stamp is not None and stamp <= settled_before:
+                token = f'{seq}:{document_id}'
+            else:
+                settled = False
+            if kind == 'changed':
+                response_changed.append(Product.serialize(document))
+            else:
+                response_deleted.append(document['_id'])
+
+        return jsonify({
+            'full': False,
+            'changed': response_changed,
+            'deleted': response_deleted,
+            'token': token,
+            'hasMore': has_more
+        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@products_bp.route('/products/export.xlsx', methods=['GET'])
+def export_products():
+    query = {}
+    category = request.args.get('category')
+    if category:
+        query['category'] = category
+    imported = request.args.get('imported')
+    if imported == 'true':
+        query['imported'] = True
+    elif imported == 'false':
+        query['imported'] = {'$ne': True}
+
+    scope = category.replace(' ', '_').lower() if category else 'all'
+    filename = f"products_{scope}_{datetime.utcnow().strftime('%Y%m%d')}.xlsx"
+    return Response(
+        stream_workbook(ProductRepository.export_source(), query),
+        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
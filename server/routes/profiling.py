@@ -0,0 +1,71 @@
+import cProfile
+import time
+from flask import Blueprint, g, jsonify, request, send_file
+from ..utils import profiling
+
+profiling_bp = Blueprint('profiling', __name__)
+
+
+def _authorized():
+    return bool(profiling.PROFILE_TOKEN) and request.headers.get('X-Profile-Token') == profiling.PROFILE_TOKEN
+
+
+@profiling_bp.before_app_request
+def start_profiling():
+    if not profiling.enabled():
+        return
+    g.profile_started = time.perf_counter()
+    if profiling.PROFILE_TOKEN and request.headers.get('X-Profile') and _authorized():
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+    elif profiling.sampler is not None:
+        profiling.sampler.begin()
+        g.profile_sampling = True
+
+
+@profiling_bp.after_app_request
+def finish_profiling(response):
+    if 'profile_started' not in g:
+        return response
+    elapsed_ms = (time.perf_counter() - g.profile_started) * 1000
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.disable()
+        name = profiling.save_cprofile(profiler, request.method, endpoint, elapsed_ms)
+        response.headers['X-Profile-Capture'] = name
+    elif g.pop('profile_sampling', False):
+        samples = profiling.sampler.end()
+        if samples and elapsed_ms >= profiling.SLOW_MS:
+            name = profiling.save_folded(samples, request.method, endpoint, elapsed_ms)
+            response.headers['X-Profile-Capture'] = name
+    return response
+
+
+@profiling_bp.teardown_app_request
+def discard_profiling(exc):
+    # An unhandled error skips after_request; make sure the sampler lets go of this thread.
+    if g.pop('profile_sampling', False):
+        profiling.sampler.end()
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.disable()
+
+
+@profiling_bp.route('/admin/profiles', methods=['GET'])
+def list_profiles():
+    if not _authorized():
+        return jsonify({'error': 'Forbidden'}), 403
+    return jsonify({'slowThresholdMs': profiling.SLOW_MS, 'captures': profiling.list_captures()}), 200
+
+
+@profiling_bp.route('/admin/profiles/<name>', methods=['GET'])
+def get_profile(name):
+    if not _authorized():
+        return jsonify({'error': 'Forbidden'}), 403
+    path = profiling.capture_file(name)
+    if not path:
+        return jsonify({'error': 'Capture not found'}), 404
+    mimetype = 'text/plain' if name.endswith('.folded') else 'application/octet-stream'
+    return send_file(path, as_attachment=True, download_name=name, mimetype=mimetype)
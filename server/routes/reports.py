@@ -1,17 +1,32 @@
-from flask import Blueprint, jsonify
-from ..models.product import Product
+from flask import Blueprint, request, jsonify
+from datetime import datetime
+from ..repositories.products import ProductRepository
+from ..utils.ageing import ageing_report, materialized_report
 
 reports_bp = Blueprint('reports', __name__)
 
 @reports_bp.route('/reports', methods=['GET'])
 def get_report():
-    products = Product.get_all()
-    report = []
-    for product in products:
-        report.append({
-            'name': product['name'],
-            'category': product['category'],
-            'stock': product.get('stock', 0),
-            'lastUpdated': product.get('lastUpdated', 'N/A')
-        })
+    report = [
+        {'name': name, 'category': category, 'stock': stock,
+         'lastUpdated': last_updated.isoformat() if hasattr(last_updated, 'isoformat') else (last_updated or 'N/A')}
+        for name, category, stock, last_updated in ProductRepository.report_rows()
+    ]
     return jsonify(report)
+
+@reports_bp.route('/reports/ageing', methods=['GET'])
+def get_ageing_report():
+    """Lots by category and age band, e.g.
+    /api/reports/ageing?productType=blankets,underpacking&asOf=2025-06-30"""
+    product_types = [t.strip() for t in request.args.get('productType', '').split(',') if t.strip()]
+    try:
+        as_of = datetime.strptime(request.args['asOf'], '%Y-%m-%d') if request.args.get('asOf') else None
+    except ValueError:
+        return jsonify({'error': 'asOf must be a date in YYYY-MM-DD format'}), 400
+
+    # The nightly copy answers the unfiltered report unless ?fresh=1
+    if not product_types and not as_of and request.args.get('fresh') != '1':
+        stored = materialized_report()
+        if stored:
+            return jsonify(stored), 200
+    return jsonify(ageing_report(as_of, product_types or None)), 200
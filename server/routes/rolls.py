@@ -0,0 +1,17 @@
+from flask import Blueprint, request, jsonify
+from ..repositories.rolls import RollRepository, roll_date, serialize_roll
+
+rolls_bp = Blueprint('rolls', __name__)
+
+@rolls_bp.route('/rolls/<path:roll_number>', methods=['GET'])
+def get_roll(roll_number):
+    """Barcode lookup: /api/rolls/BL123456 returns the latest delivery of
+    that roll number, ?importDate=YYYY-MM-DD a specific one."""
+    import_date = request.args.get('importDate')
+    if import_date and roll_date(import_date) is None:
+        return jsonify({'error': 'importDate must be a date in YYYY-MM-DD format'}), 400
+
+    roll = RollRepository.by_number(roll_number, import_date or None)
+    if not roll:
+        return jsonify({'error': 'Roll not found'}), 404
+    return jsonify(serialize_roll(roll)), 200
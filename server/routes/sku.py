@@ -1,9 +1,12 @@
 from flask import Blueprint, request, jsonify, send_file
 from ..models.product import Product
-from ..db.database import db
+from ..repositories.companies import CompanyRepository
+from ..repositories.products import ProductRepository
+from ..utils.classification_cache import ClassificationCache, cache_key, rules_version
 import io
+import math
 import re
-import pandas as pd
+from datetime import datetime
 
 sku_bp = Blueprint('sku', __name__)
 
@@ -88,7 +91,7 @@ _BRAND_ALIASES = {
 
 
 def _clean_text(value):
-    if value is None or (isinstance(value, float) and pd.isna(value)):
+    if value is None or (isinstance(value, float) and math.isnan(value)):
         return ''
     return re.sub(r'\s+', ' ', str(value)).strip()
 
@@ -284,6 +287,67 @@ def _match_category(name, description, product_format):
 
     return '', ''
 
+
+def _classify_row(name, description, product_format):
+    """Return (product_name, brand, size, type, category) for one analyze-excel row."""
+    size_value = _extract_size(name, description, product_format)
+    extracted_brand = _extract_brand(name, description)
+    brand_value = _normalize_brand(extracted_brand, name, description, product_format)
+    product_name_value = _extract_product_name(name, brand_value)
+
+    category_value, fallback_type = _match_category(name, description, product_format)
+    type_value, category_override = _match_type_and_category_override(
+        brand_value,
+        name,
+        description,
+        product_format,
+        fallback_type,
+        category_value,
+    )
+    if not type_value:
+        type_value = fallback_type
+    if category_override:
+        category_value = category_override
+
+    return product_name_value, brand_value, size_value, type_value, category_value
+
+# Bump when the extractor code changes in a way the tables below do not show
+CLASSIFIER_REVISION = 1
+RULES_VERSION = rules_version(
+    CLASSIFIER_REVISION,
+    CATEGORY_RULES,
+    _BRAND_ALIASES,
+    BRAND_STOPWORDS,
+    _ALLOWED_BRANDS,
+    SIZE_PATTERN.pattern,
+    UNIT_PATTERN.pattern,
+)
+_classification_cache = ClassificationCache()
+
+
+def _classify_rows(rows):
+    """_classify_row over (name, description, product_format) triples, reusing
+    cached results for rows already seen under the current RULES_VERSION.
+    Returns (results, cache_hits)."""
+    # Every extractor cleans its inputs first, so the cleaned triple fully
+    # determines the result
+    cleaned = [tuple(_clean_text(value) for value in row) for row in rows]
+    keys = [cache_key(RULES_VERSION, *row) for row in cleaned]
+    cached = _classification_cache.get_many(keys)
+
+    computed = {}
+    results = []
+    for key, row in zip(keys, cleaned):
+        if key in cached:
+            results.append(tuple(cached[key]))
+            continue
+        if key not in computed:
+            computed[key] = _classify_row(*row)
+        results.append(computed[key])
+    _classification_cache.put_many(computed)
+    return results, len(rows) - sum(1 for key in keys if key not in cached)
+
+
 @sku_bp.route('/sku/generate', methods=['POST'])
 def generate_sku():
     data = request.get_json()
@@ -339,16 +403,14 @@ def generate_sku():
             'specifications': data['specifications'],
             'stock': 0,
             'imported': True,
-            'createdAt': None,
-            'lastUpdated': None
+            'createdAt': datetime.utcnow()
         }
-        
-        result = db.products.insert_one(product_data)
+        product_id = ProductRepository.insert(product_data)
         
         return jsonify({
             'message': 'SKU generated successfully',
             'sku': sku,
-            'productId': str(result.inserted_id)
+            'productId': str(product_id)
         }), 201
         
     except Exception as e:
@@ -357,7 +419,7 @@ def generate_sku():
 @sku_bp.route('/sku/companies', methods=['GET'])
 def get_companies():
     try:
-        companies = list(db.companies.find({}, {'_id': 0}))
+        companies = CompanyRepository.list_all()
         return jsonify(companies), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -371,12 +433,12 @@ def check_duplicate():
         return jsonify({'error': 'Product name is required'}), 400
     
     try:
-        existing_product = db.products.find_one({'name': product_name})
+        existing_product = ProductRepository.sku_by_name(product_name)
         if existing_product:
             return jsonify({
                 'exists': True,
-                'sku': existing_product.get('sku', 'N/A'),
-                'productId': str(existing_product['_id'])
+                'sku': existing_product.sku or 'N/A',
+                'productId': str(existing_product.id)
             }), 200
         else:
             return jsonify({'exists': False}), 200
@@ -386,6 +448,9 @@ def check_duplicate():
 
 @sku_bp.route('/sku/analyze-excel', methods=['POST'])
 def analyze_excel():
+    # pandas/openpyxl are only needed here, so keep them out of worker start-up
+    import pandas as pd
+
     try:
         if 'excel-file' not in request.files:
             return jsonify({'error': 'No file provided'}), 400
@@ -439,30 +504,17 @@ def analyze_excel():
         categories = []
         categorized_rows = 0
 
-        for _, row in df.iterrows():
-            name = row.get(resolved_columns['name'], '')
-            description = row.get(resolved_columns['description'], '')
-            product_format = row.get(resolved_columns['product_format'], '')
-
-            size_value = _extract_size(name, description, product_format)
-            extracted_brand = _extract_brand(name, description)
-            brand_value = _normalize_brand(extracted_brand, name, description, product_format)
-            product_name_value = _extract_product_name(name, brand_value)
-
-            category_value, fallback_type = _match_category(name, description, product_format)
-            type_value, category_override = _match_type_and_category_override(
-                brand_value,
-                name,
-                description,
-                product_format,
-                fallback_type,
-                category_value,
+        rows = [
+            (
+                row.get(resolved_columns['name'], ''),
+                row.get(resolved_columns['description'], ''),
+                row.get(resolved_columns['product_format'], ''),
             )
-            if not type_value:
-                type_value = fallback_type
-            if category_override:
-                category_value = category_override
+            for _, row in df.iterrows()
+        ]
+        classified, cache_hits = _classify_rows(rows)
 
+        for product_name_value, brand_value, size_value, type_value, category_value in classified:
             if category_value:
                 categorized_rows += 1
 
@@ -495,6 +547,7 @@ def analyze_excel():
         )
         response.headers['X-Processed-Rows'] = str(len(result_df.index))
         response.headers['X-Categorized-Rows'] = str(categorized_rows)
+        response.headers['X-Classification-Cache-Hits'] = str(cache_hits)
         return response
 
     except Exception as e:
@@ -1,67 +1,252 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 from ..models.product import Product
 from ..models.stock_transaction import StockTransaction
+from ..db import thresholds
+from ..utils.dimensions import canonical_dimensions, to_number
+from ..utils import excel_import
+from ..utils.events import publish_stock_change
+from ..utils.idempotency import HEADER as IDEMPOTENCY_HEADER, IdempotencyError, fingerprint, idempotent, respond, run_once_atomic
+from ..repositories.detailed_stock import DetailedStockRepository
+from ..repositories.imports import ImportRepository
+from ..repositories.products import ProductRepository
+from ..repositories.records import Roll
+from ..repositories.rolls import RollRepository, roll_document, roll_number_of
+from bson import ObjectId
 from datetime import datetime
-import pandas as pd
 import io
+import json
 
 stock_bp = Blueprint('stock', __name__)
 
+CONFLICT_PAGE_SIZE = 100
+
 @stock_bp.route('/stock', methods=['GET'])
 def get_stock():
-    products = Product.get_all()
-    total_stock = sum(p.get('stock', 0) for p in products)
-    low_stock = len([p for p in products if p.get('stock', 0) < 10])  # Assuming low stock threshold
+    total_stock, low_stock = ProductRepository.stock_totals()
     return jsonify({'total': total_stock, 'lowStock': low_stock})
 
-@stock_bp.route('/stock/in', methods=['POST'])
-def add_stock():
-    data = request.get_json()
-    product_id = data.get('productId')
-    quantity = data.get('quantity')
+@stock_bp.route('/stock/alerts', methods=['GET'])
+def get_stock_alerts():
+    """Products below their reorder threshold, e.g. /api/stock/alerts?category=blankets"""
+    alerts = ProductRepository.alerts(request.args.get('category'))
+    return jsonify({'count': len(alerts), 'alerts': alerts}), 200
+
+@stock_bp.route('/stock/thresholds', methods=['GET'])
+def get_thresholds():
+    return jsonify(thresholds.list_thresholds()), 200
+
+@stock_bp.route('/stock/thresholds', methods=['PUT'])
+def set_threshold():
+    """Body: {"productId": ..., "threshold": 5} for one product, or
+    {"category": "blankets", "stockType": "pieces", "threshold": 3} for a
+    category default. A null threshold removes the override."""
+    data = request.get_json() or {}
+    if 'threshold' not in data:
+        return jsonify({'error': 'threshold is required'}), 400
+    threshold = data['threshold']
+    if threshold is not None:
+        threshold = to_number(threshold)
+        if threshold is None or threshold < 0:
+            return jsonify({'error': 'threshold must be a non-negative number'}), 400
+
+    if data.get('productId'):
+        try:
+            product_id = ObjectId(data['productId'])
+        except Exception:
+            return jsonify({'error': 'Invalid product ID'}), 400
+        if not thresholds.set_product_threshold(product_id, threshold):
+            return jsonify({'error': 'Product not found'}), 404
+        return jsonify({'message': 'Threshold updated', 'updated': 1}), 200
+
+    if data.get('category'):
+        updated = thresholds.set_category_threshold(data['category'], threshold, data.get('stockType'))
+        return jsonify({'message': 'Threshold updated', 'updated': updated}), 200
+
+    return jsonify({'error': 'productId or category is required'}), 400
+
+@stock_bp.route('/stock/search', methods=['GET'])
+def search_stock():
+    """Range search over canonical dimensions, e.g.
+    /api/stock/search?category=blankets&thicknessMin=1.95&thicknessMax=1.97&widthMin=1050"""
+    categories = [c.strip() for c in request.args.get('category', 'blankets,underpacking').split(',') if c.strip()]
+    stock_types = [t.strip() for t in request.args.get('stockType', 'roll,pieces').split(',') if t.strip()]
+
+    # Every predicate is an equality, $in or range on an indexed field, so the
+    # whole query resolves to index bounds on DIMENSION_SEARCH_INDEX.
+    query = {
+        'category': {'$in': categories},
+        'dimensions.stockType': {'$in': stock_types}
+    }
+    for param, field in [('thickness', 'thickness_mm'), ('width', 'width_mm'), ('length', 'length_mm')]:
+        bounds = {}
+        for suffix, operator in [('Min', '$gte'), ('Max', '$lte')]:
+            raw = request.args.get(f'{param}{suffix}')
+            if raw in [None, '']:
+                continue
+            value = to_number(raw)
+            if value is None:
+                return jsonify({'error': f'{param}{suffix} must be a number'}), 400
+            bounds[operator] = value
+        if bounds:
+            query[field] = bounds
 
-    if not product_id or not quantity:
-        return jsonify({'error': 'Product ID and quantity are required'}), 400
+    try:
+        limit = min(int(request.args.get('limit', 500)), 5000)
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+
+    try:
+        results = ProductRepository.search(query, limit)
+        return jsonify({'count': len(results), 'results': results}), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Fields a stock movement's idempotency key is bound to (/stock/in,
+# /stock/out and their /sync/batch replays); rollNumber and importDate
+# name the roll a stock-out is cut from
+MOVEMENT_FIELDS = ('productId', 'quantity', 'rollNumber', 'importDate')
 
-    product = Product.get_by_id(product_id)
-    if not product:
-        return jsonify({'error': 'Product not found'}), 404
 
-    new_stock = product['stock'] + quantity
-    Product.update_stock(product_id, new_stock)
+def _movement_error(product_id, quantity):
+    if not product_id or not quantity:
+        return {'error': 'Product ID and quantity are required'}, 400
+    if not ObjectId.is_valid(product_id):
+        return {'error': 'Invalid product id'}, 400
+    if isinstance(quantity, bool) or not isinstance(quantity, (int, float)) or quantity <= 0:
+        return {'error': 'Quantity must be a positive number'}, 400
+    return None
+
+
+def _published(product_id, change, after_commit):
+    if after_commit is None:
+        publish_stock_change(product_id, *change)
+    else:
+        after_commit.append(lambda: publish_stock_change(product_id, *change))
+
+
+def stock_in(data, session=None, after_commit=None):
+    """(body, status) for one stock-in movement. The stock is added in
+    place and the ledger entry written through session, when the movement
+    runs in a transaction (run_once_atomic); the change is then published
+    by after_commit, otherwise straight away."""
+    product_id = data.get('productId')
+    quantity = data.get('quantity')
+    error = _movement_error(product_id, quantity)
+    if error:
+        return error
+
+    change = Product.adjust_stock(product_id, quantity, session)
+    if change is None:
+        return {'error': 'Product not found'}, 404
 
     # Record transaction
-    transaction = StockTransaction(product_id, quantity, 'in')
-    transaction.save()
+    StockTransaction(product_id, quantity, 'in').save(session)
+    _published(product_id, change, after_commit)
 
-    return jsonify({'message': 'Stock added successfully'}), 200
+    return {'message': 'Stock added successfully'}, 200
 
-@stock_bp.route('/stock/out', methods=['POST'])
-def issue_stock():
-    data = request.get_json()
+
+def stock_out(data, session=None, after_commit=None):
+    """(body, status) for one stock-out movement; see stock_in. With a
+    rollNumber (and optionally importDate) the quantity, in sq.mtr, is
+    also taken off that roll's remainingSqMtr in the roll registry."""
     product_id = data.get('productId')
     quantity = data.get('quantity')
+    error = _movement_error(product_id, quantity)
+    if error:
+        return error
+
+    roll = None
+    roll_number = roll_number_of(data.get('rollNumber'))
+    if roll_number:
+        roll = RollRepository.consume(roll_number, product_id, quantity, data.get('importDate'), session)
+        if roll is None:
+            return {'error': 'No roll with this number has that much left for this product'}, 400
+
+    change = Product.adjust_stock(product_id, -quantity, session)
+    if change is None:
+        if roll is not None:
+            RollRepository.restore(roll.id, quantity, session)
+        # Either no such product or not enough stock left
+        if not ProductRepository.stock_of(product_id):
+            return {'error': 'Product not found'}, 404
+        return {'error': 'Insufficient stock'}, 400
 
-    if not product_id or not quantity:
-        return jsonify({'error': 'Product ID and quantity are required'}), 400
+    # Record transaction
+    StockTransaction(product_id, quantity, 'out').save(session)
+    _published(product_id, change, after_commit)
 
-    product = Product.get_by_id(product_id)
-    if not product:
-        return jsonify({'error': 'Product not found'}), 404
+    return {'message': 'Stock issued successfully'}, 200
 
-    if product['stock'] < quantity:
-        return jsonify({'error': 'Insufficient stock'}), 400
 
-    new_stock = product['stock'] - quantity
-    Product.update_stock(product_id, new_stock)
+def run_movement(movement, data, key=None, scope=None):
+    """(body, status, replayed) for a movement; with an idempotency key it
+    runs once per key, in a transaction with the key's completion."""
+    if key is None:
+        body, status = movement(data)
+        return body, status, False
+    return run_once_atomic(
+        scope, key, fingerprint(data, MOVEMENT_FIELDS),
+        lambda session, after_commit: movement(data, session, after_commit)
+    )
+
+
+def _movement_response(movement):
+    try:
+        body, status, replayed = run_movement(
+            movement, request.get_json(), request.headers.get(IDEMPOTENCY_HEADER), request.path
+        )
+    except IdempotencyError as e:
+        return jsonify({'error': str(e)}), e.status
+    return respond(body, status, replayed)
 
-    # Record transaction
-    transaction = StockTransaction(product_id, quantity, 'out')
-    transaction.save()
 
-    return jsonify({'message': 'Stock issued successfully'}), 200
+@stock_bp.route('/stock/in', methods=['POST'])
+def add_stock():
+    return _movement_response(stock_in)
+
+@stock_bp.route('/stock/out', methods=['POST'])
+def issue_stock():
+    return _movement_response(stock_out)
+
+def _roll_product_query(roll_data, product_type):
+    return {
+        'name': roll_data['productName'],
+        'category': product_type,
+        'dimensions.stockType': 'roll',
+        'dimensions.length': roll_data.get('length'),
+        'dimensions.width': roll_data.get('width')
+    }
+
+def _duplicate_roll(data, existing):
+    """409 asking the client to confirm; existing is a Roll or, for
+    unnumbered rolls, the ProductMatch of the same size."""
+    if isinstance(existing, Roll):
+        details = {
+            'name': existing.product_name,
+            'rollNumber': existing.roll_number,
+            'length': existing.length,
+            'width': existing.width,
+            'importDate': existing.import_date.strftime('%Y-%m-%d') if existing.import_date else None
+        }
+    else:
+        dimensions = existing.dimensions or {}
+        details = {
+            'name': existing.name,
+            'rollNumber': dimensions.get('rollNumber'),
+            'length': dimensions.get('length'),
+            'width': dimensions.get('width'),
+            'importDate': dimensions.get('importDate')
+        }
+    return jsonify({
+        'error': 'DUPLICATE_ROLL',
+        'message': f'Roll "{data.get("rollNumber") or "Unknown"}" for "{data["productName"]}" already exists.',
+        'existingProduct': {key: 'N/A' if value in (None, '') else value for key, value in details.items()},
+        'requiresConfirmation': True
+    }), 409
 
 @stock_bp.route('/stock/in/detailed', methods=['POST'])
+@idempotent()
 def add_stock_detailed():
     data = request.get_json()
 
@@ -115,8 +300,6 @@ def add_stock_detailed():
             return jsonify({'error': 'Number of pieces is required for cut pieces stock'}), 400
 
     try:
-        from db.database import db
-
         blanket_types = ['blankets', 'underpacking']
 
         def sanitize(payload):
@@ -194,6 +377,8 @@ def add_stock_detailed():
                 'stockType': stock_type,
                 'importDate': datetime.strptime(data['importDate'], '%Y-%m-%d') if data.get('importDate') else None,
                 'takenDate': datetime.strptime(data['takenDate'], '%Y-%m-%d') if data.get('takenDate') else None,
+                # A ledger 'in' for the same quantity is written with it
+                'ledgered': True,
                 'createdAt': datetime.utcnow()
             }
 
@@ -265,27 +450,18 @@ def add_stock_detailed():
             else:
                 quantity = float(data.get('stock', 0))
 
+            stock_data.update(canonical_dimensions(stock_data))
             return stock_data, quantity
 
         # Identify existing product
         if product_type in blanket_types:
             if stock_type == 'roll':
-                existing_product = db.products.find_one({
-                    'name': data['productName'],
-                    'category': product_type,
-                    'dimensions.stockType': 'roll',
-                    '$or': [
-                        {'dimensions.rollNumber': data.get('rollNumber')},
-                        {'$and': [
-                            {'dimensions.length': data.get('length')},
-                            {'dimensions.width': data.get('width')}
-                        ]}
-                    ]
-                })
+                # Rolls of one size share a product; the rolls themselves are in db.rolls
+                existing_product = ProductRepository.find_match(_roll_product_query(data, product_type))
             elif stock_type == 'pieces':
                 if product_type == 'matrix':
                     # For matrix products, check name, category, size dimensions, and thickness
-                    existing_product = db.products.find_one({
+                    existing_product = ProductRepository.find_match({
                         'name': data['productName'],
                         'category': product_type,
                         'dimensions.matrixSizeWidth': data.get('matrixSizeWidth'),
@@ -310,23 +486,23 @@ def add_stock_detailed():
                     add_dimension_constraint('widthUnit', data.get('widthUnit', 'mm'))
                     add_dimension_constraint('thickness', data.get('thickness'))
                     add_dimension_constraint('thicknessUnit', data.get('thicknessUnit', 'mm'))
-                    existing_product = db.products.find_one(piece_query)
+                    existing_product = ProductRepository.find_match(piece_query)
                 else:
                     # For other pieces products (litho perf, rules)
-                    existing_product = db.products.find_one({
+                    existing_product = ProductRepository.find_match({
                         'name': data['productName'],
                         'category': product_type,
                         'dimensions.stockType': 'pieces'
                     })
             else:
-                existing_product = db.products.find_one({
+                existing_product = ProductRepository.find_match({
                     'name': data['productName'],
                     'category': product_type
                 })
         else:
             if product_type == 'matrix':
                 # For matrix products without stock type, check name, category, size dimensions, and thickness
-                existing_product = db.products.find_one({
+                existing_product = ProductRepository.find_match({
                     'name': data['productName'],
                     'category': product_type,
                     'dimensions.matrixSizeWidth': data.get('matrixSizeWidth'),
@@ -336,7 +512,7 @@ def add_stock_detailed():
                 })
             elif product_type == 'rules':
                 # For rules, differentiate by container size, type, format, and packing
-                existing_product = db.products.find_one({
+                existing_product = ProductRepository.find_match({
                     'name': data['productName'],
                     'category': product_type,
                     'dimensions.ruleFormat': data.get('ruleFormat'),
@@ -347,36 +523,45 @@ def add_stock_detailed():
                 })
             elif product_type == 'chemicals':
                 # For chemicals products, check name, category, and product format
-                existing_product = db.products.find_one({
+                existing_product = ProductRepository.find_match({
                     'name': data['productName'],
                     'category': product_type,
                     'dimensions.productFormat': data.get('productFormat')
                 })
             else:
-                existing_product = db.products.find_one({
+                existing_product = ProductRepository.find_match({
                     'name': data['productName'],
                     'category': product_type
                 })
 
-        # Duplicate roll detection only for blanket/underpacking rolls
-        if existing_product and product_type in blanket_types and stock_type == 'roll':
-            return jsonify({
-                'error': 'DUPLICATE_ROLL',
-                'message': f'Roll "{data.get("rollNumber", "Unknown")}" for "{data["productName"]}" already exists with same dimensions.',
-                'existingProduct': {
-                    'name': existing_product['name'],
-                    'rollNumber': existing_product.get('dimensions', {}).get('rollNumber', 'N/A'),
-                    'length': existing_product.get('dimensions', {}).get('length', 'N/A'),
-                    'width': existing_product.get('dimensions', {}).get('width', 'N/A'),
-                    'importDate': existing_product.get('dimensions', {}).get('importDate', 'N/A')
-                },
-                'requiresConfirmation': True
-            }), 409
+        # Duplicate roll detection only for blanket/underpacking rolls: a
+        # registered roll number, or for unnumbered rolls the same size
+        is_roll = product_type in blanket_types and stock_type == 'roll'
+        roll_number = roll_number_of(data.get('rollNumber')) if is_roll else None
+        if roll_number:
+            duplicate = RollRepository.by_number(roll_number)
+            if duplicate:
+                return _duplicate_roll(data, duplicate)
+        elif is_roll and existing_product:
+            return _duplicate_roll(data, existing_product)
 
         new_dimensions = build_dimensions_payload()
+        # A new product's id is taken up front so its roll can be
+        # registered before anything else is written
+        product_id = str(existing_product.id if existing_product else ObjectId())
+
+        if roll_number:
+            registered = RollRepository.register(roll_document(
+                product_id, product_type, data['productName'], roll_number, new_dimensions,
+                import_date=data.get('importDate'), taken_date=data.get('takenDate'), sq_mtr=to_number(data.get('sqMtr'))
+            ))
+            if not registered:
+                # Registered by a concurrent request since the check above
+                return _duplicate_roll(data, RollRepository.by_number(roll_number))
 
         if not existing_product:
             product_data = {
+                '_id': ObjectId(product_id),
                 'name': data['productName'],
                 'category': product_type,
                 'stock': 0,
@@ -384,36 +569,39 @@ def add_stock_detailed():
                 'dimensions': new_dimensions,
                 'createdAt': datetime.utcnow()
             }
-            product_result = db.products.insert_one(product_data)
-            product_id = str(product_result.inserted_id)
-        else:
-            product_id = str(existing_product['_id'])
-            if new_dimensions:
-                merged_dimensions = existing_product.get('dimensions', {}).copy()
-                merged_dimensions.update(new_dimensions)
-                Product.update_dimensions(product_id, merged_dimensions)
+            ProductRepository.insert(product_data)
+        elif new_dimensions:
+            merged_dimensions = (existing_product.dimensions or {}).copy()
+            merged_dimensions.update(new_dimensions)
+            Product.update_dimensions(product_id, merged_dimensions, existing_product.name, product_type)
 
         stock_data, stock_quantity = build_stock_record(product_id)
 
         # Insert into detailed stock collection
-        result = db.detailed_stock.insert_one(stock_data)
+        record_id = DetailedStockRepository.insert(stock_data)
 
         # Update product stock and record transaction
-        product = Product.get_by_id(product_id)
-        if product:
-            new_stock_total = product.get('stock', 0) + stock_quantity
-            Product.update_stock(product_id, new_stock_total)
-
+        change = Product.adjust_stock(product_id, stock_quantity)
+        if change:
+            publish_stock_change(product_id, *change)
             transaction = StockTransaction(product_id, stock_quantity, 'in')
             transaction.save()
 
-        return jsonify({'message': 'Stock added successfully', 'id': str(result.inserted_id)}), 200
+        return jsonify({'message': 'Stock added successfully', 'id': str(record_id)}), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @stock_bp.route('/stock/upload-excel', methods=['POST'])
 def upload_excel():
+    """Import rolls from Excel. Form fields:
+    dryRun=true   report what would happen without changing stock
+    overwrite=true  overwrite conflicting products instead of listing them
+    stream=ndjson   stream progress records (one JSON object per line)
+    Conflicts are paged from /api/stock/imports/<importId>/conflicts."""
+    # pandas/openpyxl are only needed here, so keep them out of worker start-up
+    import pandas as pd
+
     try:
         if 'excel-file' not in request.files:
             return jsonify({'error': 'No file provided'}), 400
@@ -426,192 +614,92 @@ def upload_excel():
             return jsonify({'error': 'Invalid file format. Please upload Excel file'}), 400
 
         overwrite = request.form.get('overwrite', 'false').lower() == 'true'
+        dry_run = request.form.get('dryRun', 'false').lower() == 'true'
+        stream = request.form.get('stream') == 'ndjson'
         
         # Read Excel file
         df = pd.read_excel(file)
         
-        required_columns = ['productType', 'productName', 'length', 'width', 'thickness', 'rollNumber', 'importDate']
-        for col in required_columns:
+        for col in excel_import.REQUIRED_COLUMNS:
             if col not in df.columns:
                 return jsonify({'error': f'Missing required column: {col}'}), 400
-        
-        from db.database import db
-        inserted_count = 0
-        updated_count = 0
-        skipped_duplicates = 0
-        conflicts = []
 
-        def normalize_value(value):
-            if value is None:
-                return None
-            if isinstance(value, float):
-                return round(value, 4)
-            if isinstance(value, datetime):
-                return value.isoformat()
-            return str(value).strip()
-        
-        for index, row in df.iterrows():
-            try:
-                product_type = str(row['productType']).strip()
-                product_name = str(row['productName']).strip()
-                length = None if pd.isna(row['length']) else float(row['length'])
-                width = None if pd.isna(row['width']) else float(row['width'])
-                thickness = None if pd.isna(row['thickness']) else float(row['thickness'])
-                roll_number = None if pd.isna(row['rollNumber']) else str(row['rollNumber'])
-                import_date = None if pd.isna(row['importDate']) else pd.to_datetime(row['importDate']).to_pydatetime()
-                taken_date = None if pd.isna(row.get('takenDate')) else pd.to_datetime(row['takenDate']).to_pydatetime()
-                length_unit = str(row.get('lengthUnit', 'mm')).strip()
-                width_unit = str(row.get('widthUnit', 'mm')).strip()
-                
-                # Convert to meters and calculate sq.mtr
-                def to_meters(value, unit):
-                    if unit == 'mm':
-                        return value / 1000
-                    elif unit == 'inch':
-                        return value * 0.0254
-                    else:  # mtr
-                        return value
-                
-                length_mtr = to_meters(length, length_unit) if length else 0
-                width_mtr = to_meters(width, width_unit) if width else 0
-                sq_mtr = round(length_mtr * width_mtr, 2) if length and width else 0
-                
-                product = db.products.find_one({
-                    'name': product_name,
-                    'category': product_type
-                })
-
-                incoming_signature = {
-                    'length': length,
-                    'width': width,
-                    'thickness': thickness,
-                    'rollNumber': roll_number,
-                    'importDate': import_date.isoformat() if import_date else None,
-                    'takenDate': taken_date.isoformat() if taken_date else None
-                }
-
-                if product:
-                    existing_dims = product.get('dimensions', {})
-                    existing_signature = {
-                        'length': existing_dims.get('length'),
-                        'width': existing_dims.get('width'),
-                        'thickness': existing_dims.get('thickness'),
-                        'rollNumber': existing_dims.get('rollNumber'),
-                        'importDate': existing_dims.get('importDate'),
-                        'takenDate': existing_dims.get('takenDate')
-                    }
-
-                    differences = {}
-                    for key, incoming_value in incoming_signature.items():
-                        existing_value = existing_signature.get(key)
-                        if normalize_value(existing_value) != normalize_value(incoming_value):
-                            differences[key] = {
-                                'existing': normalize_value(existing_value),
-                                'incoming': normalize_value(incoming_value)
-                            }
-
-                    if not differences:
-                        skipped_duplicates += 1
-                        continue
-
-                    if differences and not overwrite:
-                        conflicts.append({
-                            'productName': product_name,
-                            'productType': product_type,
-                            'differences': differences
-                        })
-                        continue
-
-                    if differences and overwrite:
-                        updated_dims = existing_dims.copy()
-                        updated_dims.update({
-                            'length': length,
-                            'width': width,
-                            'lengthUnit': row.get('lengthUnit', existing_dims.get('lengthUnit', 'mm')),
-                            'widthUnit': row.get('widthUnit', existing_dims.get('widthUnit', 'mm')),
-                            'thickness': thickness,
-                            'thicknessUnit': row.get('thicknessUnit', existing_dims.get('thicknessUnit', 'mm')),
-                            'rollNumber': roll_number
-                        })
-                        if import_date:
-                            updated_dims['importDate'] = import_date.isoformat()
-                        if taken_date:
-                            updated_dims['takenDate'] = taken_date.isoformat()
-                        Product.update_dimensions(str(product['_id']), updated_dims)
-                        updated_count += 1
-                else:
-                    # Create new product entry
-                    dimensions = {
-                        'length': length,
-                        'width': width,
-                        'lengthUnit': row.get('lengthUnit', 'mm'),
-                        'widthUnit': row.get('widthUnit', 'mm'),
-                        'thickness': thickness,
-                        'thicknessUnit': row.get('thicknessUnit', 'mm'),
-                        'rollNumber': roll_number,
-                        'importDate': import_date,
-                        'takenDate': taken_date,
-                        'sqMtr': sq_mtr,
-                        'createdAt': datetime.utcnow()
-                    }
-                    product_payload = {
-                        'name': product_name,
-                        'category': product_type,
-                        'stock': 0,
-                        'imported': True,
-                        'dimensions': dimensions,
-                        'createdAt': datetime.utcnow()
-                    }
-                    insert_result = db.products.insert_one(product_payload)
-                    product = db.products.find_one({'_id': insert_result.inserted_id})
-                    inserted_count += 1
-
-                # Record stock movement
-                stock_data = {
-                    'productType': product_type,
-                    'productId': str(product['_id']),
-                    'productName': product_name,
-                    'length': length,
-                    'width': width,
-                    'thickness': thickness,
-                    'rollNumber': roll_number,
-                    'importDate': import_date,
-                    'takenDate': taken_date,
-                    'sqMtr': sq_mtr,
-                    'createdAt': datetime.utcnow()
-                }
-                db.detailed_stock.insert_one(stock_data)
-
-                new_stock = product.get('stock', 0) + sq_mtr
-                db.products.update_one(
-                    {'_id': product['_id']},
-                    {'$set': {'stock': new_stock, 'lastUpdated': datetime.utcnow()}}
-                )
-                
-            except Exception as e:
-                print(f"Error processing row {index}: {e}")
-                continue
-
-        if conflicts and not overwrite:
-            return jsonify({
-                'error': 'CONFLICTS_FOUND',
-                'message': f'{len(conflicts)} rows differ from existing data.',
-                'conflicts': conflicts,
-                'inserted': inserted_count,
-                'skipped': skipped_duplicates
-            }), 409
-
-        return jsonify({
-            'message': 'Excel import completed',
-            'inserted': inserted_count,
-            'updated': updated_count,
-            'skipped': skipped_duplicates
-        }), 200
+        rows = excel_import.parse_rows(df, pd)
+        records = excel_import.run_import(rows, overwrite, dry_run, file.filename)
+
+        if stream:
+            def generate():
+                try:
+                    for record in records:
+                        yield json.dumps(record) + '\n'
+                except Exception as e:
+                    yield json.dumps({'type': 'error', 'error': str(e)}) + '\n'
+            return Response(stream_with_context(generate()), mimetype='application/x-ndjson',
+                            headers={'X-Accel-Buffering': 'no'})
+
+        result = None
+        for record in records:
+            result = record
+        result.pop('type')
+
+        if result['conflicts'] and not dry_run:
+            return jsonify(dict(
+                result,
+                error='CONFLICTS_FOUND',
+                message=f"{result['conflicts']} rows differ from existing data.",
+                firstConflicts=excel_import.conflict_page(ObjectId(result['importId']), limit=CONFLICT_PAGE_SIZE)
+            )), 409
+
+        return jsonify(dict(result, message='Dry run completed' if dry_run else 'Excel import completed')), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@stock_bp.route('/stock/imports/<import_id>/conflicts', methods=['GET'])
+def get_import_conflicts(import_id):
+    """Unresolved conflicts, paged by seq: ?after=<last seq seen>&limit=100"""
+    upload = ImportRepository.get(import_id)
+    if not upload:
+        return jsonify({'error': 'Import not found or expired'}), 404
+    try:
+        after = int(request.args.get('after', 0))
+        limit = min(int(request.args.get('limit', CONFLICT_PAGE_SIZE)), 1000)
+    except ValueError:
+        return jsonify({'error': 'after and limit must be integers'}), 400
+
+    conflicts = excel_import.conflict_page(upload.id, after, limit)
+    return jsonify({
+        'importId': import_id,
+        'dryRun': bool(upload.dry_run),
+        'total': upload.conflicts or 0,
+        'conflicts': conflicts,
+        'next': conflicts[-1]['seq'] if len(conflicts) == limit else None
+    }), 200
+
+@stock_bp.route('/stock/imports/<import_id>/resolve', methods=['POST'])
+def resolve_import_conflicts(import_id):
+    """Body: {"resolutions": [{"seq": 1, "action": "overwrite"}, {"seq": 2, "action": "skip"}]}"""
+    upload = ImportRepository.get(import_id)
+    if not upload:
+        return jsonify({'error': 'Import not found or expired'}), 404
+    if upload.dry_run:
+        return jsonify({'error': 'Conflicts from a dry run cannot be applied; run the import first'}), 400
+
+    data = request.get_json() or {}
+    resolutions = {}
+    for item in data.get('resolutions', []):
+        action = item.get('action')
+        if action not in ('overwrite', 'skip') or not isinstance(item.get('seq'), int):
+            return jsonify({'error': 'Each resolution needs an integer seq and action overwrite or skip'}), 400
+        resolutions[item['seq']] = action
+    if not resolutions:
+        return jsonify({'error': 'resolutions is required'}), 400
+
+    counts = excel_import.resolve_conflicts(upload.id, resolutions)
+    return jsonify(dict(counts, message='Resolutions applied')), 200
+
 @stock_bp.route('/stock/in/detailed/confirm-duplicate', methods=['POST'])
+@idempotent()
 def confirm_duplicate_roll():
     """Handle duplicate roll confirmation - either delete or add with import date"""
     try:
@@ -628,20 +716,20 @@ def confirm_duplicate_roll():
             if not roll_data.get('importDate'):
                 return jsonify({'error': 'Import date is required for separate entry'}), 400
             
-            # Create a unique product name with import date
             import_date_str = roll_data['importDate']
-            unique_name = f"{roll_data['productName']} ({import_date_str})"
-            
-            # Check if this unique name already exists
-            existing_unique = db.products.find_one({
-                'name': unique_name,
-                'category': roll_data['productType']
-            })
-            
-            if existing_unique:
+            try:
+                import_date = datetime.strptime(import_date_str, '%Y-%m-%d')
+            except ValueError:
+                return jsonify({'error': 'Import date must be in YYYY-MM-DD format'}), 400
+            product_type = roll_data['productType']
+            product_name = roll_data['productName']
+            roll_number = roll_number_of(roll_data.get('rollNumber'))
+            sq_mtr = to_number(roll_data.get('sqMtr')) or 0
+
+            # The roll registry tells deliveries apart by import date
+            if roll_number and RollRepository.by_number(roll_number, import_date):
                 return jsonify({'error': 'Entry with this import date already exists'}), 400
-            
-            # Create new product with unique name
+
             dimensions = {
                 'length': roll_data['length'],
                 'width': roll_data['width'],
@@ -649,44 +737,66 @@ def confirm_duplicate_roll():
                 'widthUnit': roll_data.get('widthUnit', 'mm'),
                 'thickness': roll_data['thickness'],
                 'thicknessUnit': roll_data.get('thicknessUnit', 'mm'),
-                'rollNumber': roll_data.get('rollNumber'),
+                'rollNumber': roll_number,
                 'stockType': 'roll',
                 'importDate': import_date_str
             }
-            
-            product_data = {
-                'name': unique_name,
-                'category': roll_data['productType'],
-                'stock': roll_data.get('sqMtr', 0),
-                'imported': roll_data.get('imported', True),
-                'dimensions': dimensions,
-                'createdAt': datetime.utcnow()
-            }
-            
-            product_result = db.products.insert_one(product_data)
-            product_id = str(product_result.inserted_id)
-            
+
+            # The roll joins the product for its size rather than a new
+            # product named after the import date. The roll is registered
+            # first, so a clash leaves nothing written.
+            existing_product = ProductRepository.find_match(_roll_product_query(roll_data, product_type))
+            product_id = str(existing_product.id if existing_product else ObjectId())
+            if roll_number and not RollRepository.register(roll_document(
+                product_id, product_type, product_name, roll_number, dimensions,
+                import_date=import_date, taken_date=roll_data.get('takenDate'), sq_mtr=sq_mtr
+            )):
+                return jsonify({'error': 'Entry with this import date already exists'}), 400
+
+            if existing_product:
+                merged_dimensions = (existing_product.dimensions or {}).copy()
+                merged_dimensions.update(dimensions)
+                Product.update_dimensions(product_id, merged_dimensions, existing_product.name, product_type)
+            else:
+                ProductRepository.insert({
+                    '_id': ObjectId(product_id),
+                    'name': product_name,
+                    'category': product_type,
+                    'stock': 0,
+                    'imported': roll_data.get('imported', True),
+                    'dimensions': dimensions,
+                    'createdAt': datetime.utcnow()
+                })
+
             # Create detailed stock record
             stock_data = {
-                'productType': roll_data['productType'],
-                'productName': unique_name,
+                'productType': product_type,
+                'productName': product_name,
                 'productId': product_id,
                 'stockType': 'roll',
                 'length': roll_data['length'],
                 'width': roll_data['width'],
                 'thickness': roll_data['thickness'],
-                'rollNumber': roll_data.get('rollNumber'),
-                'importDate': datetime.strptime(import_date_str, '%Y-%m-%d') if import_date_str else None,
+                'rollNumber': roll_number,
+                'importDate': import_date,
                 'takenDate': datetime.strptime(roll_data['takenDate'], '%Y-%m-%d') if roll_data.get('takenDate') else None,
                 'sqMtr': roll_data.get('sqMtr'),
+                'ledgered': True,
                 'createdAt': datetime.utcnow()
             }
-            
-            db.detailed_stock.insert_one(stock_data)
-            
+            stock_data.update(canonical_dimensions(dimensions))
+            DetailedStockRepository.insert(stock_data)
+
+            change = Product.adjust_stock(product_id, sq_mtr)
+            if change:
+                publish_stock_change(product_id, *change)
+                StockTransaction(product_id, sq_mtr, 'in').save()
+
             return jsonify({
                 'message': 'Roll added successfully with import date differentiation',
-                'uniqueName': unique_name
+                'productName': product_name,
+                'rollNumber': roll_number,
+                'importDate': import_date_str
             }), 200
             
         else:
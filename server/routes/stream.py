@@ -0,0 +1,38 @@
+import json
+import queue
+from flask import Blueprint, Response, jsonify
+from ..utils import events
+
+stream_bp = Blueprint('stream', __name__)
+
+KEEPALIVE_SECONDS = 15
+# Sent with a refused stream; the client opens a new one after this
+RETRY_AFTER_SECONDS = 60
+
+
+@stream_bp.route('/stream/stock', methods=['GET'])
+def stream_stock():
+    subscriber = events.subscribe()
+    if subscriber is None:
+        response = jsonify({'error': 'Too many live stock streams on this server'})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(RETRY_AFTER_SECONDS)
+        return response
+
+    def generate():
+        try:
+            yield 'retry: 5000\n\n'
+            while True:
+                try:
+                    event = subscriber.get(timeout=KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+                    continue
+                yield f"id: {event['id']}\nevent: stock\ndata: {json.dumps(event)}\n\n"
+        finally:
+            events.unsubscribe(subscriber)
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
@@ -0,0 +1,75 @@
+from flask import Blueprint, request, jsonify, url_for
+from ..utils.idempotency import IdempotencyError
+from .stock import MOVEMENT_FIELDS, run_movement, stock_in, stock_out
+
+sync_bp = Blueprint('sync', __name__)
+
+SYNC_BATCH_LIMIT = 500
+# type -> (endpoint whose idempotency keys the item shares, movement)
+MOVEMENTS = {
+    'in': ('stock.add_stock', stock_in),
+    'out': ('stock.issue_stock', stock_out),
+}
+
+
+def _replay(item):
+    """(body, status, replayed) for one queued movement."""
+    if not isinstance(item, dict) or item.get('type') not in MOVEMENTS:
+        return {'error': "type must be 'in' or 'out'"}, 400, False
+    endpoint, movement = MOVEMENTS[item['type']]
+    payload = {field: item.get(field) for field in MOVEMENT_FIELDS}
+    key = item.get('idempotencyKey')
+    if key is None:
+        return {'error': 'An idempotency key is required'}, 400, False
+    try:
+        # Scoped like the single-movement endpoint, so a movement that did
+        # reach /stock/in or /stock/out before the tablet queued it is not
+        # applied twice
+        return run_movement(movement, payload, key, url_for(endpoint))
+    except IdempotencyError as e:
+        return {'error': str(e)}, e.status, False
+    except Exception as e:
+        return {'error': str(e)}, 500, False
+
+
+@sync_bp.route('/sync/batch', methods=['POST'])
+def sync_batch():
+    """Replay a client's queue of buffered stock movements, in order:
+
+        {"items": [{"idempotencyKey": "...", "type": "in" | "out",
+                    "productId": "...", "quantity": 5}, ...]}
+
+    Every item needs its own idempotency key and runs as if posted to
+    /stock/in or /stock/out with it, so the whole batch can be resent after
+    a dropped connection. One item failing does not stop the rest; results
+    come back per item, in the same order, with the status and body the
+    single-movement endpoint would have returned. Items with a 5xx status
+    were not applied and should stay queued; anything else is settled.
+    """
+    data = request.get_json(silent=True) or {}
+    items = data.get('items')
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': 'items must be a non-empty list'}), 400
+    if len(items) > SYNC_BATCH_LIMIT:
+        return jsonify({'error': f'At most {SYNC_BATCH_LIMIT} items per batch'}), 400
+
+    results = []
+    counts = {'applied': 0, 'replayed': 0, 'rejected': 0, 'failed': 0}
+    for item in items:
+        body, status, replayed = _replay(item)
+        if status >= 500:
+            counts['failed'] += 1
+        elif replayed:
+            counts['replayed'] += 1
+        elif status < 300:
+            counts['applied'] += 1
+        else:
+            counts['rejected'] += 1
+        results.append({
+            'idempotencyKey': item.get('idempotencyKey') if isinstance(item, dict) else None,
+            'status': status,
+            'replayed': replayed,
+            'body': body
+        })
+
+    return jsonify({'results': results, **counts}), 200
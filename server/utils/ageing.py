@@ -0,0 +1,195 @@
+"""Stock ageing: stock on hand grouped by category and age band.
+
+Registered rolls (db.rolls) count their remainingSqMtr for as long as any
+is left. The rest of a product's stock (its stock less what its registered
+rolls still hold) is allocated to its other detailed_stock lots first in,
+first out: what is on hand is taken to be the newest receipts, so the
+oldest lots are the ones already issued. Lot quantities are in the units
+stock is kept in (see DetailedStockRepository.intake), and a lot's sq. mtr.
+count in proportion to the part of it still on hand.
+
+Age runs from importDate (falling back to takenDate, then createdAt) to
+the as-of date; an earlier as-of date only moves that reference point,
+since stock on hand is always today's. Stock with no lot behind it (set
+by hand, or older than detailed_stock) is not aged.
+
+The nightly job stores the result in db.report_ageing; the endpoint serves
+that copy when it is less than a day old and no filters are given.
+
+Run with: python -m server.utils.ageing   (refresh the stored result)
+"""
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import datetime, timedelta
+from bson import ObjectId
+from bson.errors import InvalidId
+from ..db.database import db, reporting_db
+from ..repositories.rolls import roll_date, roll_number_of
+from .dimensions import to_number
+
+AGEING_INDEX = 'productType_importDate'
+MATERIALIZED_ID = 'latest'
+# Lower bounds in days; the last band is open-ended
+AGE_BANDS = [0, 30, 90, 180, 365]
+PIECE_TYPES = ['blankets', 'underpacking']
+ROLL_PROJECTION = {'rollNumber': 1, 'productId': 1, 'productType': 1, 'importDate': 1, 'takenDate': 1,
+                   'createdAt': 1, 'remainingSqMtr': 1}
+LOT_PROJECTION = {'productId': 1, 'productType': 1, 'stockType': 1, 'rollNumber': 1, 'importDate': 1,
+                  'takenDate': 1, 'createdAt': 1, 'stock': 1, 'sqMtr': 1, 'numberOfPieces': 1,
+                  'totalSqMtr': 1, 'area_m2': 1}
+PRODUCT_BATCH = 1000
+
+
+def band_label(index):
+    if index == len(AGE_BANDS) - 1:
+        return f'{AGE_BANDS[index]}+'
+    return f'{AGE_BANDS[index]}-{AGE_BANDS[index + 1] - 1}'
+
+
+def _received(document):
+    for field in ('importDate', 'takenDate', 'createdAt'):
+        date = roll_date(document.get(field))
+        if date is not None:
+            return date
+    return None
+
+
+def _age_days(document, as_of):
+    """Whole days from the document's date to as_of, or None if it has no
+    date or is dated after as_of (not yet on hand)."""
+    received = _received(document)
+    if received is None:
+        return None
+    days = (as_of - received).days
+    return days if days >= 0 else None
+
+
+def _number(value):
+    return to_number(value) or 0
+
+
+def lot_quantity(lot):
+    """What a lot added to its product's stock, as DetailedStockRepository.intake counts it."""
+    if lot.get('productType') in PIECE_TYPES and lot.get('stockType') == 'pieces':
+        return _number(lot.get('numberOfPieces'))
+    if lot.get('sqMtr') is not None:
+        return _number(lot.get('sqMtr'))
+    return _number(lot.get('stock'))
+
+
+def lot_sq_mtr(lot):
+    if lot.get('stockType') == 'pieces':
+        if lot.get('totalSqMtr') is not None:
+            return _number(lot.get('totalSqMtr'))
+        return _number(lot.get('numberOfPieces')) * _number(lot.get('area_m2'))
+    return _number(lot.get('sqMtr'))
+
+
+def _product_stock(product_ids):
+    """{product id string: stock} for the given id strings."""
+    object_ids = []
+    for product_id in product_ids:
+        try:
+            object_ids.append(ObjectId(product_id))
+        except (InvalidId, TypeError):
+            pass
+    stock = {}
+    for offset in range(0, len(object_ids), PRODUCT_BATCH):
+        batch = object_ids[offset:offset + PRODUCT_BATCH]
+        for product in reporting_db.products.find({'_id': {'$in': batch}}, {'stock': 1}):
+            stock[str(product['_id'])] = _number(product.get('stock'))
+    return stock
+
+
+def ageing_report(as_of=None, product_types=None):
+    as_of = as_of or datetime.utcnow()
+    query = {'productType': {'$in': product_types}} if product_types else {}
+    rows = {}
+
+    def add(category, age_days, sq_mtr, quantity):
+        band = band_label(bisect_right(AGE_BANDS, age_days) - 1)
+        row = rows.setdefault((category, band), {'lots': 0, 'sqMtr': 0.0, 'quantity': 0.0, 'oldestDays': age_days})
+        row['lots'] += 1
+        row['sqMtr'] += sq_mtr
+        row['quantity'] += quantity
+        row['oldestDays'] = max(row['oldestDays'], age_days)
+
+    registered = set()
+    in_rolls = defaultdict(float)
+    for roll in reporting_db.rolls.find(query, ROLL_PROJECTION):
+        registered.add((roll_number_of(roll.get('rollNumber')), roll_date(roll.get('importDate'))))
+        remaining = _number(roll.get('remainingSqMtr'))
+        if remaining <= 0:
+            continue
+        in_rolls[str(roll.get('productId'))] += remaining
+        age_days = _age_days(roll, as_of)
+        if age_days is not None:
+            add(roll.get('productType'), age_days, remaining, remaining)
+
+    lots = defaultdict(list)
+    cursor = reporting_db.detailed_stock.find(query, LOT_PROJECTION)
+    if product_types:
+        cursor = cursor.hint(AGEING_INDEX)
+    for lot in cursor:
+        roll_number = roll_number_of(lot.get('rollNumber'))
+        # Lots of registered rolls were counted from the registry above
+        if roll_number and (roll_number, roll_date(lot.get('importDate'))) in registered:
+            continue
+        if lot.get('productId') is not None:
+            lots[str(lot['productId'])].append(lot)
+
+    stock = _product_stock(lots)
+    for product_id, product_lots in lots.items():
+        on_hand = stock.get(product_id, 0) - in_rolls.get(product_id, 0)
+        # Newest first: those are the receipts still on the shelf
+        product_lots.sort(key=lambda lot: _received(lot) or datetime.min, reverse=True)
+        for lot in product_lots:
+            if on_hand <= 0:
+                break
+            quantity = lot_quantity(lot)
+            if quantity <= 0:
+                continue
+            held = min(quantity, on_hand)
+            on_hand -= held
+            age_days = _age_days(lot, as_of)
+            if age_days is not None:
+                add(lot.get('productType'), age_days, lot_sq_mtr(lot) * held / quantity, held)
+
+    ordered = sorted(rows.items(), key=lambda item: (str(item[0][0]), item[1]['oldestDays']))
+    return {
+        'asOf': as_of.isoformat(),
+        'bands': [band_label(index) for index in range(len(AGE_BANDS))],
+        'rows': [
+            {
+                'category': category,
+                'band': band,
+                'lots': row['lots'],
+                'sqMtr': round(row['sqMtr'], 4),
+                'quantity': round(row['quantity'], 4),
+                'oldestDays': row['oldestDays']
+            }
+            for (category, band), row in ordered
+        ]
+    }
+
+
+def refresh_materialized():
+    report = ageing_report()
+    db.report_ageing.replace_one({'_id': MATERIALIZED_ID}, dict(report, refreshedAt=datetime.utcnow()), upsert=True)
+    return report
+
+
+def materialized_report(max_age=timedelta(days=1)):
+    """The stored report if it was refreshed within max_age, else None."""
+    stored = db.report_ageing.find_one({'_id': MATERIALIZED_ID})
+    if not stored or datetime.utcnow() - stored['refreshedAt'] > max_age:
+        return None
+    stored.pop('_id')
+    stored['refreshedAt'] = stored['refreshedAt'].isoformat()
+    return stored
+
+
+if __name__ == '__main__':
+    from ..db.indexes import ensure_indexes
+    ensure_indexes()
+    print(f"Stored ageing report with {len(refresh_materialized()['rows'])} rows")
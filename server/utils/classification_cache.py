@@ -0,0 +1,141 @@
+"""Content-addressed, size-bounded cache of SKU classification results.
+
+Entries live in a local SQLite file shared by every worker on the host.
+Keys hash the rule-table version together with the cleaned input, so
+editing the rules simply stops old entries from matching; they age out
+through the normal least-recently-used eviction once the file holds more
+than SKU_CACHE_MAX_ENTRIES rows. Set SKU_CACHE_PATH to an empty string to
+disable the cache.
+
+The cache fails open: if the file cannot be opened, read or written
+(locked past the timeout, disk full, corrupt), the error is logged and
+callers get misses, so classification runs uncached instead of failing.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+CACHE_PATH = os.environ.get(
+    'SKU_CACHE_PATH', os.path.join(tempfile.gettempdir(), 'stock-sku', 'classification-cache.sqlite3')
+)
+MAX_ENTRIES = int(os.environ.get('SKU_CACHE_MAX_ENTRIES', '200000'))
+# Evict down to this fraction of MAX_ENTRIES so eviction runs rarely
+EVICT_TO = 0.9
+# SQLite's default limit on bound parameters is 999
+_CHUNK = 900
+
+
+def rules_version(*tables):
+    """Stable hash of the rule tables; sets are sorted so order never matters."""
+    def default(value):
+        if isinstance(value, (set, frozenset)):
+            return sorted(value)
+        raise TypeError(f'Cannot hash {type(value).__name__}')
+    encoded = json.dumps(tables, sort_keys=True, default=default)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()[:16]
+
+
+def cache_key(version, *parts):
+    return hashlib.sha256('\x1f'.join((version,) + parts).encode('utf-8')).hexdigest()
+
+
+class ClassificationCache:
+    def __init__(self, path=CACHE_PATH, max_entries=MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._ready = False
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return bool(self.path) and self.max_entries > 0
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            if not self._ready:
+                with self._lock:
+                    if not self._ready:
+                        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                        setup = sqlite3.connect(self.path, timeout=10)
+                        setup.execute('PRAGMA journal_mode=WAL')
+                        setup.execute(
+                            'CREATE TABLE IF NOT EXISTS classifications '
+                            '(key TEXT PRIMARY KEY, value TEXT NOT NULL, used REAL NOT NULL)'
+                        )
+                        setup.execute('CREATE INDEX IF NOT EXISTS classifications_used ON classifications (used)')
+                        setup.commit()
+                        setup.close()
+                        self._ready = True
+            connection = sqlite3.connect(self.path, timeout=10)
+            self._local.connection = connection
+        return connection
+
+    def _failed(self, operation, error):
+        print(f'Classification cache {operation} failed, continuing without it: {error}')
+        # The next call opens a fresh connection
+        connection = getattr(self._local, 'connection', None)
+        self._local.connection = None
+        if connection is not None:
+            try:
+                connection.close()
+            except sqlite3.Error:
+                pass
+
+    def get_many(self, keys):
+        """{key: value} for the keys present; marks them as recently used."""
+        if not self.enabled or not keys:
+            return {}
+        try:
+            return self._get_many(keys)
+        except (sqlite3.Error, OSError) as e:
+            self._failed('read', e)
+            return {}
+
+    def put_many(self, items):
+        """Store {key: value} (values must be JSON-serialisable)."""
+        if not self.enabled or not items:
+            return
+        try:
+            self._put_many(items)
+        except (sqlite3.Error, OSError) as e:
+            self._failed('write', e)
+
+    def _get_many(self, keys):
+        connection = self._connection()
+        found = {}
+        unique = list(dict.fromkeys(keys))
+        for start in range(0, len(unique), _CHUNK):
+            chunk = unique[start:start + _CHUNK]
+            placeholders = ','.join('?' * len(chunk))
+            rows = connection.execute(
+                f'SELECT key, value FROM classifications WHERE key IN ({placeholders})', chunk
+            ).fetchall()
+            found.update((key, json.loads(value)) for key, value in rows)
+        if found:
+            now = time.time()
+            with connection:
+                connection.executemany('UPDATE classifications SET used = ? WHERE key = ?',
+                                       [(now, key) for key in found])
+        return found
+
+    def _put_many(self, items):
+        connection = self._connection()
+        now = time.time()
+        with connection:
+            connection.executemany(
+                'INSERT OR REPLACE INTO classifications (key, value, used) VALUES (?, ?, ?)',
+                [(key, json.dumps(value), now) for key, value in items.items()]
+            )
+            count = connection.execute('SELECT COUNT(*) FROM classifications').fetchone()[0]
+            if count > self.max_entries:
+                connection.execute(
+                    'DELETE FROM classifications WHERE key IN '
+                    '(SELECT key FROM classifications ORDER BY used LIMIT ?)',
+                    (count - int(self.max_entries * EVICT_TO),)
+                )
@@ -0,0 +1,52 @@
+import re
+
+# Multipliers that bring an entered value into millimetres
+_MM_PER_UNIT = {
+    'mm': 1.0,
+    'cm': 10.0,
+    'm': 1000.0,
+    'mtr': 1000.0,
+    'inch': 25.4,
+    'in': 25.4,
+    'micron': 0.001,
+    'mic': 0.001,
+}
+
+CANONICAL_FIELDS = ('length_mm', 'width_mm', 'thickness_mm', 'area_m2')
+
+
+def to_number(value):
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return None if value != value else float(value)
+    match = re.search(r'-?\d+(?:\.\d+)?', str(value).replace(',', ''))
+    return float(match.group(0)) if match else None
+
+
+def to_mm(value, unit='mm'):
+    number = to_number(value)
+    if number is None:
+        return None
+    factor = _MM_PER_UNIT.get(str(unit or 'mm').strip().lower())
+    if factor is None:
+        return None
+    return round(number * factor, 4)
+
+
+def canonical_dimensions(source):
+    """Return the numeric length/width/thickness in mm and area in sq m for a
+    dimensions dict (or a detailed_stock record, which uses the same keys)."""
+    source = source or {}
+    length_mm = to_mm(source.get('length'), source.get('lengthUnit', 'mm'))
+    width_mm = to_mm(source.get('width'), source.get('widthUnit', 'mm'))
+    thickness_mm = to_mm(source.get('thickness'), source.get('thicknessUnit', 'mm'))
+    area_m2 = None
+    if length_mm is not None and width_mm is not None:
+        area_m2 = round((length_mm / 1000) * (width_mm / 1000), 4)
+    return {
+        'length_mm': length_mm,
+        'width_mm': width_mm,
+        'thickness_mm': thickness_mm,
+        'area_m2': area_m2,
+    }
@@ -0,0 +1,112 @@
+"""Per-process fan-out of product stock changes to Server-Sent Event clients.
+
+Events come from one source per process, chosen with STOCK_EVENTS_SOURCE:
+    local         (default) write paths call publish_stock_change() directly;
+                  correct when a single worker serves the stream
+    changestream  one background thread watches db.products with a MongoDB
+                  change stream (needs a replica set, e.g. Atlas), so writes
+                  made by any worker reach every worker's subscribers
+The default is changestream whenever gunicorn runs more than one worker
+(WEB_CONCURRENCY), since a local publish only reaches its own worker.
+
+Each open stream holds a gthread thread for as long as it stays open.
+Streams get their own budget of STOCK_STREAM_THREADS threads per process,
+on top of the GUNICORN_THREADS that serve the API (the Procfile starts
+gunicorn with the sum), so the API keeps its threads however many clients
+are listening. A process turns away streams beyond that budget; size it
+for the clients expected per worker.
+"""
+import itertools
+import os
+import queue
+import threading
+from datetime import datetime
+
+WORKERS = int(os.environ.get('WEB_CONCURRENCY', '1'))
+SOURCE = os.environ.get('STOCK_EVENTS_SOURCE', 'changestream' if WORKERS > 1 else 'local')
+# Keep in step with the default in the Procfile and render.yaml
+MAX_SUBSCRIBERS = int(os.environ.get('STOCK_STREAM_THREADS', '32'))
+SUBSCRIBER_QUEUE_SIZE = 1000
+
+_subscribers = set()
+_lock = threading.Lock()
+_ids = itertools.count(1)
+_watcher = None
+
+
+def _serialize(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _fan_out(product_id, stock, last_updated):
+    event = {
+        'id': next(_ids),
+        'productId': str(product_id),
+        'stock': stock,
+        'lastUpdated': _serialize(last_updated),
+    }
+    with _lock:
+        subscribers = list(_subscribers)
+    for subscriber in subscribers:
+        try:
+            subscriber.put_nowait(event)
+        except queue.Full:
+            # A client that stopped reading loses events rather than memory;
+            # it resyncs from /api/products when it reconnects.
+            pass
+
+
+def publish_stock_change(product_id, stock, last_updated=None):
+    """Called by every write path that changes a product's stock."""
+    if SOURCE == 'local':
+        _fan_out(product_id, stock, last_updated or datetime.utcnow())
+
+
+def subscribe():
+    """A queue of events for one stream, or None if this process already
+    serves MAX_SUBSCRIBERS streams."""
+    subscriber = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+    with _lock:
+        if len(_subscribers) >= MAX_SUBSCRIBERS:
+            return None
+        _subscribers.add(subscriber)
+    if SOURCE == 'changestream':
+        _start_watcher()
+    return subscriber
+
+
+def unsubscribe(subscriber):
+    with _lock:
+        _subscribers.discard(subscriber)
+
+
+def _start_watcher():
+    global _watcher
+    with _lock:
+        if _watcher is not None:
+            return
+        _watcher = threading.Thread(target=_watch_products, name='stock-change-stream', daemon=True)
+        _watcher.start()
+
+
+def _watch_products():
+    from ..db.database import db
+
+    pipeline = [{'$match': {
+        'operationType': {'$in': ['insert', 'update', 'replace']},
+        '$or': [
+            {'operationType': {'$ne': 'update'}},
+            {'updateDescription.updatedFields.stock': {'$exists': True}},
+        ]
+    }}]
+    resume_token = None
+    while True:
+        try:
+            with db.products.watch(pipeline, full_document='updateLookup', resume_after=resume_token) as stream:
+                for change in stream:
+                    resume_token = stream.resume_token
+                    document = change.get('fullDocument') or {}
+                    _fan_out(change['documentKey']['_id'], document.get('stock'), document.get('lastUpdated'))
+        except Exception as e:
+            print(f"Stock change stream interrupted: {e}")
+            threading.Event().wait(5)
@@ -0,0 +1,288 @@
+"""Roll import from Excel (/api/stock/upload-excel).
+
+run_import() works through the parsed rows and yields progress records, so
+the route can stream them as NDJSON or collect them into one JSON reply.
+Rows that differ from an existing product are not sent back in bulk: they
+are saved in db.import_conflicts under the import's id, for the client to
+page through and resolve (overwrite or skip) one batch at a time. Import
+sessions and their conflicts expire after IMPORT_TTL_SECONDS (db.indexes).
+
+With dry_run nothing is written except the conflict list, so the client
+can review it before running the real import.
+"""
+from datetime import datetime
+from bson import ObjectId
+from ..models.product import Product
+from ..models.stock_transaction import StockTransaction
+from ..repositories.detailed_stock import DetailedStockRepository
+from ..repositories.imports import ImportRepository
+from ..repositories.products import ProductRepository
+from ..repositories.rolls import RollRepository, roll_document
+from .dimensions import canonical_dimensions
+from .events import publish_stock_change
+from .signature import differences as signature_differences, signature_hash
+
+REQUIRED_COLUMNS = ['productType', 'productName', 'length', 'width', 'thickness', 'rollNumber', 'importDate']
+PROGRESS_EVERY = 100
+CONFLICT_BATCH = 500
+
+
+def _to_meters(value, unit):
+    if unit == 'mm':
+        return value / 1000
+    elif unit == 'inch':
+        return value * 0.0254
+    else:  # mtr
+        return value
+
+
+def parse_rows(df, pd):
+    """Turn the sheet into row dicts; rows that cannot be parsed are logged and dropped."""
+    def text_or(value, default):
+        return default if pd.isna(value) else str(value).strip()
+
+    rows = []
+    for index, row in df.iterrows():
+        try:
+            product_type = str(row['productType']).strip()
+            product_name = str(row['productName']).strip()
+            length = None if pd.isna(row['length']) else float(row['length'])
+            width = None if pd.isna(row['width']) else float(row['width'])
+            thickness = None if pd.isna(row['thickness']) else float(row['thickness'])
+            roll_number = None if pd.isna(row['rollNumber']) else str(row['rollNumber'])
+            import_date = None if pd.isna(row['importDate']) else pd.to_datetime(row['importDate']).to_pydatetime()
+            taken_date = None if pd.isna(row.get('takenDate')) else pd.to_datetime(row['takenDate']).to_pydatetime()
+            length_unit = text_or(row.get('lengthUnit'), 'mm')
+            width_unit = text_or(row.get('widthUnit'), 'mm')
+            thickness_unit = text_or(row.get('thicknessUnit'), 'mm')
+
+            # Convert to meters and calculate sq.mtr
+            length_mtr = _to_meters(length, length_unit) if length else 0
+            width_mtr = _to_meters(width, width_unit) if width else 0
+            incoming = {
+                'length': length,
+                'width': width,
+                'thickness': thickness,
+                'rollNumber': roll_number,
+                'importDate': import_date,
+                'takenDate': taken_date
+            }
+            rows.append({
+                'index': int(index),
+                'productType': product_type,
+                'productName': product_name,
+                'incoming': incoming,
+                'units': {'lengthUnit': length_unit, 'widthUnit': width_unit, 'thicknessUnit': thickness_unit},
+                'sqMtr': round(length_mtr * width_mtr, 2) if length and width else 0,
+                'signatureHash': signature_hash(product_name, product_type, incoming)
+            })
+        except Exception as e:
+            print(f"Error processing row {index}: {e}")
+    return rows
+
+
+def match_rows(rows):
+    """Split rows into exact duplicates and the rest, and load the existing
+    products the rest refer to. Returns (pending, duplicates, existing)."""
+    # One $in over signature hashes settles every exact duplicate; only
+    # the remaining rows are looked up by name and diffed field by field.
+    hashes = list({row['signatureHash'] for row in rows})
+    known_hashes = ProductRepository.known_signatures(hashes)
+    pending = [row for row in rows if row['signatureHash'] not in known_hashes]
+
+    existing = {}
+    if pending:
+        cursor = ProductRepository.import_matches(
+            {row['productName'] for row in pending}, {row['productType'] for row in pending}
+        )
+        for product in cursor:
+            existing.setdefault((product['name'], product['category']), product)
+    return pending, len(rows) - len(pending), existing
+
+
+def apply_row(row, product, dry_run=False):
+    """Write one row: overwrite the product's dimensions (or create the
+    product), record the roll in detailed_stock and add its sq m to stock.
+    Returns the product dict, kept current for later rows in the sheet."""
+    product_type = row['productType']
+    product_name = row['productName']
+    incoming = row['incoming']
+    units = row['units']
+    sq_mtr = row['sqMtr']
+
+    if product:
+        updated_dims = (product.get('dimensions') or {}).copy()
+        updated_dims.update({
+            'length': incoming['length'],
+            'width': incoming['width'],
+            'lengthUnit': units['lengthUnit'],
+            'widthUnit': units['widthUnit'],
+            'thickness': incoming['thickness'],
+            'thicknessUnit': units['thicknessUnit'],
+            'rollNumber': incoming['rollNumber']
+        })
+        if incoming['importDate']:
+            updated_dims['importDate'] = incoming['importDate'].isoformat()
+        if incoming['takenDate']:
+            updated_dims['takenDate'] = incoming['takenDate'].isoformat()
+        # Every sheet row is a roll; products imported before this was set have none
+        updated_dims.setdefault('stockType', 'roll')
+        if not dry_run:
+            Product.update_dimensions(str(product['_id']), updated_dims, product_name, product_type)
+        product['dimensions'] = updated_dims
+    else:
+        # Create new product entry
+        dimensions = dict(incoming, **units)
+        dimensions.update({'stockType': 'roll', 'sqMtr': sq_mtr, 'createdAt': datetime.utcnow()})
+        product = {
+            'name': product_name,
+            'category': product_type,
+            'stock': 0,
+            'imported': True,
+            'dimensions': dimensions,
+            'createdAt': datetime.utcnow()
+        }
+        if dry_run:
+            return product
+        # insert() adds the derived fields to product and its _id
+        ProductRepository.insert(product)
+
+    if dry_run:
+        return product
+
+    # Record stock movement
+    stock_data = {
+        'productType': product_type,
+        'productId': str(product['_id']),
+        'productName': product_name,
+        'length': incoming['length'],
+        'width': incoming['width'],
+        'thickness': incoming['thickness'],
+        'rollNumber': incoming['rollNumber'],
+        'importDate': incoming['importDate'],
+        'takenDate': incoming['takenDate'],
+        'sqMtr': sq_mtr,
+        'ledgered': True,
+        'createdAt': datetime.utcnow()
+    }
+    stock_data.update(canonical_dimensions(dict(incoming, **units)))
+    DetailedStockRepository.insert(stock_data)
+    # A roll number already registered for this import date is left as it is
+    RollRepository.register(roll_document(
+        product['_id'], product_type, product_name, incoming['rollNumber'], dict(incoming, **units),
+        import_date=incoming['importDate'], taken_date=incoming['takenDate'], sq_mtr=sq_mtr
+    ))
+
+    change = Product.adjust_stock(product['_id'], sq_mtr)
+    if change:
+        product['stock'] = change[0]
+        StockTransaction(str(product['_id']), sq_mtr, 'in').save()
+        publish_stock_change(product['_id'], *change)
+    return product
+
+
+def run_import(rows, overwrite=False, dry_run=False, filename=None):
+    """Generator of progress records: one 'start', a 'progress' every
+    PROGRESS_EVERY rows and a final 'done' with the totals."""
+    import_id = ObjectId()
+    now = datetime.utcnow()
+    ImportRepository.create({
+        '_id': import_id, 'filename': filename, 'dryRun': dry_run, 'rows': len(rows),
+        'status': 'running', 'createdAt': now
+    })
+    yield {'type': 'start', 'importId': str(import_id), 'rows': len(rows), 'dryRun': dry_run}
+
+    pending, duplicates, existing = match_rows(rows)
+    counts = {'inserted': 0, 'updated': 0, 'skipped': duplicates, 'conflicts': 0, 'failed': 0}
+    conflict_batch = []
+
+    def flush_conflicts():
+        if conflict_batch:
+            ImportRepository.add_conflicts(conflict_batch)
+            conflict_batch.clear()
+
+    def import_row(row):
+        key = (row['productName'], row['productType'])
+        product = existing.get(key)
+        if product:
+            # Rows repeated within the sheet, or products saved before
+            # signatureHash existed, can still turn out identical
+            differences = signature_differences(product.get('dimensions') or {}, row['incoming'])
+            if not differences:
+                counts['skipped'] += 1
+                return
+            if not overwrite:
+                counts['conflicts'] += 1
+                conflict_batch.append({
+                    'importId': import_id,
+                    'seq': counts['conflicts'],
+                    'productId': product.get('_id'),
+                    'productName': row['productName'],
+                    'productType': row['productType'],
+                    'differences': differences,
+                    'row': row,
+                    'resolution': None,
+                    'createdAt': now
+                })
+                if len(conflict_batch) >= CONFLICT_BATCH:
+                    flush_conflicts()
+                return
+            counts['updated'] += 1
+        else:
+            counts['inserted'] += 1
+        existing[key] = apply_row(row, product, dry_run)
+
+    for position, row in enumerate(pending, start=1):
+        try:
+            import_row(row)
+        except Exception as e:
+            counts['failed'] += 1
+            print(f"Error processing row {row['index']}: {e}")
+        if position % PROGRESS_EVERY == 0:
+            yield dict(counts, type='progress', processed=duplicates + position, rows=len(rows))
+
+    flush_conflicts()
+    ImportRepository.finish(import_id, counts)
+    yield dict(counts, type='done', importId=str(import_id), rows=len(rows), dryRun=dry_run)
+
+
+def conflict_page(import_id, after=0, limit=100):
+    """Unresolved conflicts of an import in seq order, after the given seq."""
+    conflicts = []
+    for conflict in ImportRepository.open_conflicts(import_id, after, limit):
+        conflict.pop('_id')
+        conflict['productId'] = str(conflict['productId']) if conflict.get('productId') else None
+        conflicts.append(conflict)
+    return conflicts
+
+
+def resolve_conflicts(import_id, resolutions):
+    """Apply {seq: 'overwrite' | 'skip'} choices; returns counts.
+
+    Each conflict is claimed (its resolution set) before it is applied, so
+    a double-clicked or retried request cannot apply an overwrite twice;
+    conflicts already resolved (by this or another request) are counted
+    in alreadyResolved and left alone."""
+    counts = {'updated': 0, 'skipped': 0, 'missing': 0, 'alreadyResolved': 0}
+    seqs = list(resolutions)
+    for seq in seqs:
+        action = resolutions[seq]
+        conflict = ImportRepository.claim_conflict(import_id, seq, action)
+        if conflict is None:
+            counts['alreadyResolved'] += 1
+            continue
+        if action != 'overwrite':
+            counts['skipped'] += 1
+            continue
+        product = ProductRepository.import_target(conflict['productId'])
+        if not product:
+            counts['missing'] += 1
+            continue
+        try:
+            apply_row(conflict['row'], product)
+        except Exception:
+            # Nothing was applied for it; leave it open for another try
+            ImportRepository.reopen_conflict(conflict['_id'], action)
+            raise
+        counts['updated'] += 1
+    return counts
@@ -0,0 +1,165 @@
+"""Idempotency-Key handling for write endpoints.
+
+A client that may retry a write (the shop-floor tablets, on flaky Wi-Fi)
+sends a fresh key per logical operation in the Idempotency-Key header and
+reuses it on every retry. The first request with a key runs and its
+response is stored (repositories.idempotency); later ones get the stored
+response back, marked with Idempotent-Replayed: true, without writing
+again. Requests without the header behave as before.
+
+A key is bound to its request: reusing it with a different body is a 422,
+and a retry that arrives while the first attempt is still running is a
+409 the client can retry.
+
+Two ways to run a keyed write:
+    run_once_atomic  stock movements: the write and the key's completion
+                     commit in one movements_db transaction, so a 5xx
+                     means nothing was written and the key is released
+                     for a retry. If the first attempt is only slow and
+                     its claim was taken over, its transaction fails to
+                     complete the key and rolls back.
+    idempotent       decorator for other JSON views, whose writes are not
+                     transactional: whatever response the view produced,
+                     errors included, is stored, since its writes may have
+                     landed.
+Either way, a claim left pending for PENDING_SECONDS (repositories.
+idempotency) by a request that died is taken over by the next retry,
+rather than answering 409 until the key expires.
+"""
+import hashlib
+import json
+from functools import wraps
+from flask import jsonify, make_response, request
+from ..db.database import movements_transaction
+from ..repositories.idempotency import ClaimLost, IdempotencyRepository
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 200
+
+
+class IdempotencyError(Exception):
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.status = status
+
+
+class _Failed(Exception):
+    """A 5xx response from inside a transaction: abort it, then send this."""
+    def __init__(self, body, status):
+        super().__init__(status)
+        self.body = body
+        self.status = status
+
+
+def fingerprint(payload, fields=None):
+    """Hash of the request a key was first used with. With fields, only
+    those that are set are compared, so equivalent requests with extra
+    fields (or from /api/sync/batch) match."""
+    if fields is not None:
+        payload = payload or {}
+        payload = {field: payload[field] for field in fields if payload.get(field) is not None}
+    encoded = json.dumps(payload, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+def check_key(key):
+    if not isinstance(key, str) or not key.strip():
+        raise IdempotencyError('An idempotency key is required', 400)
+    if len(key) > MAX_KEY_LENGTH:
+        raise IdempotencyError(f'Idempotency keys are at most {MAX_KEY_LENGTH} characters', 400)
+
+
+def _replay(existing, request_fingerprint):
+    if existing.get('fingerprint') != request_fingerprint:
+        raise IdempotencyError('This idempotency key was already used for a different request', 422)
+    if existing.get('status') != 'done':
+        raise IdempotencyError('A request with this idempotency key is still in progress', 409)
+    return existing.get('response'), existing.get('statusCode', 200), True
+
+
+def run_once(scope, key, request_fingerprint, handler):
+    """(body, status, replayed): handler() -> (body, status) runs only if
+    the key is new to scope; otherwise the stored result is returned."""
+    check_key(key)
+    token, existing = IdempotencyRepository.claim(scope, key, request_fingerprint, takeover=True)
+    if existing is not None:
+        return _replay(existing, request_fingerprint)
+    try:
+        body, status = handler()
+    except Exception as e:
+        body, status = {'error': str(e)}, 500
+    try:
+        IdempotencyRepository.complete(scope, key, token, body, status)
+    except ClaimLost:
+        # Taken over or expired while the view ran; the response still stands
+        pass
+    return body, status, False
+
+
+def run_once_atomic(scope, key, request_fingerprint, handler):
+    """(body, status, replayed) like run_once, for handler(session,
+    after_commit) -> (body, status) whose writes all go through session.
+    Callables appended to after_commit run once the transaction commits."""
+    check_key(key)
+    token, existing = IdempotencyRepository.claim(scope, key, request_fingerprint, takeover=True)
+    if existing is not None:
+        return _replay(existing, request_fingerprint)
+
+    after_commit = []
+
+    def attempt(session):
+        after_commit.clear()
+        body, status = handler(session, after_commit)
+        if status >= 500:
+            raise _Failed(body, status)
+        IdempotencyRepository.complete(scope, key, token, body, status, session=session)
+        return body, status
+
+    try:
+        body, status = movements_transaction(attempt)
+    except _Failed as failed:
+        IdempotencyRepository.release(scope, key, token)
+        return failed.body, failed.status, False
+    except ClaimLost:
+        raise IdempotencyError('A request with this idempotency key is still in progress', 409)
+    except Exception:
+        IdempotencyRepository.release(scope, key, token)
+        raise
+    for callback in after_commit:
+        callback()
+    return body, status, False
+
+
+def respond(body, status, replayed=False):
+    response = jsonify(body)
+    response.status_code = status
+    if replayed:
+        response.headers[REPLAYED_HEADER] = 'true'
+    return response
+
+
+def idempotent(fields=None):
+    """Decorator for JSON write views: honour an Idempotency-Key header,
+    scoped to the request path. fields limits the fingerprint to those
+    body fields."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = request.headers.get(HEADER)
+            if key is None:
+                return view(*args, **kwargs)
+
+            def handler():
+                response = make_response(view(*args, **kwargs))
+                return response.get_json(silent=True), response.status_code
+
+            try:
+                body, status, replayed = run_once(
+                    request.path, key, fingerprint(request.get_json(silent=True), fields), handler
+                )
+            except IdempotencyError as e:
+                return jsonify({'error': str(e)}), e.status
+            return respond(body, status, replayed)
+        return wrapper
+    return decorator
@@ -0,0 +1,193 @@
+"""Batched, typed export of the stock ledger collections as CSV, Parquet or
+an Arrow IPC stream.
+
+Documents come from any iterable (a cursor, or the flattened movements of
+the bucketed ledger) and are converted one BATCH_SIZE batch at a time, so memory use does not grow with the size of the export.
+Parquet and Arrow use pyarrow (in requirements.txt); where it is not
+installed those formats answer 501.
+"""
+import csv
+import io
+import tempfile
+from datetime import datetime
+from .dimensions import to_number
+
+BATCH_SIZE = 5000
+CHUNK_SIZE = 64 * 1024
+
+
+def _string(value):
+    return None if value is None else str(value)
+
+
+def _float(value):
+    return to_number(value)
+
+
+def _int(value):
+    number = to_number(value)
+    return None if number is None else int(number)
+
+
+def _timestamp(value):
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, str) and value:
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    return None
+
+
+CONVERTERS = {'string': _string, 'float': _float, 'int': _int, 'timestamp': _timestamp}
+
+# name -> (time field, product field, [(column, type, document key)])
+LEDGERS = {
+    'stock_transactions': ('timestamp', 'product_id', [
+        ('id', 'string', '_id'),
+        ('productId', 'string', 'product_id'),
+        ('type', 'string', 'type'),
+        ('quantity', 'float', 'quantity'),
+        ('timestamp', 'timestamp', 'timestamp'),
+    ]),
+    'detailed_stock': ('createdAt', 'productId', [
+        ('id', 'string', '_id'),
+        ('productId', 'string', 'productId'),
+        ('productName', 'string', 'productName'),
+        ('productType', 'string', 'productType'),
+        ('stockType', 'string', 'stockType'),
+        ('rollNumber', 'string', 'rollNumber'),
+        ('sqMtr', 'float', 'sqMtr'),
+        ('numberOfPieces', 'int', 'numberOfPieces'),
+        ('stock', 'float', 'stock'),
+        ('length', 'float', 'length'),
+        ('lengthUnit', 'string', 'lengthUnit'),
+        ('width', 'float', 'width'),
+        ('widthUnit', 'string', 'widthUnit'),
+        ('thickness', 'float', 'thickness'),
+        ('thicknessUnit', 'string', 'thicknessUnit'),
+        ('length_mm', 'float', 'length_mm'),
+        ('width_mm', 'float', 'width_mm'),
+        ('thickness_mm', 'float', 'thickness_mm'),
+        ('area_m2', 'float', 'area_m2'),
+        ('importDate', 'timestamp', 'importDate'),
+        ('takenDate', 'timestamp', 'takenDate'),
+        ('createdAt', 'timestamp', 'createdAt'),
+    ]),
+}
+
+
+def build_query(ledger, start=None, end=None, product_ids=None):
+    time_field, product_field, _ = LEDGERS[ledger]
+    query = {}
+    if start or end:
+        query[time_field] = {}
+        if start:
+            query[time_field]['$gte'] = start
+        if end:
+            query[time_field]['$lt'] = end
+    if product_ids:
+        query[product_field] = {'$in': product_ids}
+    return query
+
+
+def find_documents(collection, ledger, query):
+    """Projected cursor over a ledger collection in time order."""
+    time_field, _, columns = LEDGERS[ledger]
+    projection = {key: 1 for _, _, key in columns}
+    return collection.find(query, projection).sort(time_field, 1).batch_size(BATCH_SIZE)
+
+
+def iter_batches(documents, ledger):
+    """Yield lists of converted rows (tuples in column order)."""
+    converters = [(CONVERTERS[kind], key) for _, kind, key in LEDGERS[ledger][2]]
+    batch = []
+    for document in documents:
+        batch.append(tuple(convert(document.get(key)) for convert, key in converters))
+        if len(batch) >= BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def stream_csv(documents, ledger):
+    columns = LEDGERS[ledger][2]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([name for name, _, _ in columns])
+    for batch in iter_batches(documents, ledger):
+        for row in batch:
+            writer.writerow(['' if value is None else value.isoformat() if isinstance(value, datetime) else value
+                             for value in row])
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def arrow_schema(ledger):
+    import pyarrow as pa
+    types = {'string': pa.string(), 'float': pa.float64(), 'int': pa.int64(), 'timestamp': pa.timestamp('ms')}
+    return pa.schema([(name, types[kind]) for name, kind, _ in LEDGERS[ledger][2]])
+
+
+def _record_batch(schema, batch):
+    import pyarrow as pa
+    arrays = [pa.array(list(values), type=field.type) for values, field in zip(zip(*batch), schema)]
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+class _ChunkSink:
+    """File-like target that hands written bytes back to a generator."""
+
+    def __init__(self):
+        self.chunks = []
+        self.closed = False
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def stream_arrow(documents, ledger):
+    import pyarrow as pa
+    schema = arrow_schema(ledger)
+    sink = _ChunkSink()
+    writer = pa.ipc.new_stream(pa.PythonFile(sink, mode='w'), schema)
+    for batch in iter_batches(documents, ledger):
+        writer.write_batch(_record_batch(schema, batch))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def stream_parquet(documents, ledger):
+    # Parquet's footer is written last, so build the file on disk and then
+    # send it; only one row group is in memory at a time.
+    import pyarrow.parquet as pq
+    schema = arrow_schema(ledger)
+    with tempfile.TemporaryFile() as handle:
+        writer = pq.ParquetWriter(handle, schema, compression='zstd')
+        for batch in iter_batches(documents, ledger):
+            writer.write_batch(_record_batch(schema, batch))
+        writer.close()
+        handle.seek(0)
+        while True:
+            chunk = handle.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
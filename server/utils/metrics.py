@@ -0,0 +1,176 @@
+"""In-process request and MongoDB metrics, rendered in Prometheus text format.
+
+Each gunicorn worker keeps its own registry, so /api/metrics reports the
+worker that served the scrape.
+"""
+import threading
+import time
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ROUND_TRIP_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100)
+
+_lock = threading.Lock()
+_local = threading.local()
+
+
+class Counter:
+    def __init__(self, name, help_text, labels):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.values = {}
+
+    def inc(self, label_values, amount=1):
+        with _lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        for label_values, value in sorted(self.values.items()):
+            lines.append(f'{self.name}{_format_labels(self.labels, label_values)} {_format_number(value)}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self.values = {}
+
+    def observe(self, label_values, value):
+        with _lock:
+            state = self.values.get(label_values)
+            if state is None:
+                state = self.values[label_values] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state['counts'][index] += 1
+                    break
+            state['sum'] += value
+            state['count'] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        for label_values, state in sorted(self.values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, state['counts']):
+                cumulative += count
+                labels = _format_labels(self.labels + ('le',), label_values + (_format_number(bound),))
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labels + ('le',), label_values + ('+Inf',))
+            lines.append(f"{self.name}_bucket{labels} {state['count']}")
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f"{self.name}_sum{labels} {_format_number(state['sum'])}")
+            lines.append(f"{self.name}_count{labels} {state['count']}")
+        return lines
+
+
+def _format_number(value):
+    if isinstance(value, float):
+        return repr(round(value, 6))
+    return str(value)
+
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    pairs = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{escaped}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+http_requests = Counter(
+    'http_requests_total', 'HTTP requests served.', ('method', 'endpoint', 'status')
+)
+http_latency = Histogram(
+    'http_request_duration_seconds', 'HTTP request latency.', ('method', 'endpoint'), LATENCY_BUCKETS
+)
+db_round_trips = Histogram(
+    'http_request_mongodb_round_trips', 'MongoDB commands issued per HTTP request.', ('method', 'endpoint'),
+    ROUND_TRIP_BUCKETS
+)
+db_commands = Counter(
+    'mongodb_commands_total', 'MongoDB commands by endpoint and command name.', ('endpoint', 'command')
+)
+db_failures = Counter(
+    'mongodb_command_failures_total', 'Failed MongoDB commands.', ('endpoint', 'command')
+)
+db_seconds = Counter(
+    'mongodb_command_seconds_total', 'Driver-measured MongoDB command time.', ('endpoint',)
+)
+db_bytes_sent = Counter(
+    'mongodb_bytes_sent_total', 'Encoded size of MongoDB commands sent (MONGODB_METRICS_BYTES=1 only).', ('endpoint',)
+)
+db_bytes_received = Counter(
+    'mongodb_bytes_received_total', 'Encoded size of MongoDB replies received (MONGODB_METRICS_BYTES=1 only).', ('endpoint',)
+)
+
+REGISTRY = [http_requests, http_latency, db_round_trips, db_commands, db_failures,
+            db_seconds, db_bytes_sent, db_bytes_received]
+
+
+class RequestStats:
+    __slots__ = ('method', 'endpoint', 'started', 'round_trips', 'db_seconds', 'bytes_sent', 'bytes_received')
+
+    def __init__(self, method, endpoint):
+        self.method = method
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        self.round_trips = 0
+        self.db_seconds = 0.0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+
+def start_request(method, endpoint):
+    _local.stats = RequestStats(method, endpoint)
+    return _local.stats
+
+
+def current_request():
+    return getattr(_local, 'stats', None)
+
+
+def finish_request(status):
+    stats = current_request()
+    _local.stats = None
+    if stats is None:
+        return None
+    elapsed = time.perf_counter() - stats.started
+    labels = (stats.method, stats.endpoint)
+    http_requests.inc(labels + (str(status),))
+    http_latency.observe(labels, elapsed)
+    db_round_trips.observe(labels, stats.round_trips)
+    db_seconds.inc((stats.endpoint,), stats.db_seconds)
+    db_bytes_sent.inc((stats.endpoint,), stats.bytes_sent)
+    db_bytes_received.inc((stats.endpoint,), stats.bytes_received)
+    return stats, elapsed
+
+
+def record_command(command_name, seconds, bytes_sent, bytes_received, failed=False):
+    stats = current_request()
+    endpoint = stats.endpoint if stats else 'background'
+    db_commands.inc((endpoint, command_name))
+    if failed:
+        db_failures.inc((endpoint, command_name))
+    if stats is not None:
+        stats.round_trips += 1
+        stats.db_seconds += seconds
+        stats.bytes_sent += bytes_sent
+        stats.bytes_received += bytes_received
+    else:
+        db_seconds.inc((endpoint,), seconds)
+        db_bytes_sent.inc((endpoint,), bytes_sent)
+        db_bytes_received.inc((endpoint,), bytes_received)
+
+
+def render_prometheus():
+    lines = []
+    with _lock:
+        for metric in REGISTRY:
+            lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
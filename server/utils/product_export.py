@@ -0,0 +1,353 @@
+"""Server-side port of the stock export that products.js used to build in the
+browser (exportToExcel, buildStockQuantityFormula, buildStockSizeFormula).
+
+Rows are streamed from a cursor into a write-only openpyxl workbook, one
+sheet per category, so memory stays flat however many products match.
+"""
+import re
+import tempfile
+from datetime import datetime
+
+BASE_COLUMNS = ['Product Name', 'Category', 'Product Format', 'Stock Quantity', 'Stock Size', 'Status']
+BATCH_SIZE = 1000
+CHUNK_SIZE = 64 * 1024
+
+
+def _to_float(value):
+    if value is None or value == '' or isinstance(value, bool):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        match = re.match(r'\s*-?\d+(?:\.\d+)?', str(value))
+        return float(match.group(0)) if match else None
+
+
+def _js_str(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def convert_to_meters(value, unit='mm'):
+    numeric = _to_float(value)
+    if numeric is None:
+        return None
+    if unit == 'mm':
+        return numeric / 1000
+    if unit == 'inch':
+        return numeric * 0.0254
+    return numeric
+
+
+def format_dimension(value):
+    numeric = _to_float(value)
+    return 'N/A' if numeric is None else f'{numeric:.2f}'
+
+
+def format_detail_label(key):
+    label = re.sub(r'([A-Z])', r' \1', key or '').replace('_', ' ')
+    return re.sub(r'\b\w', lambda match: match.group(0).upper(), label).strip()
+
+
+def length_width_label(key, category):
+    if category not in ['blankets', 'underpacking']:
+        return format_detail_label(key)
+    labels = {'length': 'Along', 'lengthunit': 'Along Unit', 'width': 'Around', 'widthunit': 'Around Unit'}
+    return labels.get(key.lower(), format_detail_label(key))
+
+
+def detail_cell_value(value):
+    """Dimension cells keep numbers numeric so the formulas can use them."""
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (int, float)):
+        return value if isinstance(value, int) or value.is_integer() else round(value, 2)
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d')
+    if isinstance(value, str):
+        try:
+            numeric = float(value)
+        except ValueError:
+            return value
+        return int(numeric) if numeric.is_integer() else numeric
+    return str(value)
+
+
+def stock_status(stock, is_blanket_pieces=False, reorder_threshold=None):
+    """Same bands as getStockStatus in products.js: at the default threshold
+    Medium ends at 10 pieces / 50 sq.mtr, an overridden threshold moves it
+    to five times the threshold."""
+    default_threshold = 3 if is_blanket_pieces else 10
+    threshold = reorder_threshold if reorder_threshold is not None else default_threshold
+    medium = (10 if is_blanket_pieces else 50) if threshold == default_threshold else threshold * 5
+    if stock == 0:
+        return 'Out of Stock'
+    if stock < threshold:
+        return 'Low Stock'
+    if stock < medium:
+        return 'Medium Stock'
+    return 'In Stock'
+
+
+def product_format_label(product):
+    category = (product.get('category') or '').lower()
+    dims = product.get('dimensions') or {}
+    if category in ['blankets', 'underpacking']:
+        stock_type = dims.get('stockType') or ('pieces' if dims.get('numberOfPieces') else 'roll')
+        return 'Cut Pieces' if stock_type == 'pieces' else 'Roll'
+    if category == 'chemicals':
+        product_format = dims.get('productFormat')
+        unit = dims.get('chemicalUnit')
+        if product_format and unit:
+            return f'{product_format} {unit}'
+        if product_format:
+            return f'{product_format}'
+        return unit or 'Chemical'
+    if category == 'rules':
+        if dims.get('rulePackedAs') == 'coil':
+            return 'Coil'
+        if dims.get('rulePackedAs') == 'packets':
+            return 'Packets'
+        return dims.get('stockUnit') or 'Rules'
+    if category == 'matrix':
+        return 'Packets'
+    if category == 'litho perf':
+        return dims.get('lithoPieceType') or 'Pieces'
+    if dims.get('stockType'):
+        return format_detail_label(dims['stockType'])
+    return ''
+
+
+def cut_piece_stock_size_label(product, stock_level):
+    dims = product.get('dimensions') or {}
+    per_piece = _to_float(dims.get('sqMtrPerPiece'))
+    if not per_piece or per_piece <= 0:
+        length_m = convert_to_meters(dims.get('length'), dims.get('lengthUnit') or 'mm')
+        width_m = convert_to_meters(dims.get('width'), dims.get('widthUnit') or 'mm')
+        per_piece = length_m * width_m if length_m is not None and width_m is not None else None
+    if not per_piece or per_piece <= 0:
+        return None
+    pieces = _to_float(dims.get('numberOfPieces'))
+    if pieces and pieces > 0:
+        quantity = round(pieces)
+    elif stock_level and stock_level > 0:
+        quantity = round(stock_level)
+    else:
+        return None
+    return f'{per_piece:.4f}(x{quantity})'
+
+
+def display_name(product, is_blanket_pieces):
+    name = product.get('name', '')
+    dims = product.get('dimensions') or {}
+    thickness = dims.get('thickness')
+    if product.get('category') == 'matrix':
+        width = dims.get('matrixSizeWidth') or 'N/A'
+        height = dims.get('matrixSizeHeight') or 'N/A'
+        width = f'{_to_float(width):.1f}' if width != 'N/A' and _to_float(width) is not None else width
+        height = f'{_to_float(height):.1f}' if height != 'N/A' and _to_float(height) is not None else height
+        if thickness:
+            suffix = 'μ' if dims.get('thicknessUnit') == 'micron' else 'mm'
+            return f'{name} ({width} x {height}, {_js_str(thickness)}{suffix})'
+        return f'{name} ({width} x {height})'
+    if thickness:
+        suffix = 'μ' if dims.get('thicknessUnit') == 'micron' else 'mm'
+        return f'{name} ({_js_str(thickness)}{suffix})'
+    if is_blanket_pieces:
+        return f'{name} (Pieces)'
+    return name
+
+
+def stock_display(product, stock_level, is_blanket_pieces):
+    """Return the (quantity, size) text shown when no formula applies."""
+    category = product.get('category')
+    dims = product.get('dimensions') or {}
+    if is_blanket_pieces:
+        quantity, quantity_unit = f'{stock_level:.0f}', 'pcs'
+        size, size_unit = cut_piece_stock_size_label(product, stock_level) or '', ''
+    elif dims.get('length') and dims.get('width'):
+        length_m = convert_to_meters(dims.get('length'), dims.get('lengthUnit') or 'mm') or 0
+        width_m = convert_to_meters(dims.get('width'), dims.get('widthUnit') or 'mm') or 0
+        if category == 'underpacking':
+            quantity, quantity_unit, size, size_unit = f'{width_m:.2f}', 'mtr', '', ''
+        elif category == 'blankets':
+            quantity, quantity_unit, size, size_unit = f'{length_m:.2f}', 'mtr', '', ''
+        else:
+            quantity, quantity_unit = f'{stock_level:.2f}', 'units'
+            size, size_unit = f'{stock_level:.2f}', 'units'
+    elif category == 'chemicals':
+        quantity, quantity_unit = f'{stock_level:.2f}', dims.get('chemicalUnit') or 'ltrs'
+        size, size_unit = '', ''
+    elif category == 'rules':
+        quantity, quantity_unit = f'{stock_level:.0f}', dims.get('stockUnit') or ''
+        container_length = dims.get('ruleContainerLength')
+        container_width = dims.get('ruleContainerWidth')
+        container_type = dims.get('ruleContainerType')
+        if container_length is not None and container_width is not None and container_type:
+            size = f'{format_dimension(container_length)} x {format_dimension(container_width)} x {container_type}'
+            size_unit = ''
+        else:
+            size, size_unit = f'{stock_level:.0f}', dims.get('stockUnit') or ''
+    elif category in ['matrix', 'litho perf']:
+        quantity, quantity_unit = f'{stock_level:.0f}', 'pkts'
+        size, size_unit = f'{stock_level:.0f}', 'pkts'
+    else:
+        quantity, quantity_unit = f'{stock_level:.2f}', 'units'
+        size, size_unit = f'{stock_level:.2f}', 'units'
+
+    quantity_text = f'{quantity} [{quantity_unit}]' if quantity_unit else f'{quantity}'
+    size_text = f'{size} [{size_unit}]' if size_unit else f'{size}'
+    return quantity_text, size_text
+
+
+def column_letter(index):
+    label = ''
+    while index > 0:
+        index, remainder = divmod(index - 1, 26)
+        label = chr(65 + remainder) + label
+    return label
+
+
+def _meters_expression(value_ref, unit_ref):
+    if not unit_ref:
+        return value_ref
+    return (f'IF({unit_ref}="",{value_ref},IF(LOWER({unit_ref})="mm",{value_ref}/1000,'
+            f'IF(LOWER({unit_ref})="inch",{value_ref}*0.0254,{value_ref})))')
+
+
+def stock_quantity_formula(product, refs):
+    dims = product.get('dimensions') or {}
+    category = product.get('category')
+    if category == 'underpacking' and refs.get('width'):
+        converted = _meters_expression(refs['width'], refs.get('widthUnit'))
+        return f'=IF({refs["width"]}="","",ROUND({converted},2))'
+    if category == 'blankets' and dims.get('stockType') == 'roll' and refs.get('length'):
+        converted = _meters_expression(refs['length'], refs.get('lengthUnit'))
+        return f'=IF({refs["length"]}="","",ROUND({converted},2))'
+    if category == 'blankets' and dims.get('numberOfPieces') and refs.get('numberOfPieces'):
+        return f'=IF({refs["numberOfPieces"]}="","",{refs["numberOfPieces"]})'
+    return None
+
+
+def stock_size_formula(product, refs):
+    length_ref, width_ref = refs.get('length'), refs.get('width')
+    if not length_ref or not width_ref:
+        return None
+    category = product.get('category')
+    if category not in ['blankets', 'underpacking']:
+        return None
+    area = (f'ROUND(({_meters_expression(length_ref, refs.get("lengthUnit"))})*'
+            f'({_meters_expression(width_ref, refs.get("widthUnit"))}),4)')
+    pieces_ref = refs.get('numberOfPieces')
+    if category == 'blankets' and (product.get('dimensions') or {}).get('numberOfPieces') and pieces_ref:
+        return (f'=IF(OR({length_ref}="",{width_ref}="",{pieces_ref}=""),"",'
+                f'TEXT({area},"0.0000") & " (x" & {pieces_ref} & ")")')
+    return f'=IF(OR({length_ref}="",{width_ref}=""),"",{area})'
+
+
+def build_row(product, category, dimension_keys, row_number):
+    stock_level = product.get('stock') or 0
+    dims = product.get('dimensions') or {}
+    is_blanket_pieces = bool(product.get('category') == 'blankets' and dims.get('numberOfPieces'))
+
+    refs = {
+        key: f'{column_letter(len(BASE_COLUMNS) + index + 1)}{row_number}'
+        for index, key in enumerate(dimension_keys)
+    }
+    quantity_text, size_text = stock_display(product, stock_level, is_blanket_pieces)
+    row = [
+        display_name(product, is_blanket_pieces),
+        product.get('category'),
+        product_format_label(product),
+        stock_quantity_formula(product, refs) or quantity_text,
+        stock_size_formula(product, refs) or size_text,
+        stock_status(stock_level, is_blanket_pieces, product.get('reorderThreshold')),
+    ]
+    row.extend(detail_cell_value(dims.get(key)) for key in dimension_keys)
+    return row
+
+
+def sheet_title(category, used):
+    title = re.sub(r'[\[\]:*?/\\]', ' ', category or 'Uncategorized').strip()[:31] or 'Uncategorized'
+    candidate, suffix = title, 2
+    while candidate.lower() in used:
+        candidate = f'{title[:28]} {suffix}'
+        suffix += 1
+    used.add(candidate.lower())
+    return candidate
+
+
+def dimension_keys_by_category(collection, query):
+    """Non-empty dimension keys per category, in first-seen order."""
+    pipeline = [
+        {'$match': query},
+        {'$project': {'category': 1, 'dims': {'$objectToArray': {'$ifNull': ['$dimensions', {}]}}}},
+        {'$unwind': {'path': '$dims', 'includeArrayIndex': 'pos'}},
+        {'$match': {'dims.v': {'$nin': [None, '']}}},
+        {'$group': {
+            '_id': {'category': '$category', 'key': '$dims.k'},
+            'first': {'$min': {'id': '$_id', 'pos': '$pos'}}
+        }},
+        {'$sort': {'first.id': 1, 'first.pos': 1}},
+    ]
+    keys = {}
+    for entry in collection.aggregate(pipeline, allowDiskUse=True):
+        keys.setdefault(entry['_id'].get('category'), []).append(entry['_id']['key'])
+    return keys
+
+
+def write_workbook(collection, query, handle):
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+
+    workbook = Workbook(write_only=True)
+    header_font = Font(bold=True)
+    keys_by_category = dimension_keys_by_category(collection, query)
+    categories = sorted(collection.distinct('category', query), key=lambda c: c or '')
+    used_titles = set()
+    written = 0
+
+    for category in categories:
+        dimension_keys = keys_by_category.get(category, [])
+        sheet = workbook.create_sheet(title=sheet_title(category, used_titles))
+        headers = BASE_COLUMNS + [length_width_label(key, category) for key in dimension_keys]
+        header_cells = []
+        for label in headers:
+            cell = WriteOnlyCell(sheet, value=label)
+            cell.font = header_font
+            header_cells.append(cell)
+        sheet.append(header_cells)
+
+        cursor = collection.find(
+            dict(query, category=category),
+            {'name': 1, 'category': 1, 'stock': 1, 'reorderThreshold': 1, 'dimensions': 1}
+        ).sort('_id', 1).batch_size(BATCH_SIZE)
+        row_number = 2
+        for product in cursor:
+            sheet.append(build_row(product, category, dimension_keys, row_number))
+            row_number += 1
+            written += 1
+
+    if not categories:
+        workbook.create_sheet(title='Products').append(BASE_COLUMNS)
+    workbook.save(handle)
+    return written
+
+
+def stream_workbook(collection, query):
+    """Build the workbook into a temporary file and yield it in chunks."""
+    handle = tempfile.TemporaryFile()
+    try:
+        write_workbook(collection, query, handle)
+        handle.seek(0)
+        while True:
+            chunk = handle.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        handle.close()
@@ -0,0 +1,144 @@
+"""Per-request profiling with a bounded on-disk ring of captures.
+
+Configured from the environment:
+    PROFILE_TOKEN               enables on-demand cProfile of one request when the
+                                X-Profile-Token header carries the same value; also
+                                guards the admin endpoints
+    PROFILE_SLOW_MS             when > 0, sample every request's stack and keep a
+                                capture of any request slower than this
+    PROFILE_SAMPLE_INTERVAL_MS  sampling interval for slow-request capture (default 5)
+    PROFILE_DIR                 where captures are written
+    PROFILE_MAX_CAPTURES        ring size; the oldest captures are deleted first
+
+With neither PROFILE_TOKEN nor PROFILE_SLOW_MS set no profiler or sampler
+thread is started.
+"""
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+PROFILE_TOKEN = os.environ.get('PROFILE_TOKEN', '')
+SLOW_MS = float(os.environ.get('PROFILE_SLOW_MS', '0') or 0)
+SAMPLE_INTERVAL = float(os.environ.get('PROFILE_SAMPLE_INTERVAL_MS', '5') or 5) / 1000
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'stock-sku-profiles'))
+MAX_CAPTURES = int(os.environ.get('PROFILE_MAX_CAPTURES', '50') or 50)
+
+CAPTURE_NAME = re.compile(r'^[\w.-]+\.(?:pstats|folded)$')
+
+
+def enabled():
+    return bool(PROFILE_TOKEN) or SLOW_MS > 0
+
+
+def _slug(value):
+    return re.sub(r'[^A-Za-z0-9]+', '_', value).strip('_') or 'root'
+
+
+def capture_path(method, endpoint, elapsed_ms, extension):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    stamp = datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')
+    name = f'{stamp}-{method}-{_slug(endpoint)}-{int(elapsed_ms)}ms-{os.getpid()}.{extension}'
+    return os.path.join(PROFILE_DIR, name)
+
+
+def trim_ring():
+    captures = list_captures()
+    for capture in captures[MAX_CAPTURES:]:
+        try:
+            os.remove(os.path.join(PROFILE_DIR, capture['name']))
+        except OSError:
+            pass
+
+
+def list_captures():
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    captures = []
+    for name in os.listdir(PROFILE_DIR):
+        if not CAPTURE_NAME.match(name):
+            continue
+        stat = os.stat(os.path.join(PROFILE_DIR, name))
+        captures.append({
+            'name': name,
+            'bytes': stat.st_size,
+            'createdAt': datetime.utcfromtimestamp(stat.st_mtime).isoformat()
+        })
+    captures.sort(key=lambda capture: capture['name'], reverse=True)
+    return captures
+
+
+def capture_file(name):
+    if not CAPTURE_NAME.match(name):
+        return None
+    path = os.path.join(PROFILE_DIR, name)
+    return path if os.path.isfile(path) else None
+
+
+def save_cprofile(profiler, method, endpoint, elapsed_ms):
+    path = capture_path(method, endpoint, elapsed_ms, 'pstats')
+    profiler.dump_stats(path)
+    trim_ring()
+    return os.path.basename(path)
+
+
+def save_folded(samples, method, endpoint, elapsed_ms):
+    # "frame;frame;frame count" lines, the input format of flamegraph.pl / speedscope
+    path = capture_path(method, endpoint, elapsed_ms, 'folded')
+    with open(path, 'w', encoding='utf-8') as handle:
+        for stack, count in samples.most_common():
+            handle.write(f'{stack} {count}\n')
+    trim_ring()
+    return os.path.basename(path)
+
+
+class StackSampler:
+    """Samples the stacks of threads that are currently serving a request."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.active = {}
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name='request-sampler', daemon=True)
+            self.thread.start()
+
+    def begin(self):
+        self.start()
+        with self.lock:
+            self.active[threading.get_ident()] = Counter()
+
+    def end(self):
+        with self.lock:
+            return self.active.pop(threading.get_ident(), None)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self.lock:
+                if not self.active:
+                    continue
+                frames = sys._current_frames()
+                for thread_id, samples in self.active.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        samples[_fold(frame)] += 1
+
+
+def _fold(frame):
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+        frame = frame.f_back
+    return ';'.join(reversed(stack))
+
+
+sampler = StackSampler(SAMPLE_INTERVAL) if SLOW_MS > 0 else None
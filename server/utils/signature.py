@@ -0,0 +1,54 @@
+import hashlib
+import json
+from datetime import datetime
+from .dimensions import to_number
+
+# The fields an Excel re-upload compares against the stored product
+SIGNATURE_FIELDS = ('length', 'width', 'thickness', 'rollNumber', 'importDate', 'takenDate')
+# Entered through forms as strings, through Excel as floats
+NUMERIC_FIELDS = ('length', 'width', 'thickness')
+
+
+def normalize_value(value):
+    if value is None or value == '':
+        return None
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return None if value != value else round(float(value), 4)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value).strip()
+
+
+def signature(dimensions):
+    dimensions = dimensions or {}
+    normalized = {}
+    for field in SIGNATURE_FIELDS:
+        value = dimensions.get(field)
+        if field in NUMERIC_FIELDS and isinstance(value, str):
+            value = to_number(value) if value.strip() else None
+        normalized[field] = normalize_value(value)
+    return normalized
+
+
+def signature_hash(name, category, dimensions):
+    """Hash of a product's identity and normalised signature fields; equal
+    hashes mean an uploaded row is an exact duplicate of the product."""
+    payload = json.dumps([name, category, signature(dimensions)], sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def signature_fields(name, category, dimensions):
+    """Field to include with every product write that sets name or dimensions."""
+    return {'signatureHash': signature_hash(name, category, dimensions)}
+
+
+def differences(existing_dimensions, incoming_dimensions):
+    existing = signature(existing_dimensions)
+    incoming = signature(incoming_dimensions)
+    return {
+        field: {'existing': existing[field], 'incoming': incoming[field]}
+        for field in SIGNATURE_FIELDS
+        if existing[field] != incoming[field]
+    }
@@ -0,0 +1,48 @@
+import json
+import mimetypes
+import os
+from flask import request, send_from_directory
+from ..build_assets import BUILD_DIR, MANIFEST_NAME, PUBLIC_DIR
+
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE = 'no-cache'
+SHORT_CACHE = 'public, max-age=300'
+
+# (Accept-Encoding token, file suffix) in order of preference
+PRECOMPRESSED = [('br', '.br'), ('gzip', '.gz')]
+
+
+def _load_manifest():
+    try:
+        with open(os.path.join(BUILD_DIR, MANIFEST_NAME), encoding='utf-8') as handle:
+            return json.load(handle)
+    except (OSError, ValueError):
+        return None
+
+
+_manifest = _load_manifest()
+ASSET_DIR = BUILD_DIR if _manifest is not None else PUBLIC_DIR
+FINGERPRINTED = set(_manifest.values()) if _manifest else set()
+
+
+def send_asset(filename):
+    """Serve a file from the asset directory, preferring a precompressed
+    variant the client accepts, with cache headers suited to the file."""
+    response = None
+    for encoding, suffix in PRECOMPRESSED:
+        if request.accept_encodings[encoding] and os.path.isfile(os.path.join(ASSET_DIR, filename + suffix)):
+            mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+            response = send_from_directory(ASSET_DIR, filename + suffix, mimetype=mimetype)
+            response.headers['Content-Encoding'] = encoding
+            break
+    if response is None:
+        response = send_from_directory(ASSET_DIR, filename)
+
+    response.headers['Vary'] = 'Accept-Encoding'
+    if filename in FINGERPRINTED:
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE
+    elif filename.endswith('.html'):
+        response.headers['Cache-Control'] = REVALIDATE_CACHE
+    else:
+        response.headers['Cache-Control'] = SHORT_CACHE
+    return response